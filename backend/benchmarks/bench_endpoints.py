@@ -0,0 +1,250 @@
+"""
+Benchmark suite: latency / throughput of the backend endpoints
+
+Gửi --requests yêu cầu (song song --concurrency) tới từng endpoint đọc của
+một server đang chạy, đo p50/p95/p99, req/s, số byte truyền đi và số truy vấn
+DB mỗi request (header Server-Timing, không có ở các endpoint stream). Kết quả
+được lưu thành JSON trong backend/benchmarks/results/ kèm commit hiện tại, và
+--compare in bảng chênh lệch với một báo cáo cũ.
+
+Chuẩn bị:
+    DB_NAME=restaurant_bench python backend/benchmarks/seed_benchmark_data.py --scale large --yes
+    (hoặc tự chọn từng tham số: backend/benchmarks/generate_data.py --yes)
+    DB_NAME=restaurant_bench python backend/main.py
+
+Chạy:
+    python backend/benchmarks/bench_endpoints.py --requests 200 --concurrency 20
+    python backend/benchmarks/bench_endpoints.py --only payroll-sheet timesheet roster \\
+        --compare backend/benchmarks/results/<report>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import httpx
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DATASET_TABLES = ["chi_nhanh", "nhan_vien", "cham_cong", "lich_lam_viec", "cau_hinh_luong"]
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+# Used when the database cannot be read; matches names of phu_ai/synthetic_data.py
+DEFAULT_SEARCH_TERM = "nguyen van"
+
+
+def scenarios(search_term: str):
+    """(name, method, path, params, json body) of every read endpoint"""
+    today = date.today()
+    last_month_end = today.replace(day=1) - timedelta(days=1)
+    month_start = last_month_end.replace(day=1)
+    month = {"start_date": month_start.isoformat(), "end_date": last_month_end.isoformat()}
+    week_start = today + timedelta(days=7 - today.weekday())
+    return [
+        ("branches", "GET", "/api/branches", {}, None),
+        ("staff", "GET", "/api/staff", {}, None),
+        ("staff-search", "GET", "/api/staff", {"search": search_term}, None),
+        ("staff-branch", "GET", "/api/staff", {"branchId": 1}, None),
+        ("shift-templates", "GET", "/api/shift-templates", {}, None),
+        ("roster", "GET", "/api/roster", {}, None),
+        ("roster-month", "GET", "/api/roster", month, None),
+        ("attendance", "GET", "/api/attendance", {}, None),
+        ("timesheet", "GET", "/api/timesheet", month, None),
+        ("timesheet-branch", "GET", "/api/timesheet", dict(month, branch_id=1), None),
+        ("timesheet-stream-csv", "GET", "/api/timesheet/stream", dict(month, format="csv"), None),
+        ("payroll-config", "GET", "/api/payroll-config", {}, None),
+        ("payroll-sheet", "GET", "/api/payroll-sheet", {"month": month_start.month, "year": month_start.year}, None),
+        ("payroll-sheet-branch", "GET", "/api/payroll-sheet",
+         {"month": month_start.month, "year": month_start.year, "branch_id": 1}, None),
+        ("payroll-sheet-export-csv", "GET", "/api/payroll-sheet/export",
+         {"month": month_start.month, "year": month_start.year, "format": "csv"}, None),
+        ("staff-export-csv", "GET", "/api/staff/export", {"format": "csv"}, None),
+        ("payroll-periods", "GET", "/api/payroll-periods", {}, None),
+        ("payroll-simulation", "POST", "/api/payroll-simulation", {}, {
+            "startMonth": (month_start - timedelta(days=150)).strftime("%Y-%m"),
+            "endMonth": month_start.strftime("%Y-%m"),
+            "scenarios": [{"name": "+5% theo giờ", "currentSalaryType": "THEO_GIO", "ratePercent": 5}],
+        }),
+        ("roster-generate", "POST", "/api/roster/generate", {}, {"weekStart": week_start.isoformat(), "branchIds": [1]}),
+    ]
+
+
+def git_revision():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=root, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, text=True).strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return commit, dirty
+
+
+def dataset_counts():
+    try:
+        with psycopg.connect(**DB_CONFIG) as conn, conn.cursor() as cur:
+            counts = {}
+            for table in DATASET_TABLES:
+                # Planner estimate: exact COUNT(*) on 5M rows would skew the run
+                cur.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+                row = cur.fetchone()
+                counts[table] = row[0] if row else None
+            return counts
+    except psycopg.Error as e:
+        return {"error": str(e)}
+
+
+def staff_search_term():
+    """
+    Name of the staff member in the middle of nhan_vien, so staff-search hits
+    real rows whatever seed and scale the data was generated with.
+    """
+    try:
+        with psycopg.connect(**DB_CONFIG) as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT ho_ten FROM nhan_vien
+                WHERE id >= (SELECT (MIN(id) + MAX(id)) / 2 FROM nhan_vien)
+                ORDER BY id LIMIT 1
+            """)
+            row = cur.fetchone()
+    except psycopg.Error:
+        row = None
+    return row[0] if row else DEFAULT_SEARCH_TERM
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run_scenario(client, scenario, requests: int, concurrency: int, warmup: int):
+    name, method, path, params, body = scenario
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, db_queries = [], []
+    errors = 0
+    wire_bytes = 0
+
+    async def one(record: bool):
+        nonlocal errors, wire_bytes
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, params=params, json=body)
+            await response.aread()
+            elapsed = time.perf_counter() - started
+        if not record:
+            return
+        latencies.append(elapsed)
+        wire_bytes += response.num_bytes_downloaded
+        if response.status_code >= 400:
+            errors += 1
+        match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            db_queries.append(int(match.group(1)))
+
+    await asyncio.gather(*(one(False) for _ in range(warmup)))
+    started = time.perf_counter()
+    await asyncio.gather(*(one(True) for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "method": method,
+        "path": path,
+        "params": params,
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50Ms": round(statistics.median(latencies) * 1000, 1),
+        "p95Ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "meanMs": round(statistics.fmean(latencies) * 1000, 1),
+        "bytesPerRequest": wire_bytes // requests,
+        "dbQueriesPerRequest": round(statistics.fmean(db_queries), 1) if db_queries else None,
+    }
+
+
+async def run_all(args, selected):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=300) as client:
+        for scenario in selected:
+            results[scenario[0]] = await run_scenario(client, scenario, args.requests, args.concurrency, args.warmup)
+            r = results[scenario[0]]
+            print(f"{scenario[0]:<22} p50 {r['p50Ms']:>8.1f} ms  p95 {r['p95Ms']:>8.1f} ms  "
+                  f"{r['rps']:>8.1f} req/s  {r['bytesPerRequest']:>10} B  errors {r['errors']}")
+    return results
+
+
+def print_comparison(report: dict, baseline: dict):
+    print(f"\nvs {baseline['meta']['commit']} ({baseline['meta']['timestamp']})")
+    print(f"{'endpoint':<22} | {'p50 ms':>17} | {'p95 ms':>17} | {'req/s':>17}")
+    print("-" * 82)
+
+    def cell(new, old):
+        if old in (None, 0) or new is None:
+            return f"{new!s:>17}"
+        return f"{new:>8} ({(new - old) / old * 100:+5.0f}%)"
+
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        print(f"{name:<22} | {cell(result['p50Ms'], old['p50Ms'])} | "
+              f"{cell(result['p95Ms'], old['p95Ms'])} | {cell(result['rps'], old['rps'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=100, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="Scenario names to run (default: all)")
+    parser.add_argument("--compare", help="Earlier report (JSON) to compare against")
+    parser.add_argument("--output", help="Report path (default: results/<timestamp>-<commit>.json)")
+    parser.add_argument("--search-term", help="staff-search term (default: a staff name read from the database)")
+    args = parser.parse_args()
+
+    search_term = args.search_term or staff_search_term()
+    selected = [s for s in scenarios(search_term) if not args.only or s[0] in args.only]
+    if not selected:
+        parser.error("no scenario matches --only")
+
+    commit, dirty = git_revision()
+    report = {
+        "meta": {
+            "commit": commit + ("-dirty" if dirty else ""),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "baseUrl": args.base_url,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "dataset": dataset_counts(),
+            "searchTerm": search_term,
+        },
+        "results": asyncio.run(run_all(args, selected)),
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['meta']['commit']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nReport: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark: /api/payroll-sheet query cost vs. staff count
+
+So sánh cách cũ (1 query cham_cong cho mỗi nhân viên - N+1) với query
+tổng hợp một lần (build_payroll_sheet_query trong main.py).
+
+Dữ liệu được tạo trong schema riêng (mặc định: bench_payroll) nên không
+đụng tới bảng thật. Dùng cùng biến môi trường DB_* như backend.
+
+Chạy:
+    python backend/benchmarks/bench_payroll_sheet.py --staff 100 1000 3000 --days 26
+"""
+import argparse
+import os
+import sys
+import time
+
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+from main import build_payroll_sheet_query  # noqa: E402
+from phu_ai.work_hours import calculate_work_hours  # noqa: E402
+
+SCHEMA_SQL = """
+    DROP SCHEMA IF EXISTS {schema} CASCADE;
+    CREATE SCHEMA {schema};
+    CREATE TABLE {schema}.chi_nhanh (id SERIAL PRIMARY KEY, ten_chi_nhanh TEXT, dia_chi TEXT, quan_ly_id INTEGER);
+    CREATE TABLE {schema}.nhan_vien (id SERIAL PRIMARY KEY, ho_ten TEXT, chuc_vu TEXT, so_dien_thoai TEXT,
+                                     trang_thai TEXT, avatar TEXT, chi_nhanh_id INTEGER);
+    CREATE TABLE {schema}.cau_hinh_luong (id SERIAL PRIMARY KEY, nhan_vien_id INTEGER, loai_luong TEXT, muc_luong NUMERIC);
+    CREATE TABLE {schema}.cham_cong (id SERIAL PRIMARY KEY, nhan_vien_id INTEGER, ngay DATE,
+                                     gio_vao VARCHAR(5), gio_ra VARCHAR(5), trang_thai_checkin TEXT);
+"""
+
+# psycopg 3 binds parameters server-side, so each parametrised statement runs on its own
+SEED_STATEMENTS = [
+    """
+    INSERT INTO chi_nhanh (ten_chi_nhanh, dia_chi)
+    SELECT 'Chi nhánh ' || g, 'Địa chỉ ' || g FROM generate_series(1, 10) g
+    """,
+    """
+    INSERT INTO nhan_vien (ho_ten, chuc_vu, so_dien_thoai, trang_thai, avatar, chi_nhanh_id)
+    SELECT 'Nhân viên ' || g, 'Phục vụ', '09' || lpad(g::text, 8, '0'), 'Đang làm', 'NV', 1 + g %% 10
+    FROM generate_series(1, %(staff)s) g
+    """,
+    """
+    INSERT INTO cau_hinh_luong (nhan_vien_id, loai_luong, muc_luong)
+    SELECT id, CASE WHEN id %% 3 = 0 THEN 'THEO_THANG' ELSE 'THEO_GIO' END,
+           CASE WHEN id %% 3 = 0 THEN 8000000 ELSE 25000 END
+    FROM nhan_vien
+    """,
+    """
+    INSERT INTO cham_cong (nhan_vien_id, ngay, gio_vao, gio_ra, trang_thai_checkin)
+    SELECT nv.id, make_date(%(year)s, %(month)s, d), '08:00', '16:30', 'Đúng giờ'
+    FROM nhan_vien nv, generate_series(1, %(days)s) d
+    """,
+    # Same indexes as migrate_cham_cong_indexes.sql
+    "CREATE INDEX ON cham_cong (nhan_vien_id, ngay)",
+    "CREATE INDEX ON cham_cong (ngay)",
+    "ANALYZE",
+]
+
+
+def seed(conn, schema: str, staff: int, days: int, month: int, year: int):
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL.format(schema=schema))
+        cur.execute(f"SET search_path TO {schema}")
+        params = {"staff": staff, "days": days, "month": month, "year": year}
+        for statement in SEED_STATEMENTS:
+            cur.execute(statement, params if "%(" in statement else None)
+    conn.commit()
+
+
+def run_n_plus_one(conn, month: int, year: int) -> int:
+    """The pre-aggregation implementation of get_payroll_sheet"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM nhan_vien ORDER BY id")
+        staff_ids = [row[0] for row in cur.fetchall()]
+        for staff_id in staff_ids:
+            cur.execute("""
+                SELECT gio_vao, gio_ra FROM cham_cong
+                WHERE nhan_vien_id = %s
+                  AND EXTRACT(MONTH FROM ngay) = %s
+                  AND EXTRACT(YEAR FROM ngay) = %s
+                  AND gio_vao IS NOT NULL AND gio_ra IS NOT NULL
+            """, (staff_id, month, year))
+            sum(calculate_work_hours(i, o) for i, o in cur.fetchall())
+    return len(staff_ids)
+
+
+def run_aggregate(conn, month: int, year: int) -> int:
+    query, params = build_payroll_sheet_query(month, year)
+    with conn.cursor() as cur:
+        cur.execute(query, params)
+        return len(cur.fetchall())
+
+
+def best_of(fn, repeat: int, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--staff", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--days", type=int, default=26, help="Attendance rows per staff member")
+    parser.add_argument("--month", type=int, default=1)
+    parser.add_argument("--year", type=int, default=2026)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--schema", default="bench_payroll")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark schema afterwards")
+    args = parser.parse_args()
+
+    print(f"{'staff':>8} | {'round trips (old)':>17} | {'N+1 ms':>10} | {'aggregate ms':>12}")
+    print("-" * 58)
+    with psycopg.connect(**DB_CONFIG) as conn:
+        try:
+            for staff in args.staff:
+                seed(conn, args.schema, staff, args.days, args.month, args.year)
+                old_ms = best_of(run_n_plus_one, args.repeat, conn, args.month, args.year) * 1000
+                new_ms = best_of(run_aggregate, args.repeat, conn, args.month, args.year) * 1000
+                conn.rollback()
+                print(f"{staff:>8} | {staff + 1:>17} | {old_ms:>10.1f} | {new_ms:>12.1f}")
+        finally:
+            if not args.keep:
+                with conn.cursor() as cur:
+                    cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+                conn.commit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: phu_ai.processor.generate_week_roster on synthetic data
+
+Không cần database: tạo dữ liệu giả trong bộ nhớ (mặc định 50 chi nhánh ×
+1.000 nhân viên mỗi chi nhánh × 7 ngày, 3 ca như migrate_roster.sql) và đo
+thời gian tạo lịch nháp.
+
+Chạy:
+    python backend/benchmarks/bench_roster_generator.py --branches 50 --staff-per-branch 1000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from phu_ai.processor import ShiftTemplate, StaffMember, generate_week_roster  # noqa: E402
+
+
+def build_data(branches: int, staff_per_branch: int, capacity: int):
+    shifts = [
+        ShiftTemplate(1, 'Ca Sáng', dtime(6, 0), dtime(14, 0), capacity),
+        ShiftTemplate(2, 'Ca Chiều', dtime(14, 0), dtime(22, 0), capacity),
+        ShiftTemplate(3, 'Ca Tối', dtime(18, 0), dtime(2, 0), capacity),
+    ]
+    staff = [
+        StaffMember(b * staff_per_branch + i + 1, f'Nhân viên {b}-{i}', b + 1)
+        for b in range(branches)
+        for i in range(staff_per_branch)
+    ]
+    return shifts, staff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--branches", type=int, default=50)
+    parser.add_argument("--staff-per-branch", type=int, default=1000)
+    parser.add_argument("--capacity", type=int, default=300, help="so_luong_max of every shift")
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    shifts, staff = build_data(args.branches, args.staff_per_branch, args.capacity)
+    week_start = date.today() + timedelta(days=7 - date.today().weekday())
+
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        draft = generate_week_roster(week_start, shifts, staff, days=args.days)
+        timings.append(time.perf_counter() - started)
+
+    summary = draft.summary()
+    print(f"branches × staff × days : {args.branches} × {len(staff)} × {args.days}")
+    print(f"assigned / unfilled     : {summary['assigned']} / {summary['unfilledSlots']}")
+    print(f"best / worst of {args.repeat}        : {min(timings):.2f}s / {max(timings):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: serialization cost of /api/roster responses
+
+So sánh đường cũ (dict_row -> jsonable_encoder -> json.dumps của JSONResponse)
+với đường mới của get_roster (tuple -> rows_to_dicts -> dump_json / orjson).
+Không cần database: các dòng giả có cùng cột với query của get_roster, và
+cursor.description được giả lập.
+
+Chạy:
+    python backend/benchmarks/bench_roster_serialization.py --rows 1000 20000 50000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from main import dump_json, orjson, rows_to_dicts  # noqa: E402
+
+ROSTER_COLUMNS = [
+    "id", "staffId", "staffName", "avatar", "date", "shiftTemplateId", "shiftName",
+    "shiftStartTime", "shiftEndTime", "branchId", "branchName",
+]
+SHIFTS = [(1, "Ca Sáng", "06:00", "14:00"), (2, "Ca Chiều", "14:00", "22:00"), (3, "Ca Tối", "18:00", "02:00")]
+
+Column = namedtuple("Column", "name")
+
+
+class FakeCursor:
+    description = [Column(name) for name in ROSTER_COLUMNS]
+
+
+def build_rows(count: int):
+    rows = []
+    for i in range(count):
+        shift_id, shift_name, start, end = SHIFTS[i % 3]
+        rows.append((
+            i + 1, 1000 + i % 5000, f"Nguyễn Văn {i % 5000}", "NV",
+            f"2026-10-{1 + i % 28:02d}", shift_id, shift_name, start, end,
+            1 + i % 50, f"Chi nhánh {1 + i % 50}",
+        ))
+    return rows
+
+
+def old_path(rows) -> bytes:
+    """dict_row + FastAPI's default JSONResponse"""
+    dict_rows = [dict(zip(ROSTER_COLUMNS, row)) for row in rows]
+    return json.dumps(
+        jsonable_encoder(dict_rows), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def new_path(rows) -> bytes:
+    return dump_json(rows_to_dicts(FakeCursor, rows))
+
+
+def best_of(fn, repeat: int, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 20000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json (orjson not installed)'}")
+    print(f"{'rows':>8} | {'old ms':>10} | {'new ms':>10} | {'speedup':>8}")
+    print("-" * 46)
+    for count in args.rows:
+        rows = build_rows(count)
+        assert json.loads(old_path(rows)) == json.loads(new_path(rows))
+        old_ms = best_of(old_path, args.repeat, rows) * 1000
+        new_ms = best_of(new_path, args.repeat, rows) * 1000
+        print(f"{count:>8} | {old_ms:>10.1f} | {new_ms:>10.1f} | {old_ms / new_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Generate realistic synthetic data and bulk-load it with COPY
+
+Sinh dữ liệu giả lập xác định theo --seed (phu_ai/synthetic_data.py): tên
+tiếng Việt, mỗi chi nhánh một quản lý, ca Sáng/Chiều/Tối (Ca Tối 18:00-02:00
+qua đêm), lịch làm việc trong giới hạn so_luong_max và chấm công theo lịch
+(vắng mặt, check-in muộn -> 'Trễ'). Dữ liệu được nạp bằng COPY FROM STDIN
+trong một transaction, nhanh hơn nhiều so với INSERT từng dòng.
+
+seed_benchmark_data.py nạp cùng bộ dữ liệu theo các cấu hình có sẵn (--scale);
+script này cho chọn từng tham số. Cùng --seed và --today -> cùng dữ liệu.
+
+CHỈ chạy trên database dành riêng (đã chạy đủ các file migrate_*.sql); dùng
+cùng biến môi trường DB_* như backend và bắt buộc --yes.
+
+Chạy:
+    DB_NAME=restaurant_bench python backend/benchmarks/generate_data.py --branches 100 --staff-per-branch 100 \\
+        --history-days 700 --yes
+    python backend/benchmarks/generate_data.py --dry-run
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+from phu_ai.synthetic_data import DatasetConfig, SyntheticDataset, load  # noqa: E402
+
+GENERATORS = [
+    ("chi_nhanh", "branches"),
+    ("nhan_vien", "staff"),
+    ("cau_hinh_luong", "salary_configs"),
+    ("cau_hinh_ca", "shift_templates"),
+    ("lich_lam_viec", "roster"),
+    ("cham_cong", "attendance"),
+]
+
+
+def dry_run(dataset: SyntheticDataset):
+    """Generate every row without a database: row counts, speed and a sample"""
+    for table, method in GENERATORS:
+        started = time.perf_counter()
+        count, sample = 0, None
+        for row in getattr(dataset, method)():
+            sample = sample or row
+            count += 1
+        elapsed = time.perf_counter() - started
+        print(f"  {table:<16} {count:>10} rows  {elapsed:6.1f}s  e.g. {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--staff-per-branch", type=int, default=50)
+    parser.add_argument("--history-days", type=int, default=60, help="Past days with roster and attendance")
+    parser.add_argument("--future-days", type=int, default=28, help="Roster days from --today on")
+    parser.add_argument("--capacity", type=int, help="so_luong_max per shift (default: fits expected turnout)")
+    parser.add_argument("--late-rate", type=float, default=0.1, help="Share of check-ins marked 'Trễ'")
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(),
+                        help="Anchor date (YYYY-MM-DD); fix it for byte-identical reruns")
+    parser.add_argument("--dry-run", action="store_true", help="Generate rows without touching the database")
+    parser.add_argument("--yes", action="store_true", help="Confirm that the target database may be wiped")
+    args = parser.parse_args()
+
+    config = DatasetConfig(
+        seed=args.seed,
+        branches=args.branches,
+        staff_per_branch=args.staff_per_branch,
+        history_days=args.history_days,
+        future_days=args.future_days,
+        shift_capacity=args.capacity,
+        late_rate=args.late_rate,
+        today=args.today,
+    )
+    dataset = SyntheticDataset(config)
+
+    if args.dry_run:
+        print(f"Dry run: {config}")
+        dry_run(dataset)
+        return
+
+    target = f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
+    if not args.yes:
+        print(f"This wipes all restaurant data in {target}. Re-run with --yes to continue.")
+        sys.exit(1)
+
+    print(f"Loading {target}: {config}")
+    started = time.perf_counter()
+    last = [started]
+
+    def progress(table, rows):
+        now = time.perf_counter()
+        elapsed = now - last[0]
+        last[0] = now
+        rate = rows / elapsed * 60 if elapsed else 0
+        print(f"  {table:<16} {rows:>10} rows  {elapsed:6.1f}s  {rate:>12,.0f} rows/min")
+
+    with psycopg.connect(**DB_CONFIG) as conn:
+        counts = load(conn, dataset, progress=progress)
+    print(f"Done: {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
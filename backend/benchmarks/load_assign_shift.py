@@ -0,0 +1,132 @@
+"""
+Load test: concurrent POST /api/assign-shift must never overbook a shift
+
+Tạo một ca làm tạm (so_luong_max = --capacity) và --requests nhân viên tạm,
+rồi bắn đồng thời --requests yêu cầu phân công vào cùng một ca / ngày / chi
+nhánh. Kết quả đúng: đúng --capacity yêu cầu thành công, phần còn lại bị từ
+chối với 409 "maximum capacity", và bảng lich_lam_viec có đúng --capacity dòng.
+Dữ liệu tạm được xóa sau khi chạy.
+
+Cần server đang chạy (python backend/main.py) và migrate_shift_capacity.sql.
+
+Chạy:
+    python backend/benchmarks/load_assign_shift.py --requests 500 --capacity 3 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+
+TEST_SHIFT_NAME = "__load_test_ca__"
+TEST_STAFF_ROLE = "__load_test__"
+
+
+def setup(conn, requests: int, capacity: int):
+    with conn.cursor() as cur:
+        # Inserted directly: the API would reject the overlapping time range
+        cur.execute("""
+            INSERT INTO cau_hinh_ca (ten_ca, gio_bat_dau, gio_ket_thuc, so_luong_max)
+            VALUES (%s, '00:00', '00:01', %s)
+            RETURNING id
+        """, (TEST_SHIFT_NAME, capacity))
+        shift_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO nhan_vien (ho_ten, chuc_vu, so_dien_thoai, trang_thai, avatar)
+            SELECT 'Load Test ' || g, %s, '000' || g, 'Đang làm', 'LT'
+            FROM generate_series(1, %s) g
+            RETURNING id
+        """, (TEST_STAFF_ROLE, requests))
+        staff_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return shift_id, staff_ids
+
+
+def cleanup(conn, shift_id: int):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM lich_lam_viec WHERE ca_lam_id = %s", (shift_id,))
+        cur.execute("DELETE FROM nhan_vien WHERE chuc_vu = %s", (TEST_STAFF_ROLE,))
+        cur.execute("DELETE FROM lich_lam_viec_suc_chua WHERE ca_lam_id = %s", (shift_id,))
+        cur.execute("DELETE FROM cau_hinh_ca WHERE id = %s", (shift_id,))
+    conn.commit()
+
+
+async def fire(base_url: str, payloads: list, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def one(payload):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/api/assign-shift", json=payload)
+                latencies.append(time.perf_counter() - started)
+                return response
+
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(one(p) for p in payloads))
+        elapsed = time.perf_counter() - started
+    return responses, latencies, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--capacity", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--branch-id", type=int, default=None)
+    args = parser.parse_args()
+
+    work_date = (date.today() + timedelta(days=3650)).isoformat()
+    with psycopg.connect(**DB_CONFIG) as conn:
+        shift_id, staff_ids = setup(conn, args.requests, args.capacity)
+        try:
+            payloads = [
+                {"staffId": staff_id, "shiftTemplateId": shift_id, "date": work_date, "branchId": args.branch_id}
+                for staff_id in staff_ids
+            ]
+            responses, latencies, elapsed = asyncio.run(fire(args.base_url, payloads, args.concurrency))
+
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COUNT(*) FROM lich_lam_viec WHERE ca_lam_id = %s AND ngay_lam = %s",
+                    (shift_id, work_date)
+                )
+                stored = cur.fetchone()[0]
+        finally:
+            cleanup(conn, shift_id)
+
+    created = sum(1 for r in responses if r.status_code == 201)
+    rejected_full = sum(1 for r in responses if r.status_code == 409 and "capacity" in r.text)
+    other = len(responses) - created - rejected_full
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    print(f"requests        : {len(responses)} in {elapsed:.2f}s ({len(responses) / elapsed:.0f} req/s)")
+    print(f"latency p50/p99 : {statistics.median(latencies) * 1000:.1f} / {p99 * 1000:.1f} ms")
+    print(f"created (201)   : {created}")
+    print(f"rejected (full) : {rejected_full}")
+    print(f"other responses : {other}")
+    print(f"rows in DB      : {stored} (capacity {args.capacity})")
+
+    if stored > args.capacity or created > args.capacity:
+        print("FAIL: shift was overbooked")
+        sys.exit(1)
+    if other:
+        print("FAIL: unexpected responses, e.g.", next(r.text for r in responses if r.status_code not in (201, 409)))
+        sys.exit(1)
+    print("OK: no overbooking")
+
+
+if __name__ == "__main__":
+    main()
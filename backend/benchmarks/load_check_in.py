@@ -0,0 +1,135 @@
+"""
+Load test: check-in rush at shift start (POST /api/attendance/check-in)
+
+Tạo --staff nhân viên tạm, rồi bắn đồng thời một check-in cho mỗi người
+(cộng --duplicates check-in lặp lại), sau đó một check-out cho mỗi người.
+Kết quả đúng: mỗi nhân viên có đúng một dòng cham_cong hôm nay, các check-in
+lặp bị từ chối 409, mọi check-out thành công. In p50/p99 và số dòng trên mỗi
+transaction (attendance_write_batch_size trong /metrics). Dữ liệu tạm được
+xóa sau khi chạy.
+
+Cần server đang chạy (python backend/main.py) và migrate_attendance_import.sql.
+
+Chạy:
+    python backend/benchmarks/load_check_in.py --staff 1000 --concurrency 300
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import date
+
+import httpx
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+
+TEST_STAFF_ROLE = "__load_test_check_in__"
+BATCH_METRIC = re.compile(r"^attendance_write_batch_size_(sum|count) (\S+)$", re.M)
+
+
+def setup(conn, staff: int):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO nhan_vien (ho_ten, chuc_vu, so_dien_thoai, trang_thai, avatar)
+            SELECT 'Load Test ' || g, %s, '000' || g, 'Đang làm', 'LT'
+            FROM generate_series(1, %s) g
+            RETURNING id
+        """, (TEST_STAFF_ROLE, staff))
+        staff_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return staff_ids
+
+
+def cleanup(conn, staff_ids: list):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM cham_cong WHERE nhan_vien_id = ANY(%s)", (staff_ids,))
+        cur.execute("DELETE FROM nhan_vien WHERE chuc_vu = %s", (TEST_STAFF_ROLE,))
+    conn.commit()
+
+
+def batch_totals(client_metrics: str):
+    values = dict(BATCH_METRIC.findall(client_metrics))
+    return float(values.get("sum", 0)), float(values.get("count", 0))
+
+
+async def fire(client, path: str, payloads: list, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(payload):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter() - started)
+            return response
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(one(p) for p in payloads))
+    return responses, sorted(latencies), time.perf_counter() - started
+
+
+def report(name: str, responses, latencies, elapsed):
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    codes = {}
+    for r in responses:
+        codes[r.status_code] = codes.get(r.status_code, 0) + 1
+    print(f"{name:<10} {len(responses)} in {elapsed:.2f}s ({len(responses) / elapsed:.0f} req/s)  "
+          f"p50 {statistics.median(latencies) * 1000:.1f} ms  p99 {p99 * 1000:.1f} ms  status {codes}")
+    return codes
+
+
+async def run(args, staff_ids):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60) as client:
+        before = batch_totals((await client.get("/metrics")).text)
+        check_ins = [{"staffId": s} for s in staff_ids] + [{"staffId": s} for s in staff_ids[:args.duplicates]]
+        in_codes = report("check-in", *await fire(client, "/api/attendance/check-in", check_ins, args.concurrency))
+        out_codes = report("check-out", *await fire(
+            client, "/api/attendance/check-out", [{"staffId": s} for s in staff_ids], args.concurrency
+        ))
+        after = batch_totals((await client.get("/metrics")).text)
+    batches = after[1] - before[1]
+    if batches:
+        print(f"batches    {batches:.0f}, {(after[0] - before[0]) / batches:.1f} events per transaction")
+    return in_codes, out_codes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--staff", type=int, default=1000)
+    parser.add_argument("--duplicates", type=int, default=50, help="Repeated check-ins expected to get 409")
+    parser.add_argument("--concurrency", type=int, default=300)
+    args = parser.parse_args()
+    args.duplicates = min(args.duplicates, args.staff)
+
+    with psycopg.connect(**DB_CONFIG) as conn:
+        staff_ids = setup(conn, args.staff)
+        try:
+            in_codes, out_codes = asyncio.run(run(args, staff_ids))
+            with conn.cursor() as cur:
+                cur.execute(
+                    "SELECT COUNT(*), COUNT(gio_ra) FROM cham_cong WHERE nhan_vien_id = ANY(%s) AND ngay = %s",
+                    (staff_ids, date.today())
+                )
+                rows, closed = cur.fetchone()
+        finally:
+            cleanup(conn, staff_ids)
+
+    print(f"rows in DB {rows} (expected {args.staff}), checked out {closed}")
+    if rows != args.staff or in_codes.get(201) != args.staff or in_codes.get(409, 0) != args.duplicates:
+        print("FAIL: check-ins were lost or duplicated")
+        sys.exit(1)
+    if out_codes.get(200) != args.staff or closed != args.staff:
+        print("FAIL: check-outs were lost")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Seed a benchmark database at a configurable scale
+
+Xóa sạch và tạo lại dữ liệu của các bảng nghiệp vụ (chi_nhanh, nhan_vien,
+cau_hinh_luong, cau_hinh_ca, cham_cong, lich_lam_viec, ...) bằng bộ sinh dữ
+liệu giả lập phu_ai/synthetic_data.py (nạp bằng COPY, như generate_data.py)
+với một cấu hình có sẵn --scale (SCALES: tiny / small / medium / large, bản
+large có khoảng 5 triệu dòng cham_cong). Cùng --scale, --seed và --today ->
+cùng dữ liệu, để báo cáo của bench_endpoints.py so sánh được giữa các commit.
+
+CHỈ chạy trên database dành riêng cho benchmark (đã chạy đủ các file
+migrate_*.sql); dùng cùng biến môi trường DB_* như backend và bắt buộc --yes.
+
+Chạy:
+    DB_NAME=restaurant_bench python backend/benchmarks/seed_benchmark_data.py --scale large --yes
+    DB_NAME=restaurant_bench python backend/benchmarks/seed_benchmark_data.py --branches 20 --staff-per-branch 100 --yes
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import psycopg
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from db_config import DB_CONFIG  # noqa: E402
+from phu_ai.synthetic_data import SCALES, SyntheticDataset, load, scale_config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--branches", type=int)
+    parser.add_argument("--staff-per-branch", type=int)
+    parser.add_argument("--history-days", type=int, help="Past days with roster and attendance")
+    parser.add_argument("--today", type=date.fromisoformat, default=date.today(),
+                        help="Anchor date (YYYY-MM-DD); fix it to compare reports across days")
+    parser.add_argument("--yes", action="store_true", help="Confirm that the target database may be wiped")
+    args = parser.parse_args()
+
+    overrides = {
+        key: getattr(args, key)
+        for key in ("branches", "staff_per_branch", "history_days")
+        if getattr(args, key) is not None
+    }
+    config = scale_config(args.scale, seed=args.seed, today=args.today, **overrides)
+
+    target = f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
+    if not args.yes:
+        print(f"This wipes all restaurant data in {target}. Re-run with --yes to continue.")
+        sys.exit(1)
+
+    print(f"Seeding {target} ({args.scale}): {config}")
+    started = time.perf_counter()
+    last = [started]
+
+    def progress(table, rows):
+        now = time.perf_counter()
+        print(f"  {table:<16} {rows:>10} rows  {now - last[0]:6.1f}s")
+        last[0] = now
+
+    with psycopg.connect(**DB_CONFIG) as conn:
+        load(conn, SyntheticDataset(config), progress=progress)
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
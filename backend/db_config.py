@@ -0,0 +1,17 @@
+"""
+Database connection settings (Kết nối Database)
+
+Kept apart from main.py so scripts and tests can connect without importing
+the API (which starts the logging thread and registers the app).
+"""
+import os
+
+# Cấu hình đọc từ biến môi trường (mặc định giữ nguyên môi trường dev cũ)
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": os.getenv("DB_PORT", "5433"),
+    "dbname": os.getenv("DB_NAME", "postgres"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "123"),
+    "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5")),
+}
@@ -1,10 +1,57 @@
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, Header, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+import asyncio
+import base64
+import bisect
+import codecs
+import csv
+import atexit
+import contextlib
+import contextvars
+import hashlib
+import io
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import tempfile
+import time
+import uuid
+import psycopg
+import psycopg.errors
+from psycopg.pq import TransactionStatus
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from db_config import DB_CONFIG
+from phu_ai.payroll_simulation import PayrollDataset, Scenario
+from phu_ai.processor import ShiftTemplate, StaffMember, generate_week_roster
+from phu_ai.work_hours import WORK_HOURS_SQL, calculate_work_hours
+
+try:
+    from brotli_asgi import BrotliMiddleware  # optional: pip install brotli-asgi
+except ImportError:
+    BrotliMiddleware = None
+try:
+    import orjson  # optional: pip install orjson (falls back to json)
+except ImportError:
+    orjson = None
+try:
+    import openpyxl  # optional: pip install openpyxl (XLSX import/export)
+    from openpyxl.cell import WriteOnlyCell
+except ImportError:
+    openpyxl = None
 
 app = FastAPI()
 
@@ -47,11 +94,77 @@ class ShiftAssignment(BaseModel):
     date: str  # Format: "YYYY-MM-DD"
     branchId: Optional[int] = None
 
+class BulkShiftAssignment(BaseModel):
+    assignments: List[ShiftAssignment]
+    allOrNothing: bool = False  # True: insert nothing if any item fails
+
+class RosterGenerateRequest(BaseModel):
+    weekStart: str  # Format: "YYYY-MM-DD"
+    branchIds: Optional[List[int]] = None  # Optional: only these branches (default: all)
+    maxShiftsPerStaff: int = 6
+    minRestHours: float = 8
+
+# Response models (documented in OpenAPI; the large lists are serialized by fast_json_response)
+class RosterEntry(BaseModel):
+    id: int
+    staffId: int
+    staffName: str
+    avatar: Optional[str] = None
+    date: str  # "YYYY-MM-DD"
+    shiftTemplateId: int
+    shiftName: str
+    shiftStartTime: str  # "HH:MM"
+    shiftEndTime: str
+    branchId: Optional[int] = None
+    branchName: str
+
+class TimesheetDay(BaseModel):
+    # Field names mirror the JSON keys ("in" is a Python keyword)
+    checkIn: str = Field(alias="in")
+    checkOut: str = Field(alias="out")
+    hours: float
+    status: Optional[str] = None
+
+class TimesheetEntry(BaseModel):
+    staffId: int
+    staffName: str
+    avatar: Optional[str] = None
+    role: Optional[str] = None
+    branchName: str
+    totalHours: float
+    attendance: Dict[str, TimesheetDay]  # keyed by "YYYY-MM-DD"
+
+class ClockEvent(BaseModel):
+    staffId: int
+    time: Optional[str] = None  # "HH:MM" from the time clock, default: server time
+
 class PayrollConfigCreate(BaseModel):
     staffId: int
     type: str  # 'THEO_GIO' or 'THEO_THANG'
     amount: float  # Hourly rate or monthly salary
 
+class PayrollPeriodClose(BaseModel):
+    month: int  # 1-12
+    year: int   # YYYY
+
+class PayrollScenario(BaseModel):
+    name: str
+    # Filters: which staff the change applies to (all must match)
+    role: Optional[str] = None
+    branchId: Optional[int] = None
+    staffIds: Optional[List[int]] = None
+    currentSalaryType: Optional[str] = None  # 'THEO_GIO' or 'THEO_THANG'
+    # Changes
+    ratePercent: float = 0  # e.g. 5 = +5% on the rate/salary
+    newAmount: Optional[float] = None  # Replace the rate/salary
+    newSalaryType: Optional[str] = None  # Switch salary type
+
+class PayrollSimulationRequest(BaseModel):
+    startMonth: str  # Format: "YYYY-MM"
+    endMonth: str    # Format: "YYYY-MM" (inclusive)
+    branchId: Optional[int] = None  # Optional: limit the simulation to one branch
+    scenarios: List[PayrollScenario]
+
 # --- Cấu hình CORS (Để React gọi được) ---
 app.add_middleware(
     CORSMiddleware,
@@ -59,44 +172,1156 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the React app read pagination / payroll metadata headers
+    expose_headers=["X-Next-Cursor", "X-Payroll-Period", "ETag", "X-Request-ID", "Content-Disposition"],
+)
+
+# --- Nén response (gzip / brotli) ---
+# Large JSON lists (roster, timesheet, payroll) compress ~10x; small bodies are
+# sent as-is, and so are XLSX exports (already zipped, see export_rows_response).
+# Brotli is used when brotli-asgi is installed, gzip otherwise.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+
+# --- Logging ---
+# Structured (JSON lines by default), leveled logging. Handlers never block a
+# request: records go through a QueueHandler and are written to stdout by a
+# QueueListener thread. Every record carries the request ID of the request
+# that produced it (X-Request-ID, generated when the client sends none).
+# DEBUG detail (payloads, per-step traces) is off unless the route is sampled:
+# LOG_DEBUG_SAMPLE_RATES="POST /api/branches=1,/api/staff=0.1" turns it on for
+# all POSTs under /api/branches and 10% of requests under /api/staff.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_DEBUG_SAMPLE_RATES = os.getenv("LOG_DEBUG_SAMPLE_RATES", "")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+request_debug_var = contextvars.ContextVar("request_debug", default=False)
+
+# Attributes every LogRecord has; anything else was passed via extra={...}
+STANDARD_LOG_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "requestId"}
+
+def parse_sample_rates(spec: str) -> List[tuple]:
+    """"[METHOD ]prefix=rate,..." -> [(method or None, prefix, rate)], longest prefix first"""
+    rules = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, rate = item.rpartition("=")
+        method, _, prefix = route.strip().rpartition(" ")
+        rules.append((method.upper() or None, prefix, float(rate)))
+    return sorted(rules, key=lambda rule: (len(rule[1]), rule[0] is not None), reverse=True)
+
+LOG_SAMPLE_RULES = parse_sample_rates(LOG_DEBUG_SAMPLE_RATES)
+
+def debug_sample_rate(method: str, path: str) -> float:
+    for rule_method, prefix, rate in LOG_SAMPLE_RULES:
+        if path.startswith(prefix) and rule_method in (None, method):
+            return rate
+    return 0.0
+
+class RequestContextFilter(logging.Filter):
+    """Runs in the caller's thread: attach the request ID, drop unsampled DEBUG records"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.requestId = request_id_var.get()
+        return record.levelno > logging.DEBUG or request_debug_var.get()
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.requestId:
+            entry["requestId"] = record.requestId
+        for key, value in vars(record).items():
+            if key not in STANDARD_LOG_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=log_json_default)
+
+def log_json_default(value):
+    # Request models are logged as-is and only converted if the record is written
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return str(value)
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge args and render the traceback in the caller, leave the rest to the listener thread"""
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def setup_logging() -> logging.handlers.QueueListener:
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonLogFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(requestId)s] %(name)s: %(message)s"))
+    log_queue = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    app_logger = logging.getLogger("restaurant_ai")
+    app_logger.handlers = [queue_handler]
+    app_logger.propagate = False
+    # Sampled routes need DEBUG records to reach the handler filter
+    app_logger.setLevel(logging.DEBUG if LOG_SAMPLE_RULES else LOG_LEVEL)
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+log_listener = setup_logging()
+logger = logging.getLogger("restaurant_ai.api")
+
+# Flush queued records after every shutdown hook has logged
+atexit.register(log_listener.stop)
+
+# --- Metrics (Prometheus) ---
+# In-process counters and histograms exported at GET /metrics in the Prometheus
+# text format. Everything is updated on the event loop thread (no locks) and
+# costs a dict lookup plus a bisect per observation. Each uvicorn worker keeps
+# its own numbers: scrape every worker, or run one worker per port.
+METRIC_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.series = {}
+
+    def label_text(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{escape_label_value(value)}"' for label, value in zip(self.labels, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, values: tuple = (), amount: float = 1):
+        self.series[values] = self.series.get(values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for values, total in self.series.items():
+            lines.append(f"{self.name}{self.label_text(values)} {total}")
+        return lines
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = METRIC_LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = buckets
+
+    def observe(self, values: tuple, amount: float):
+        series = self.series.get(values)
+        if series is None:
+            # One slot per bucket + "+Inf", then sum
+            series = self.series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, amount)] += 1
+        series[-1] += amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for values, series in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = self.label_text(values, 'le="' + le + '"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self.label_text(values)} {series[-1]}")
+            lines.append(f"{self.name}_count{self.label_text(values)} {cumulative}")
+        return lines
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), buckets=METRIC_SIZE_BUCKETS
+)
+HTTP_ERRORS = Counter("http_errors_total", "Unhandled exceptions and 5xx responses by route and type", ("route", "type"))
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed while handling a route", ("route",))
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Time spent in SQL statements while handling a route", ("route",))
+DB_REQUEST_LATENCY = Histogram("http_request_db_seconds", "Time spent in SQL per request", ("route",))
+DB_STATEMENT_LATENCY = Histogram("db_statement_duration_seconds", "Latency of single SQL statements")
+DB_ERRORS = Counter("db_errors_total", "SQL errors by psycopg exception type", ("type",))
+DB_ACQUIRE_LATENCY = Histogram("db_pool_acquire_seconds", "Time to check out a pooled connection")
+DB_ACQUIRE_ERRORS = Counter("db_pool_acquire_errors_total", "Failed pool checkouts by exception type", ("type",))
+METRICS = [
+    HTTP_REQUESTS, HTTP_LATENCY, HTTP_RESPONSE_SIZE, HTTP_ERRORS, DB_QUERIES, DB_QUERY_SECONDS, DB_REQUEST_LATENCY,
+    DB_STATEMENT_LATENCY, DB_ERRORS, DB_ACQUIRE_LATENCY, DB_ACQUIRE_ERRORS,
+]
+
+DB_REPEATED_STATEMENTS = Counter(
+    "db_repeated_statements_total", "Requests that ran one statement more than N_PLUS_ONE_THRESHOLD times", ("route",)
 )
+METRICS.append(DB_REPEATED_STATEMENTS)
+
+# --- Query instrumentation ---
+# Every pooled connection creates InstrumentedCursor / InstrumentedServerCursor
+# (configure_db_connection), so all handlers are covered without changes.
+# Each statement records SQL text, parameter shape (types and list lengths,
+# never values), duration and row count:
+# - statements slower than SLOW_QUERY_MS are logged at WARNING
+# - sampled requests (LOG_DEBUG_SAMPLE_RATES) log every statement at DEBUG
+# - a statement executed more than N_PLUS_ONE_THRESHOLD times in one request is
+#   flagged as a likely N+1 loop; with N_PLUS_ONE_STRICT=1 (tests) it raises
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "20"))
+N_PLUS_ONE_STRICT = os.getenv("N_PLUS_ONE_STRICT", "0") == "1"
+
+class NPlusOneDetected(RuntimeError):
+    """Raised in N_PLUS_ONE_STRICT mode when a request repeats one statement too often"""
+
+class RequestDbStats:
+    __slots__ = ("count", "seconds", "executions", "repeated", "streamed")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Set by require_db_pool(): the body queries after the headers are sent
+        self.streamed = False
+        # SQL string -> executions in this request
+        self.executions = {}
+        self.repeated = []
+
+request_db_stats_var = contextvars.ContextVar("request_db_stats", default=None)
+
+def sql_text(query) -> str:
+    text = query if isinstance(query, str) else str(query)
+    return " ".join(text.split())
+
+def value_shape(value) -> str:
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+def params_shape(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: value_shape(value) for key, value in params.items()}
+    return [value_shape(value) for value in params]
+
+def record_db_statement(query, params, seconds: float, rows: Optional[int], batch: Optional[int] = None):
+    DB_STATEMENT_LATENCY.observe((), seconds)
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    if slow or request_debug_var.get():
+        details = {
+            "sql": sql_text(query),
+            "params": params_shape(params),
+            "durationMs": round(seconds * 1000, 1),
+            "rows": rows,
+        }
+        if batch is not None:
+            details["batch"] = batch
+        if slow:
+            logger.warning("slow query", extra=details)
+        else:
+            logger.debug("query", extra=details)
+    
+    stats = request_db_stats_var.get()
+    if stats is None:
+        return
+    stats.count += 1
+    stats.seconds += seconds
+    executions = stats.executions.get(query, 0) + 1
+    stats.executions[query] = executions
+    if executions == N_PLUS_ONE_THRESHOLD + 1:
+        stats.repeated.append(query)
+        logger.warning("possible N+1 query", extra={"sql": sql_text(query), "executions": executions})
+        if N_PLUS_ONE_STRICT:
+            raise NPlusOneDetected(
+                f"Statement executed more than {N_PLUS_ONE_THRESHOLD} times in one request: {sql_text(query)[:200]}"
+            )
+
+class InstrumentedCursor(psycopg.AsyncCursor):
+    """Cursor class of every pooled connection: see Query instrumentation"""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            await super().execute(query, params, **kwargs)
+        except psycopg.Error as e:
+            DB_ERRORS.inc((type(e).__name__,))
+            record_db_statement(query, params, time.perf_counter() - started, None)
+            raise
+        record_db_statement(query, params, time.perf_counter() - started, self.rowcount)
+        return self
+
+    async def executemany(self, query, params_seq, **kwargs):
+        params_seq = list(params_seq)
+        first = params_seq[0] if params_seq else None
+        started = time.perf_counter()
+        try:
+            await super().executemany(query, params_seq, **kwargs)
+        except psycopg.Error as e:
+            DB_ERRORS.inc((type(e).__name__,))
+            record_db_statement(query, first, time.perf_counter() - started, None, len(params_seq))
+            raise
+        record_db_statement(query, first, time.perf_counter() - started, self.rowcount, len(params_seq))
+
+class InstrumentedServerCursor(psycopg.AsyncServerCursor):
+    """Named (server-side) cursors: times the DECLARE, rows are streamed afterwards"""
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            await super().execute(query, params, **kwargs)
+        except psycopg.Error as e:
+            DB_ERRORS.inc((type(e).__name__,))
+            record_db_statement(query, params, time.perf_counter() - started, None)
+            raise
+        record_db_statement(query, params, time.perf_counter() - started, None)
+        return self
+
+@app.middleware("http")
+async def request_context_middleware(request, call_next):
+    """
+    Request ID + debug sampling for logs, per-route metrics.
+    Metrics and the access log are recorded once the body has been sent
+    (track_response_body), so streamed downloads count their full duration and size.
+    """
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    rate = debug_sample_rate(request.method, request.url.path)
+    db_stats = RequestDbStats()
+    tokens = (
+        request_id_var.set(request_id),
+        request_debug_var.set(rate > 0 and random.random() < rate),
+        request_db_stats_var.set(db_stats),
+    )
+    started = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception as e:
+        logger.exception("request failed", extra={"method": request.method, "path": request.url.path})
+        record_request(request, 500, time.perf_counter() - started, db_stats, 0, type(e).__name__)
+        reset_request_context(tokens)
+        raise
+    response.headers["X-Request-ID"] = request_id
+    # A streamed body has not run yet: its DB time is only in the completion metrics
+    if not db_stats.streamed:
+        response.headers["Server-Timing"] = f'db;dur={db_stats.seconds * 1000:.1f};desc="{db_stats.count} queries"'
+    response.body_iterator = track_response_body(response.body_iterator, request, response.status_code, started, db_stats, tokens)
+    return response
+
+async def track_response_body(body, request, status_code: int, started: float, db_stats, tokens):
+    """Pass the body through, then record the request (errors while streaming count once)"""
+    size = 0
+    error = None
+    try:
+        async for chunk in body:
+            size += len(chunk)
+            yield chunk
+    except Exception as e:
+        error = type(e).__name__
+        logger.exception("response stream failed", extra={"method": request.method, "path": request.url.path})
+        raise
+    finally:
+        record_request(request, status_code, time.perf_counter() - started, db_stats, size, error)
+        reset_request_context(tokens)
+
+def reset_request_context(tokens):
+    # A body generator finalized by the garbage collector runs in another context
+    with contextlib.suppress(ValueError):
+        for var, token in zip((request_id_var, request_debug_var, request_db_stats_var), tokens):
+            var.reset(token)
+
+def record_request(request, status_code: int, elapsed: float, db_stats, size: int, error: Optional[str] = None):
+    """Per-route metrics + access log; an exception is one http_errors_total sample, else 5xx are"""
+    route = route_label(request)
+    HTTP_REQUESTS.inc((request.method, route, status_code))
+    HTTP_LATENCY.observe((request.method, route), elapsed)
+    HTTP_RESPONSE_SIZE.observe((request.method, route), size)
+    if error:
+        HTTP_ERRORS.inc((route, error))
+    elif status_code >= 500:
+        HTTP_ERRORS.inc((route, f"http_{status_code}"))
+    DB_QUERIES.inc((route,), db_stats.count)
+    DB_QUERY_SECONDS.inc((route,), db_stats.seconds)
+    DB_REQUEST_LATENCY.observe((route,), db_stats.seconds)
+    if db_stats.repeated:
+        DB_REPEATED_STATEMENTS.inc((route,))
+    logger.info("request", extra={
+        "method": request.method,
+        "path": request.url.path,
+        "status": status_code,
+        "durationMs": round(elapsed * 1000, 1),
+        "bytes": size,
+        "dbQueries": db_stats.count,
+        "dbMs": round(db_stats.seconds * 1000, 1),
+    })
+
+def route_label(request) -> str:
+    """Route template (/api/staff/{staff_id}), so ids do not explode the label set"""
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    if db_pool is not None:
+        stats = db_pool.get_stats()
+        for name, key, help_text in (
+            ("db_pool_size", "pool_size", "Open connections in the pool"),
+            ("db_pool_available", "pool_available", "Idle connections in the pool"),
+            ("db_pool_waiting", "requests_waiting", "Requests waiting for a connection"),
+        ):
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {stats.get(key, 0)}"])
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # --- Kết nối Database ---
-def get_db_connection():
+# DB_CONFIG (db_config.py) đọc từ biến môi trường
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+# Seconds to wait for a free connection before answering 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Idle connections above min size are closed after this many seconds
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+db_pool: Optional[AsyncConnectionPool] = None
+
+async def configure_db_connection(conn):
+    """Every new pooled connection creates instrumented cursors (see Query instrumentation)"""
+    conn.cursor_factory = InstrumentedCursor
+    conn.server_cursor_factory = InstrumentedServerCursor
+
+@app.on_event("startup")
+async def init_db_pool():
+    """
+    Open the shared async connection pool for this worker process
+    (each uvicorn worker runs its own startup hook, so each gets its own pool)
+    """
+    global db_pool
+    db_pool = AsyncConnectionPool(
+        conninfo="",
+        kwargs=DB_CONFIG,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        max_idle=DB_POOL_MAX_IDLE,
+        # Health-check every connection on checkout, dead ones are replaced
+        check=AsyncConnectionPool.check_connection,
+        configure=configure_db_connection,
+        open=False,
+    )
     try:
-        conn = psycopg2.connect(
-            host="localhost",
-            database="postgres", # <--- QUAN TRỌNG: Đã đổi tên DB thành RestaurantAI
-            user="postgres",
-            password="123",        # <--- Password của bạn
-            port="5433"            # <--- Port của bạn
-        )
-        return conn
+        await db_pool.open(wait=True, timeout=DB_POOL_TIMEOUT)
+        logger.info("db pool ready", extra={"minSize": DB_POOL_MIN, "maxSize": DB_POOL_MAX, "db": f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"})
+        async with db_pool.connection() as conn:
+            await detect_staff_search(conn)
     except Exception as e:
-        print("Lỗi kết nối Database:", e)
+        # Keep the pool open: it keeps retrying in the background until Postgres is up
+        logger.error("Lỗi kết nối Database: %s", e)
+
+@app.on_event("shutdown")
+async def close_db_pool():
+    global db_pool
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+        logger.info("db pool closed")
+
+async def get_db_connection():
+    """
+    Check out a healthy connection from the pool.
+    Callers must hand it back with release_db_connection(conn).
+    """
+    if db_pool is None:
+        return None
+    started = time.perf_counter()
+    try:
+        conn = await db_pool.getconn()
+    except Exception as e:
+        DB_ACQUIRE_ERRORS.inc((type(e).__name__,))
+        logger.error("Lỗi kết nối Database: %s", e)
+        return None
+    finally:
+        DB_ACQUIRE_LATENCY.observe((), time.perf_counter() - started)
+    if staff_search_trgm is None:
+        # Postgres was down at startup: detect on the first connection instead
+        await detect_staff_search(conn)
+    return conn
+
+async def release_db_connection(conn):
+    """
+    Return a connection to the pool. Read-only handlers leave their implicit
+    transaction open: end it here, so the pool does not have to (it logs a
+    warning for every connection it rolls back itself).
+    """
+    if conn is None:
+        return
+    if db_pool is None:
+        await conn.close()
+        return
+    tx_status = conn.info.transaction_status
+    if tx_status in (TransactionStatus.INTRANS, TransactionStatus.INERROR):
+        try:
+            await conn.rollback()
+        except psycopg.Error:
+            # Broken connection: the pool discards it on putconn
+            pass
+    await db_pool.putconn(conn)
+
+@contextlib.asynccontextmanager
+async def streaming_db_connection():
+    """
+    Connection for the body of a StreamingResponse, checked out when the body
+    starts. Starlette never closes a body generator it did not start (client
+    gone before the first chunk), so a connection taken in the handler and
+    released in the generator's finally would never go back to the pool.
+    """
+    conn = await get_db_connection()
+    if not conn:
+        raise ConnectionError("Cannot connect to database")
+    try:
+        yield conn
+    finally:
+        await release_db_connection(conn)
+
+def require_db_pool():
+    """503 up front for streaming endpoints, whose body only connects later"""
+    db_stats = request_db_stats_var.get()
+    if db_stats is not None:
+        db_stats.streamed = True
+    if db_pool is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+
+@app.get("/api/db-pool-stats")
+async def get_db_pool_stats():
+    """
+    Pool usage for this worker process
+    """
+    if db_pool is None:
+        return {"available": False, "minSize": DB_POOL_MIN, "maxSize": DB_POOL_MAX}
+    stats = db_pool.get_stats()
+    return {
+        "available": True,
+        "minSize": DB_POOL_MIN,
+        "maxSize": DB_POOL_MAX,
+        "open": stats.get("pool_size", 0),
+        "idle": stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "checkouts": stats.get("requests_num", 0),
+        "checkoutErrors": stats.get("requests_errors", 0),
+        "checkoutWaitMs": stats.get("requests_wait_ms", 0),
+        "healthCheckFailures": stats.get("connections_lost", 0),
+    }
+
+# --- Cache dữ liệu tham chiếu (chi nhánh, ca làm) ---
+# chi_nhanh / cau_hinh_ca change a few times a month but are read on almost
+# every screen: each worker keeps the full lists in memory. Writers send
+# pg_notify(REFERENCE_CACHE_CHANNEL, name) inside their transaction, Postgres
+# delivers it on COMMIT to the LISTEN connection of every worker, which drops
+# its copy. The cache is only used while that listener is connected, so a
+# worker never serves data it might not hear about.
+REFERENCE_CACHE_CHANNEL = "reference_data_changed"
+REFERENCE_CACHE_NAMES = ("branches", "shift_templates")
+REFERENCE_CACHE_ENABLED = os.getenv("REFERENCE_CACHE_ENABLED", "1") != "0"
+REFERENCE_LISTEN_RETRY_SECONDS = float(os.getenv("REFERENCE_LISTEN_RETRY_SECONDS", "5"))
+
+reference_cache = {}
+# Bumped on every invalidation so a load that raced with a write is not stored
+reference_cache_versions = {name: 0 for name in REFERENCE_CACHE_NAMES}
+reference_listener_connected = False
+reference_listener_task: Optional[asyncio.Task] = None
+
+def invalidate_reference_cache(name: Optional[str] = None):
+    """Drop one cached list (or all of them when name is None / unknown)"""
+    names = [name] if name in REFERENCE_CACHE_NAMES else REFERENCE_CACHE_NAMES
+    for cache_name in names:
+        reference_cache.pop(cache_name, None)
+        reference_cache_versions[cache_name] += 1
+
+async def notify_reference_change(cursor, name: str):
+    """Queue the invalidation in the caller's transaction (delivered on COMMIT only)"""
+    await cursor.execute("SELECT pg_notify(%s, %s)", (REFERENCE_CACHE_CHANNEL, name))
+
+async def get_reference_data(name: str, query: str):
+    """
+    Full list for a reference table, from memory when possible.
+    Returns None if the database is unavailable.
+    """
+    cached = reference_cache.get(name)
+    if cached is not None and reference_listener_connected:
+        return cached
+    
+    version = reference_cache_versions[name]
+    conn = await get_db_connection()
+    if not conn:
+        return None
+    cursor = conn.cursor(row_factory=dict_row)
+    try:
+        await cursor.execute(query)
+        rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    
+    if REFERENCE_CACHE_ENABLED and reference_listener_connected and reference_cache_versions[name] == version:
+        reference_cache[name] = rows
+    return rows
+
+async def listen_reference_changes():
+    """Background task: LISTEN on a dedicated connection, reconnect on failure"""
+    global reference_listener_connected
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(
+                **DB_CONFIG, autocommit=True, keepalives=1, keepalives_idle=30
+            ) as conn:
+                await conn.execute(f"LISTEN {REFERENCE_CACHE_CHANNEL}")
+                # Changes made while disconnected were missed
+                invalidate_reference_cache()
+                reference_listener_connected = True
+                logger.info("reference cache listening", extra={"channel": REFERENCE_CACHE_CHANNEL})
+                async for notify in conn.notifies():
+                    invalidate_reference_cache(notify.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("reference cache listener disconnected: %s", e)
+        finally:
+            reference_listener_connected = False
+            invalidate_reference_cache()
+        await asyncio.sleep(REFERENCE_LISTEN_RETRY_SECONDS)
+
+@app.on_event("startup")
+async def start_reference_listener():
+    global reference_listener_task
+    if REFERENCE_CACHE_ENABLED:
+        reference_listener_task = asyncio.create_task(listen_reference_changes())
+
+@app.on_event("shutdown")
+async def stop_reference_listener():
+    global reference_listener_task
+    if reference_listener_task is not None:
+        reference_listener_task.cancel()
+        try:
+            await reference_listener_task
+        except asyncio.CancelledError:
+            pass
+        reference_listener_task = None
+
+# --- Lọc theo ngày ---
+# Every date filter on cham_cong is a half-open range (ngay >= start AND ngay < end)
+# so Postgres can use the (ngay) / (nhan_vien_id, ngay) indexes from
+# migrate_cham_cong_indexes.sql instead of scanning the whole table.
+def parse_iso_date(value: str, field: str) -> date:
+    try:
+        return date.fromisoformat(value.strip())
+    except (ValueError, AttributeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} must be in YYYY-MM-DD format"
+        )
+
+def month_date_range(month: int, year: int):
+    """[first day of month, first day of next month)"""
+    if month < 1 or month > 12:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Month must be between 1 and 12"
+        )
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+# --- Phân trang (keyset) ---
+# List endpoints return a plain JSON array (what the React app expects);
+# when more rows exist, the opaque token for the next page is sent in the
+# X-Next-Cursor header and passed back as ?cursor=...
+DEFAULT_PAGE_LIMIT = int(os.getenv("DEFAULT_PAGE_LIMIT", "500"))
+MAX_PAGE_LIMIT = int(os.getenv("MAX_PAGE_LIMIT", "2000"))
+
+def clamp_page_limit(limit: Optional[int]) -> int:
+    if not limit:
+        return DEFAULT_PAGE_LIMIT
+    return max(1, min(limit, MAX_PAGE_LIMIT))
+
+def encode_cursor(values: list) -> str:
+    """Keyset values of the last returned row -> opaque URL-safe token"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("wrong cursor size")
+        return values
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor"
+        )
+
+def paginate_rows(rows: list, limit: int, response: Response, key) -> list:
+    """
+    Rows were fetched with LIMIT limit + 1: trim the extra row and, if it
+    existed, advertise the cursor built from key(last_row).
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(key(rows[-1]))
+    return rows
+
+# --- ETag / conditional GET ---
+# Strong ETags built from the data versions behind a response plus the query
+# parameters. Versions are read before the data, so an ETag can only be older
+# than the body it labels, never newer. A matching If-None-Match gets 304
+# before the main query runs.
+# Versions are table-wide counters kept by triggers in phien_ban_du_lieu
+# (migrate_data_versions.sql), so revalidation is a primary key lookup whatever
+# range the request covers; any write to a table changes every ETag built on it.
+# Hot tables (nhan_vien, lich_lam_viec, cham_cong) spread their counter over
+# 16 rows picked by backend PID, so concurrent writers rarely wait on one lock.
+# Staff names / avatars / branches appear in most responses, hence nhan_vien.
+ROSTER_DATA_TABLES = ("cau_hinh_ca", "chi_nhanh", "lich_lam_viec", "nhan_vien")
+TIMESHEET_DATA_TABLES = ("chi_nhanh", "cham_cong", "nhan_vien")
+PAYROLL_CONFIG_DATA_TABLES = ("cau_hinh_luong", "chi_nhanh", "nhan_vien")
+
+async def build_data_etag(conn, name: str, tables, params) -> Optional[str]:
+    """
+    ETag for the current versions of `tables` and the request parameters.
+    None if versioning (phien_ban_du_lieu) is not installed.
+    """
+    cursor = conn.cursor()
+    try:
+        await cursor.execute("""
+            SELECT ten_bang, SUM(phien_ban) FROM phien_ban_du_lieu
+            WHERE ten_bang = ANY(%s)
+            GROUP BY ten_bang
+            ORDER BY ten_bang
+        """, (list(tables),))
+        versions = await cursor.fetchall()
+    except psycopg.errors.UndefinedTable:
+        await conn.rollback()
         return None
+    digest = hashlib.sha1(repr((name, versions, params)).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not etag or not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def not_modified_response(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def set_etag(response: Response, etag: Optional[str]):
+    if etag:
+        response.headers["ETag"] = etag
+        # Browsers may keep the body but must revalidate before reusing it
+        response.headers["Cache-Control"] = "no-cache"
+
+# --- JSON nhanh ---
+# Large list endpoints fetch plain tuples, map the column names once and
+# serialize with orjson straight to bytes, skipping jsonable_encoder and
+# response_model validation (the models above still document the shape).
+def json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+def dump_json(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, default=json_default)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=json_default).encode("utf-8")
+
+def fast_json_response(data, response: Response) -> Response:
+    """JSON body from dump_json, keeping headers already set on `response` (ETag, X-Next-Cursor)"""
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=dump_json(data), media_type="application/json", headers=headers)
+
+def rows_to_dicts(cursor, rows) -> List[dict]:
+    columns = [column.name for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+# --- Nhập / xuất file (CSV, XLSX) ---
+# Imports read the raw request body (Content-Type text/csv or the XLSX type)
+# instead of multipart, so nothing is spooled before the handler runs; exports
+# read through a server-side cursor EXPORT_CHUNK_ROWS at a time.
+EXPORT_CHUNK_ROWS = 2000
+IMPORT_SPOOL_MEMORY_BYTES = 8 * 1024 * 1024
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Text a spreadsheet would evaluate as a formula when the file is opened
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_cell(value):
+    """CSV value; text that would start a formula gets a leading ' (dropped again on import)"""
+    if isinstance(value, str) and value.lstrip("'").startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_import_field(field: str) -> str:
+    """Undo csv_cell() for a field of an uploaded CSV"""
+    if field[:1] == "'" and field.lstrip("'").startswith(FORMULA_PREFIXES):
+        return field[1:]
+    return field
+
+def file_format(format: Optional[str], content_type: Optional[str] = None) -> str:
+    """'csv' or 'xlsx' from the format parameter, else the Content-Type; 400/501 otherwise"""
+    if not format:
+        format = "xlsx" if content_type and content_type.startswith(XLSX_MEDIA_TYPE) else "csv"
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be 'csv' or 'xlsx'"
+        )
+    if format == "xlsx" and openpyxl is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="XLSX support needs openpyxl (pip install openpyxl)"
+        )
+    return format
+
+async def iter_csv_records(request: Request):
+    """
+    Complete CSV records of the request body, one list per network chunk,
+    as (line number, text). A quoted field spanning lines stays in one record.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    record = ""
+    record_line = line_number = 1
+    async for chunk in request.stream():
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        records = []
+        for line in lines:
+            if not record:
+                record_line = line_number
+            line_number += 1
+            record += line + "\n"
+            if record.count('"') % 2 == 0:
+                records.append((record_line, record))
+                record = ""
+        if records:
+            yield records
+    tail = record + pending + decoder.decode(b"", final=True)
+    if tail.strip():
+        yield [(record_line if record else line_number, tail)]
+
+def xlsx_cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value).strip()
+
+async def iter_import_rows(request: Request, format: str):
+    """
+    Rows of an uploaded CSV or XLSX file as lists of (line number, [field text]),
+    header included. CSV is parsed while it arrives; XLSX is a zip archive, so
+    it is spooled to a temp file first and its first sheet read in chunks.
+    """
+    if format == "csv":
+        async for records in iter_csv_records(request):
+            # Every record is a complete CSV row, so one reader parses the whole chunk
+            fields = csv.reader(record for _, record in records)
+            yield [(line, [csv_import_field(field) for field in row]) for (line, _), row in zip(records, fields)]
+        return
+    
+    spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY_BYTES)
+    workbook = None
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        try:
+            workbook = await run_in_threadpool(openpyxl.load_workbook, spool, read_only=True, data_only=True)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is not a valid XLSX workbook"
+            )
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        
+        def read_chunk(first_line: int):
+            return [
+                (first_line + offset, [xlsx_cell_text(value) for value in row])
+                for offset, row in enumerate(itertools.islice(rows, EXPORT_CHUNK_ROWS))
+            ]
+        
+        line = 1
+        while True:
+            chunk = await run_in_threadpool(read_chunk, line)
+            if not chunk:
+                break
+            line += len(chunk)
+            yield chunk
+    finally:
+        if workbook is not None:
+            workbook.close()
+        spool.close()
+
+def map_import_header(fields: List[str], aliases: Dict[str, str], required) -> Dict[str, int]:
+    """Column index per field name; 400 if a required column is missing"""
+    columns = {}
+    for index, name in enumerate(fields):
+        key = aliases.get(name.strip().lower().replace(" ", "_"))
+        if key and key not in columns:
+            columns[key] = index
+    missing = [name for name in required if name not in columns]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Header row is missing column(s): {', '.join(missing)}"
+        )
+    return columns
+
+def xlsx_row(worksheet, values):
+    """Write-only row; text that looks like a formula (FORMULA_PREFIXES) stays text"""
+    row = []
+    for value in values:
+        if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+            cell = WriteOnlyCell(worksheet, value)
+            cell.data_type = "s"
+            value = cell
+        elif isinstance(value, Decimal):
+            value = float(value)
+        row.append(value)
+    return row
+
+async def export_rows_response(
+    query: str, params, columns: List[str], format: str, filename: str,
+    row_factory=None, convert=None, headers: Optional[Dict[str, str]] = None
+):
+    """
+    Stream the rows of `query` as a CSV or XLSX download with a `columns`
+    header row. Each row must be one value per column, or is turned into one
+    by `convert`.
+    
+    CSV is sent as the rows arrive, on a connection the response body checks
+    out itself. XLSX is written by openpyxl's write-only workbook (rows go to
+    a temp file, not memory) and streamed once the cursor is exhausted.
+    """
+    require_db_pool()
+    headers = dict(headers or {})
+    headers["Content-Disposition"] = f'attachment; filename="{filename}.{format}"'
+    
+    def open_cursor(conn):
+        cursor = conn.cursor(name="export_stream", row_factory=row_factory) if row_factory else conn.cursor(name="export_stream")
+        cursor.itersize = EXPORT_CHUNK_ROWS
+        return cursor
+    
+    if format == "csv":
+        def csv_row(row):
+            return [csv_cell(value) for value in (convert(row) if convert else row)]
+        
+        async def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            async with streaming_db_connection() as conn, open_cursor(conn) as cursor:
+                await cursor.execute(query, params)
+                while True:
+                    rows = await cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                    if not rows:
+                        break
+                    writer.writerows(map(csv_row, rows))
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        
+        return StreamingResponse(generate(), media_type="text/csv; charset=utf-8", headers=headers)
+    
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(filename[:31])
+    worksheet.append(columns)
+    
+    def append_rows(rows):
+        for row in rows:
+            worksheet.append(xlsx_row(worksheet, convert(row) if convert else row))
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    output = tempfile.TemporaryFile()
+    try:
+        async with open_cursor(conn) as cursor:
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(EXPORT_CHUNK_ROWS)
+                if not rows:
+                    break
+                await run_in_threadpool(append_rows, rows)
+        await run_in_threadpool(workbook.save, output)
+    except Exception:
+        output.close()
+        raise
+    finally:
+        await release_db_connection(conn)
+    output.seek(0)
+    
+    def read_output():
+        try:
+            while True:
+                block = output.read(64 * 1024)
+                if not block:
+                    break
+                yield block
+        finally:
+            output.close()
+    
+    # XLSX is already a zip archive: an explicit encoding keeps the GZip / Brotli
+    # middleware from compressing it again
+    headers["Content-Encoding"] = "identity"
+    return StreamingResponse(read_output(), media_type=XLSX_MEDIA_TYPE, headers=headers)
+
+# --- Tìm kiếm nhân viên ---
+# Accent-insensitive trigram search over name + phone ("nguyen" finds "Nguyễn"),
+# backed by idx_nhan_vien_search_trgm from migrate_staff_search.sql
+# (plain ILIKE without it, see detect_staff_search()).
+# Shared by /api/staff, /api/timesheet and /api/payroll-sheet.
+STAFF_SEARCH_LIMIT = int(os.getenv("STAFF_SEARCH_LIMIT", "50"))
+# None until detect_staff_search() has run; False without migrate_staff_search.sql,
+# then search falls back to a plain ILIKE on name / phone (no ranking).
+staff_search_trgm: Optional[bool] = None
+
+async def detect_staff_search(conn):
+    """Check once whether the search functions of migrate_staff_search.sql are installed"""
+    global staff_search_trgm
+    try:
+        async with conn.cursor() as cursor:
+            await cursor.execute("""
+                SELECT to_regprocedure('search_normalize(text)') IS NOT NULL
+                   AND to_regprocedure('nhan_vien_search_text(text, text)') IS NOT NULL
+            """)
+            staff_search_trgm = (await cursor.fetchone())[0]
+        await conn.rollback()
+    except psycopg.Error as e:
+        logger.error("staff search detection failed: %s", e)
+        return
+    if not staff_search_trgm:
+        logger.warning("migrate_staff_search.sql not installed: staff search falls back to ILIKE")
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def staff_search_match(search: str, name_column: str, phone_column: str):
+    """
+    WHERE predicate and relevance score (real, higher is better) of the search
+    term over the given name / phone columns.
+    Returns (predicate, predicate_params, score_sql, score_params).
+    """
+    term = search.strip()
+    if not staff_search_trgm:
+        pattern = f"%{escape_like(term)}%"
+        return f"({name_column} ILIKE %s OR {phone_column} ILIKE %s)", [pattern, pattern], "0::real", []
+    search_text = f"nhan_vien_search_text({name_column}, {phone_column})"
+    return (
+        f"({search_text} LIKE '%%' || search_normalize(%s) || '%%' OR search_normalize(%s) <%% {search_text})",
+        [escape_like(term), term],
+        f"word_similarity(search_normalize(%s), {search_text})",
+        [term],
+    )
+
+def staff_search_condition(
+    search: str,
+    id_column: str = "nv.id",
+    branch_id: Optional[int] = None,
+    role: Optional[str] = None,
+    staff_status: Optional[str] = None
+):
+    """
+    SQL condition keeping only the STAFF_SEARCH_LIMIT most relevant staff for
+    the search term (substring match or close word similarity).
+    The caller's staff filters go inside the ranked subquery, so the limit is
+    taken among matching staff only (not filled by other branches / roles);
+    the caller must not apply them again outside.
+    Returns (condition, params).
+    """
+    predicate, params, score_sql, score_params = staff_search_match(search, "s.ho_ten", "s.so_dien_thoai")
+    filters = ""
+    for column, value in (("chi_nhanh_id", branch_id), ("chuc_vu", role), ("trang_thai", staff_status)):
+        if value:
+            filters += f" AND s.{column} = %s"
+            params.append(value)
+    condition = f"""
+        {id_column} IN (
+            SELECT s.id FROM nhan_vien s
+            WHERE {predicate}{filters}
+            ORDER BY {score_sql} DESC, s.id ASC
+            LIMIT %s
+        )
+    """
+    return condition, params + score_params + [STAFF_SEARCH_LIMIT]
+
+def staff_search_score(search: str, alias: str = "nv"):
+    """Relevance of a staff row for the same search (real, higher is better). Returns (sql, params)."""
+    _, _, score_sql, score_params = staff_search_match(search, f"{alias}.ho_ten", f"{alias}.so_dien_thoai")
+    return score_sql, score_params
+
+def staff_search_rank(search: str, alias: str = "nv"):
+    """ORDER BY expression (best match first) for the same search. Returns (sql, params)."""
+    score_sql, params = staff_search_score(search, alias)
+    return f"{score_sql} DESC", params
 
 # ==========================================
 # 1. API CHI NHÁNH (Branches) - MỚI
 # ==========================================
+BRANCH_LIST_QUERY = """
+    SELECT cn.id, cn.ten_chi_nhanh as "name", cn.dia_chi as "address", 
+           COALESCE(nv.ho_ten, 'Chưa có') as "managerName"
+    FROM chi_nhanh cn
+    LEFT JOIN nhan_vien nv ON cn.quan_ly_id = nv.id
+    ORDER BY cn.id ASC
+"""
+
 @app.get("/api/branches")
-def get_branches():
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+async def get_branches(response: Response, limit: Optional[int] = None, cursor: Optional[str] = None):
+    """
+    Get branches ordered by id (keyset pagination: limit + X-Next-Cursor).
+    The full list is served from the reference-data cache.
+    """
+    limit = clamp_page_limit(limit)
+    after_id = decode_cursor(cursor, 1)[0] if cursor else None
     
     # JOIN với bảng nhân viên để lấy tên Quản lý
-    query = """
-        SELECT cn.id, cn.ten_chi_nhanh as "name", cn.dia_chi as "address", 
-               COALESCE(nv.ho_ten, 'Chưa có') as "managerName"
-        FROM chi_nhanh cn
-        LEFT JOIN nhan_vien nv ON cn.quan_ly_id = nv.id
-        ORDER BY cn.id ASC
-    """
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    branches = await get_reference_data("branches", BRANCH_LIST_QUERY)
+    if branches is None: return []
+    if after_id is not None:
+        branches = [row for row in branches if row['id'] > after_id]
+    return paginate_rows(branches[:limit + 1], limit, response, lambda row: [row['id']])
 
 @app.post("/api/branches", status_code=status.HTTP_201_CREATED)
 async def create_branch(branch: BranchCreate):
@@ -110,14 +1335,9 @@ async def create_branch(branch: BranchCreate):
     4. If managerId provided: UPDATE nhan_vien SET chi_nhanh_id = [new_branch_id] WHERE id = [managerId]
     5. COMMIT transaction (both steps must succeed)
     """
-    print("=" * 70)
-    print("[CREATE BRANCH] Received payload:")
-    print(f"  name: {branch.name}")
-    print(f"  address: {branch.address}")
-    print(f"  managerId: {branch.managerId}")
-    print("=" * 70)
+    logger.debug("create branch payload", extra={"payload": branch})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn: 
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -126,7 +1346,7 @@ async def create_branch(branch: BranchCreate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # ===== INPUT VALIDATION =====
         if not branch.name or not branch.name.strip():
@@ -143,17 +1363,15 @@ async def create_branch(branch: BranchCreate):
         
         # Handle managerId (optional now)
         manager_id = branch.managerId if branch.managerId and branch.managerId > 0 else None
-        print(f"[STEP 0] Processed managerId: {manager_id}")
         
         # Validate manager exists (only if provided)
         manager_name = 'Chưa có'
         if manager_id is not None:
-            print(f"[STEP 0] Validating manager with ID = {manager_id}")
-            cursor.execute(
+            await cursor.execute(
                 "SELECT id, ho_ten FROM nhan_vien WHERE id = %s",
                 (manager_id,)
             )
-            manager = cursor.fetchone()
+            manager = await cursor.fetchone()
             
             if not manager:
                 raise HTTPException(
@@ -162,9 +1380,7 @@ async def create_branch(branch: BranchCreate):
                 )
             
             manager_name = manager['ho_ten']
-            print(f"[STEP 0] ✓ Manager found: {manager_name}")
-        else:
-            print("[STEP 0] ⚠️  No manager assigned (optional)")
+            logger.debug("manager found: %s", manager_name)
         
         # ===== STEP 1: INSERT BRANCH =====
         # SQL has exactly 3 placeholders (%s)
@@ -181,15 +1397,14 @@ async def create_branch(branch: BranchCreate):
             manager_id  # Can be None/NULL
         )
         
-        print(f"[STEP 1] Executing INSERT with params: {insert_params}")
-        cursor.execute(insert_sql, insert_params)
-        new_branch_row = cursor.fetchone()
+        logger.debug("insert params: %s", insert_params)
+        await cursor.execute(insert_sql, insert_params)
+        new_branch_row = await cursor.fetchone()
         
         if not new_branch_row:
             raise Exception("Failed to insert branch - no row returned")
         
         new_branch_id = new_branch_row['id']
-        print(f"[STEP 1] ✓ Branch inserted with ID = {new_branch_id}")
         
         # ===== STEP 2: UPDATE EMPLOYEE (ASSIGN BRANCH TO MANAGER) - ONLY IF MANAGER PROVIDED =====
         if manager_id is not None:
@@ -199,17 +1414,14 @@ async def create_branch(branch: BranchCreate):
                 WHERE id = %s
             """
             
-            print(f"[STEP 2] Executing UPDATE nhan_vien: chi_nhanh_id={new_branch_id}, manager_id={manager_id}")
-            cursor.execute(update_sql, (new_branch_id, manager_id))
+            await cursor.execute(update_sql, (new_branch_id, manager_id))
             rows_updated = cursor.rowcount
-            print(f"[STEP 2] ✓ Updated {rows_updated} employee record(s)")
-        else:
-            print("[STEP 2] ⚠️  Skipped (no manager to assign)")
+            logger.debug("manager assigned, %s employee record(s) updated", rows_updated)
         
         # ===== STEP 3: COMMIT TRANSACTION =====
-        conn.commit()
-        print("[STEP 3] ✓ Transaction COMMITTED successfully")
-        print("=" * 70)
+        await notify_reference_change(cursor, "branches")
+        await conn.commit()
+        invalidate_reference_cache("branches")
         
         # ===== RETURN SUCCESS RESPONSE =====
         return {
@@ -226,16 +1438,16 @@ async def create_branch(branch: BranchCreate):
     except HTTPException as http_err:
         # HTTP exceptions (400, 404, etc.) - rollback and re-raise
         if conn:
-            conn.rollback()
-        print(f"[ERROR] HTTPException: {http_err.status_code} - {http_err.detail}")
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
         raise
         
-    except psycopg2.Error as db_err:
+    except psycopg.Error as db_err:
         # Database errors - rollback and convert to 500
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -244,9 +1456,9 @@ async def create_branch(branch: BranchCreate):
     except Exception as e:
         # Unexpected errors - rollback and convert to 500
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -254,10 +1466,9 @@ async def create_branch(branch: BranchCreate):
         
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
 
 @app.put("/api/branches/{branch_id}", status_code=status.HTTP_200_OK)
 async def update_branch(branch_id: int, branch: BranchUpdate):
@@ -270,14 +1481,9 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
     3. If managerId changed: remove old manager and assign new manager to branch
     4. COMMIT transaction
     """
-    print("=" * 70)
-    print(f"[UPDATE BRANCH] Branch ID: {branch_id}")
-    print(f"  name: {branch.name}")
-    print(f"  address: {branch.address}")
-    print(f"  managerId: {branch.managerId}")
-    print("=" * 70)
+    logger.debug("update branch payload", extra={"branchId": branch_id, "payload": branch})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn: 
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -286,11 +1492,11 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # ===== VALIDATE BRANCH EXISTS =====
-        cursor.execute("SELECT id, quan_ly_id FROM chi_nhanh WHERE id = %s", (branch_id,))
-        existing_branch = cursor.fetchone()
+        await cursor.execute("SELECT id, quan_ly_id FROM chi_nhanh WHERE id = %s", (branch_id,))
+        existing_branch = await cursor.fetchone()
         if not existing_branch:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -298,7 +1504,7 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
             )
         
         old_manager_id = existing_branch['quan_ly_id']
-        print(f"[STEP 0] Existing branch found. Old managerId: {old_manager_id}")
+        logger.debug("existing branch found, old managerId: %s", old_manager_id)
         
         # ===== INPUT VALIDATION =====
         if not branch.name or not branch.name.strip():
@@ -315,20 +1521,20 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
         
         # Handle managerId (can be None/null now - manager is optional)
         manager_id = branch.managerId if branch.managerId and branch.managerId > 0 else None
-        print(f"[STEP 0] New managerId: {manager_id}")
+        logger.debug("new managerId: %s", manager_id)
         
         # Validate manager exists (only if provided)
         manager_name = 'Chưa có'
         if manager_id is not None:
-            cursor.execute("SELECT id, ho_ten FROM nhan_vien WHERE id = %s", (manager_id,))
-            manager = cursor.fetchone()
+            await cursor.execute("SELECT id, ho_ten FROM nhan_vien WHERE id = %s", (manager_id,))
+            manager = await cursor.fetchone()
             if not manager:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Manager with ID {manager_id} not found"
                 )
             manager_name = manager['ho_ten']
-            print(f"[STEP 0] ✓ Manager found: {manager_name}")
+            logger.debug("manager found: %s", manager_name)
         
         # ===== STEP 1: UPDATE BRANCH INFO =====
         update_branch_sql = """
@@ -336,18 +1542,15 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
             SET ten_chi_nhanh = %s, dia_chi = %s, quan_ly_id = %s
             WHERE id = %s
         """
-        print(f"[STEP 1] Updating chi_nhanh...")
-        cursor.execute(update_branch_sql, (branch.name.strip(), branch.address.strip(), manager_id, branch_id))
-        print(f"[STEP 1] ✓ Updated chi_nhanh ID {branch_id}")
+        await cursor.execute(update_branch_sql, (branch.name.strip(), branch.address.strip(), manager_id, branch_id))
         
         # ===== STEP 2: REMOVE OLD MANAGER FROM BRANCH (IF DIFFERENT) =====
         if old_manager_id is not None and old_manager_id != manager_id:
-            print(f"[STEP 2a] Removing old manager {old_manager_id} from branch {branch_id}")
-            cursor.execute(
+            logger.debug("removing old manager %s from branch %s", old_manager_id, branch_id)
+            await cursor.execute(
                 "UPDATE nhan_vien SET chi_nhanh_id = NULL WHERE id = %s",
                 (old_manager_id,)
             )
-            print(f"[STEP 2a] ✓ Old manager {old_manager_id} removed from branch")
         
         # ===== STEP 3: ASSIGN NEW MANAGER TO BRANCH =====
         if manager_id is not None:
@@ -356,17 +1559,14 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
                 SET chi_nhanh_id = %s
                 WHERE id = %s
             """
-            print(f"[STEP 2b] Assigning manager {manager_id} to branch {branch_id}")
-            cursor.execute(update_employee_sql, (branch_id, manager_id))
+            await cursor.execute(update_employee_sql, (branch_id, manager_id))
             rows_updated = cursor.rowcount
-            print(f"[STEP 2b] ✓ Updated {rows_updated} employee record(s)")
-        else:
-            print("[STEP 2b] ⚠️  Skipped (no manager assigned)")
+            logger.debug("manager assigned, %s employee record(s) updated", rows_updated)
         
         # ===== STEP 4: COMMIT TRANSACTION =====
-        conn.commit()
-        print("[STEP 3] ✓ Transaction COMMITTED successfully")
-        print("=" * 70)
+        await notify_reference_change(cursor, "branches")
+        await conn.commit()
+        invalidate_reference_cache("branches")
         
         # ===== RETURN SUCCESS RESPONSE =====
         return {
@@ -382,15 +1582,15 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
         
     except HTTPException as http_err:
         if conn:
-            conn.rollback()
-        print(f"[ERROR] HTTPException: {http_err.status_code} - {http_err.detail}")
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
         raise
         
-    except psycopg2.Error as db_err:
+    except psycopg.Error as db_err:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -398,9 +1598,9 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
         
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -408,17 +1608,16 @@ async def update_branch(branch_id: int, branch: BranchUpdate):
         
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
 
 @app.delete("/api/branches/{branch_id}", status_code=status.HTTP_200_OK)
 async def delete_branch(branch_id: int):
     """
     Xóa chi nhánh
     """
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn: 
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -429,16 +1628,16 @@ async def delete_branch(branch_id: int):
         cursor = conn.cursor()
         
         # Kiểm tra chi nhánh có tồn tại không
-        cursor.execute("SELECT id FROM chi_nhanh WHERE id = %s", (branch_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM chi_nhanh WHERE id = %s", (branch_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Không tìm thấy chi nhánh với ID này"
             )
         
         # Kiểm tra xem có nhân viên nào thuộc chi nhánh này không
-        cursor.execute("SELECT COUNT(*) as count FROM nhan_vien WHERE chi_nhanh_id = %s", (branch_id,))
-        result = cursor.fetchone()
+        await cursor.execute("SELECT COUNT(*) as count FROM nhan_vien WHERE chi_nhanh_id = %s", (branch_id,))
+        result = await cursor.fetchone()
         if result[0] > 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -446,84 +1645,136 @@ async def delete_branch(branch_id: int):
             )
         
         query = "DELETE FROM chi_nhanh WHERE id = %s"
-        cursor.execute(query, (branch_id,))
-        conn.commit()
+        await cursor.execute(query, (branch_id,))
+        await notify_reference_change(cursor, "branches")
+        await conn.commit()
+        invalidate_reference_cache("branches")
         
         return {
             "success": True,
             "message": "Xóa chi nhánh thành công"
         }
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as e:
-        conn.rollback()
-        print(f"Error deleting branch: {e}")
+        await conn.rollback()
+        logger.exception("error deleting branch %s", branch_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Lỗi khi xóa chi nhánh: {str(e)}"
         )
     finally:
-        conn.close()
+        await release_db_connection(conn)
 
 # ==========================================
 # 2. API NHÂN VIÊN (Staff)
 # ==========================================
+def staff_avatar(name: str) -> str:
+    """Avatar initials: first letters of the first and last word ("Nguyễn Văn An" -> "NA")"""
+    name_parts = name.strip().split()
+    if len(name_parts) >= 2:
+        return (name_parts[0][0] + name_parts[-1][0]).upper()
+    return name_parts[0][0:2].upper() if len(name_parts[0]) >= 2 else name_parts[0][0].upper()
+
 @app.get("/api/staff")
-def get_staff(search: Optional[str] = None, role: Optional[str] = None, status: Optional[str] = None, branchId: Optional[int] = None):
+async def get_staff(
+    response: Response,
+    search: Optional[str] = None,
+    role: Optional[str] = None,
+    status: Optional[str] = None,
+    branchId: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+):
     """
     Get staff list with optional search and filters
     
     Query Parameters:
-    - search: Search by name or phone
+    - search: Search by name or phone (accent-insensitive, best matches first)
     - role: Filter by role
     - status: Filter by status
     - branchId: Filter by branch ID
+    - limit / cursor: Keyset pagination (next page token in X-Next-Cursor);
+      with search, pages follow the relevance order: (score, id) keyset
     """
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    limit = clamp_page_limit(limit)
+    params = []
+    
+    # Relevance score, selected so the next-page cursor can carry it
+    score_select = ""
+    if search:
+        score_sql, score_params = staff_search_score(search)
+        score_select = f", {score_sql} AS search_score"
+        params.extend(score_params)
     
     # Base query
-    query = """
+    query = f"""
        SELECT nv.id, nv.ho_ten as name, nv.chuc_vu as role, 
                nv.so_dien_thoai as phone, nv.trang_thai as status, nv.avatar,
                COALESCE(cn.ten_chi_nhanh, 'Chưa phân bổ') as "branchName",
-               nv.chi_nhanh_id as "branchId"
+               nv.chi_nhanh_id as "branchId"{score_select}
         FROM nhan_vien nv
         LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
         WHERE 1=1
     """
-    params = []
     
-    # Add search filter
+    # Add search filter (ranked, at most STAFF_SEARCH_LIMIT results)
     if search:
-        query += " AND (nv.ho_ten ILIKE %s OR nv.so_dien_thoai ILIKE %s)"
-        search_pattern = f"%{search}%"
-        params.extend([search_pattern, search_pattern])
-    
-    # Add role filter
-    if role:
-        query += " AND nv.chuc_vu = %s"
-        params.append(role)
-    
-    # Add status filter
-    if status:
-        query += " AND nv.trang_thai = %s"
-        params.append(status)
+        condition, search_params = staff_search_condition(
+            search, branch_id=branchId, role=role, staff_status=status
+        )
+        query += " AND " + condition
+        params.extend(search_params)
+    else:
+        # Add role filter
+        if role:
+            query += " AND nv.chuc_vu = %s"
+            params.append(role)
+        
+        # Add status filter
+        if status:
+            query += " AND nv.trang_thai = %s"
+            params.append(status)
+        
+        # Add branch filter
+        if branchId:
+            query += " AND nv.chi_nhanh_id = %s"
+            params.append(branchId)
     
-    # Add branch filter
-    if branchId:
-        query += " AND nv.chi_nhanh_id = %s"
-        params.append(branchId)
+    if search:
+        # Best match first (score DESC, id ASC): continue after the last (score, id)
+        if cursor:
+            last_score, last_id = decode_cursor(cursor, 2)
+            query += f" AND ({score_sql}, -nv.id) < (%s::real, -%s::int)"
+            params.extend(score_params + [last_score, last_id])
+        query += f" ORDER BY {score_sql} DESC, nv.id ASC"
+        params.extend(score_params)
+    else:
+        # Continue after the last id of the previous page
+        if cursor:
+            query += " AND nv.id > %s"
+            params.extend(decode_cursor(cursor, 1))
+        query += " ORDER BY nv.id ASC"
     
-    query += " ORDER BY nv.id ASC"
+    query += " LIMIT %s"
+    params.append(limit + 1)
     
-    cursor.execute(query, tuple(params))
-    data = cursor.fetchall()
-    conn.close()
-    return data
-
+    conn = await get_db_connection()
+    if not conn: return []
+    db_cursor = conn.cursor(row_factory=dict_row)
+    try:
+        await db_cursor.execute(query, tuple(params))
+        rows = await db_cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    if not search:
+        return paginate_rows(rows, limit, response, lambda row: [row['id']])
+    rows = paginate_rows(rows, limit, response, lambda row: [row['search_score'], row['id']])
+    for row in rows:
+        del row['search_score']
+    return rows
+
 @app.post("/api/staff", status_code=status.HTTP_201_CREATED)
 async def create_staff(staff: StaffCreate):
     """
@@ -535,16 +1786,9 @@ async def create_staff(staff: StaffCreate):
     3. INSERT into nhan_vien table
     4. Return created staff data
     """
-    print("=" * 70)
-    print("[CREATE STAFF] Received payload:")
-    print(f"  name: {staff.name}")
-    print(f"  role: {staff.role}")
-    print(f"  phone: {staff.phone}")
-    print(f"  status: {staff.status}")
-    print(f"  branchId: {staff.branchId}")
-    print("=" * 70)
+    logger.debug("create staff payload", extra={"payload": staff})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -553,7 +1797,7 @@ async def create_staff(staff: StaffCreate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # ===== INPUT VALIDATION =====
         if not staff.name or not staff.name.strip():
@@ -586,24 +1830,20 @@ async def create_staff(staff: StaffCreate):
         # Validate branch exists (if provided)
         branch_name = 'Chưa phân bổ'
         if branch_id is not None:
-            cursor.execute("SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = %s", (branch_id,))
-            branch = cursor.fetchone()
+            await cursor.execute("SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = %s", (branch_id,))
+            branch = await cursor.fetchone()
             if not branch:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail=f"Branch with ID {branch_id} not found"
                 )
             branch_name = branch['ten_chi_nhanh']
-            print(f"[STEP 0] ✓ Branch found: {branch_name}")
+            logger.debug("branch found: %s", branch_name)
         
         # Auto-generate avatar (initials from name)
-        name_parts = staff.name.strip().split()
-        if len(name_parts) >= 2:
-            avatar = (name_parts[0][0] + name_parts[-1][0]).upper()
-        else:
-            avatar = name_parts[0][0:2].upper() if len(name_parts[0]) >= 2 else name_parts[0][0].upper()
+        avatar = staff_avatar(staff.name)
         
-        print(f"[STEP 0] Generated avatar: {avatar}")
+        logger.debug("generated avatar: %s", avatar)
         
         # ===== INSERT STAFF =====
         # SQL has exactly 6 placeholders (%s)
@@ -623,16 +1863,14 @@ async def create_staff(staff: StaffCreate):
             branch_id
         )
         
-        print(f"[STEP 1] Executing INSERT with params: {insert_params}")
-        cursor.execute(insert_sql, insert_params)
-        new_staff_row = cursor.fetchone()
+        logger.debug("insert params: %s", insert_params)
+        await cursor.execute(insert_sql, insert_params)
+        new_staff_row = await cursor.fetchone()
         
         if not new_staff_row:
             raise Exception("Failed to insert staff - no row returned")
         
-        conn.commit()
-        print("[STEP 2] ✓ Transaction COMMITTED successfully")
-        print("=" * 70)
+        await conn.commit()
         
         # ===== RETURN SUCCESS RESPONSE =====
         return {
@@ -652,15 +1890,15 @@ async def create_staff(staff: StaffCreate):
         
     except HTTPException as http_err:
         if conn:
-            conn.rollback()
-        print(f"[ERROR] HTTPException: {http_err.status_code} - {http_err.detail}")
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
         raise
         
-    except psycopg2.Error as db_err:
+    except psycopg.Error as db_err:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -668,9 +1906,9 @@ async def create_staff(staff: StaffCreate):
         
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -678,10 +1916,9 @@ async def create_staff(staff: StaffCreate):
         
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
 
 @app.put("/api/staff/{staff_id}", status_code=status.HTTP_200_OK)
 async def update_staff(staff_id: int, staff: StaffUpdate):
@@ -693,16 +1930,9 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
     2. Update staff data
     3. Return updated staff data
     """
-    print("=" * 70)
-    print(f"[UPDATE STAFF] Staff ID: {staff_id}")
-    print(f"  name: {staff.name}")
-    print(f"  role: {staff.role}")
-    print(f"  phone: {staff.phone}")
-    print(f"  status: {staff.status}")
-    print(f"  branchId: {staff.branchId}")
-    print("=" * 70)
+    logger.debug("update staff payload", extra={"staffId": staff_id, "payload": staff})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -711,11 +1941,11 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # ===== VALIDATE STAFF EXISTS =====
-        cursor.execute("SELECT id FROM nhan_vien WHERE id = %s", (staff_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM nhan_vien WHERE id = %s", (staff_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Staff not found"
@@ -752,8 +1982,8 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
         # Validate branch exists (if provided)
         branch_name = 'Chưa phân bổ'
         if branch_id is not None:
-            cursor.execute("SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = %s", (branch_id,))
-            branch = cursor.fetchone()
+            await cursor.execute("SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = %s", (branch_id,))
+            branch = await cursor.fetchone()
             if not branch:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -762,11 +1992,7 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
             branch_name = branch['ten_chi_nhanh']
         
         # Auto-generate avatar (initials from name)
-        name_parts = staff.name.strip().split()
-        if len(name_parts) >= 2:
-            avatar = (name_parts[0][0] + name_parts[-1][0]).upper()
-        else:
-            avatar = name_parts[0][0:2].upper() if len(name_parts[0]) >= 2 else name_parts[0][0].upper()
+        avatar = staff_avatar(staff.name)
         
         # ===== UPDATE STAFF =====
         # SQL has exactly 7 placeholders (%s)
@@ -788,12 +2014,12 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
             staff_id
         )
         
-        print(f"[STEP 1] Updating staff...")
-        cursor.execute(update_sql, update_params)
+        await cursor.execute(update_sql, update_params)
+        # The cached branch list shows manager names
+        await notify_reference_change(cursor, "branches")
         
-        conn.commit()
-        print("[STEP 2] ✓ Transaction COMMITTED successfully")
-        print("=" * 70)
+        await conn.commit()
+        invalidate_reference_cache("branches")
         
         # ===== RETURN SUCCESS RESPONSE =====
         return {
@@ -813,15 +2039,15 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
         
     except HTTPException as http_err:
         if conn:
-            conn.rollback()
-        print(f"[ERROR] HTTPException: {http_err.status_code} - {http_err.detail}")
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
         raise
         
-    except psycopg2.Error as db_err:
+    except psycopg.Error as db_err:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -829,9 +2055,9 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
         
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -839,21 +2065,18 @@ async def update_staff(staff_id: int, staff: StaffUpdate):
         
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
 
 @app.delete("/api/staff/{staff_id}", status_code=status.HTTP_200_OK)
 async def delete_staff(staff_id: int):
     """
     Delete staff member
     """
-    print("=" * 70)
-    print(f"[DELETE STAFF] Staff ID: {staff_id}")
-    print("=" * 70)
+    logger.debug("delete staff", extra={"staffId": staff_id})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -865,19 +2088,21 @@ async def delete_staff(staff_id: int):
         cursor = conn.cursor()
         
         # Validate staff exists
-        cursor.execute("SELECT id FROM nhan_vien WHERE id = %s", (staff_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM nhan_vien WHERE id = %s", (staff_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Staff not found"
             )
         
         # Delete staff
-        cursor.execute("DELETE FROM nhan_vien WHERE id = %s", (staff_id,))
-        conn.commit()
+        await cursor.execute("DELETE FROM nhan_vien WHERE id = %s", (staff_id,))
+        # The cached branch list shows manager names
+        await notify_reference_change(cursor, "branches")
+        await conn.commit()
+        invalidate_reference_cache("branches")
         
-        print("[STEP 1] ✓ Staff deleted successfully")
-        print("=" * 70)
+        logger.info("staff deleted", extra={"staffId": staff_id})
         
         return {
             "success": True,
@@ -886,15 +2111,191 @@ async def delete_staff(staff_id: int):
         
     except HTTPException as http_err:
         if conn:
-            conn.rollback()
-        print(f"[ERROR] HTTPException: {http_err.status_code} - {http_err.detail}")
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
+        raise
+        
+    except psycopg.Error as db_err:
+        if conn:
+            await conn.rollback()
+        error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
+        logger.exception(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+        
+    except Exception as e:
+        if conn:
+            await conn.rollback()
+        error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
+        logger.exception(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+        
+    finally:
+        if cursor:
+            await cursor.close()
+        if conn:
+            await release_db_connection(conn)
+
+# --- Nhập / xuất danh sách nhân viên ---
+STAFF_IMPORT_CHUNK_ROWS = 1000
+STAFF_IMPORT_MAX_ERRORS = 1000
+STAFF_IMPORT_HEADERS = {
+    "name": "name", "ho_ten": "name",
+    "role": "role", "chuc_vu": "role",
+    "phone": "phone", "so_dien_thoai": "phone",
+    "status": "status", "trang_thai": "status",
+    "branchid": "branchId", "branch_id": "branchId", "chi_nhanh_id": "branchId",
+    "branchname": "branchName", "branch_name": "branchName", "chi_nhanh": "branchName", "ten_chi_nhanh": "branchName",
+}
+STAFF_IMPORT_REQUIRED = ("name", "role", "phone", "status")
+# Same columns as the import accepts, so an export can be edited and re-imported
+# (id and avatar are ignored on import)
+STAFF_EXPORT_HEADERS = ["id", "name", "role", "phone", "status", "avatar", "branchId", "branchName"]
+
+def validate_staff_row(fields: List[str], columns: Dict[str, int], branch_ids: set, branch_names: Dict[str, int]):
+    """create_staff's rules for one import row; returns the nhan_vien values or raises ValueError"""
+    def value(key: str) -> str:
+        index = columns.get(key)
+        return fields[index].strip() if index is not None and index < len(fields) else ""
+    
+    for key, label in (("name", "Name"), ("role", "Role"), ("phone", "Phone"), ("status", "Status")):
+        if not value(key):
+            raise ValueError(f"{label} cannot be empty")
+    
+    branch_id = None
+    if value("branchId"):
+        try:
+            branch_id = int(value("branchId"))
+        except ValueError:
+            raise ValueError(f"branchId must be an integer, got {value('branchId')!r}")
+        if branch_id <= 0:
+            branch_id = None
+        elif branch_id not in branch_ids:
+            raise ValueError(f"Branch with ID {branch_id} not found")
+    elif value("branchName"):
+        branch_id = branch_names.get(value("branchName").lower())
+        if branch_id is None:
+            raise ValueError(f"Branch {value('branchName')!r} not found")
+    
+    name = value("name")
+    return (name, value("role"), value("phone"), value("status"), staff_avatar(name), branch_id)
+
+@app.post("/api/staff/import")
+async def import_staff(
+    request: Request,
+    format: Optional[str] = None,
+    all_or_nothing: bool = False,
+    dry_run: bool = False
+):
+    """
+    Create staff in bulk from a CSV or XLSX file sent as the raw request body, e.g.
+    curl -H 'Content-Type: text/csv' --data-binary @nhan_vien.csv .../api/staff/import
+    
+    Columns (header row, any order): name, role, phone, status and optionally
+    branchId or branchName. Rows follow create_staff's rules (required fields,
+    branch must exist, avatar = initials of the name). Branches are loaded
+    once; valid rows are inserted STAFF_IMPORT_CHUNK_ROWS at a time with
+    INSERT ... SELECT FROM unnest(...), all in one transaction.
+    
+    Query Parameters:
+    - format: "csv" or "xlsx" (default: from the Content-Type)
+    - all_or_nothing: save nothing if any row is invalid
+    - dry_run: validate and insert, then roll back
+    """
+    format = file_format(format, request.headers.get("content-type"))
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    
+    cursor = None
+    received = created = error_count = 0
+    errors = []
+    try:
+        cursor = conn.cursor()
+        await cursor.execute("SELECT id, ten_chi_nhanh FROM chi_nhanh")
+        branches = await cursor.fetchall()
+        branch_ids = {row[0] for row in branches}
+        branch_names = {row[1].strip().lower(): row[0] for row in branches if row[1]}
+        
+        columns = None
+        pending = []
+        
+        async def insert_pending():
+            nonlocal created
+            await cursor.execute("""
+                INSERT INTO nhan_vien (ho_ten, chuc_vu, so_dien_thoai, trang_thai, avatar, chi_nhanh_id)
+                SELECT * FROM unnest(%s::text[], %s::text[], %s::text[], %s::text[], %s::text[], %s::int[])
+            """, [list(values) for values in zip(*pending)])
+            created += len(pending)
+            pending.clear()
+        
+        async for rows in iter_import_rows(request, format):
+            if columns is None:
+                _, header = rows.pop(0)
+                columns = map_import_header(header, STAFF_IMPORT_HEADERS, STAFF_IMPORT_REQUIRED)
+            for line, fields in rows:
+                if not any(value.strip() for value in fields):
+                    continue
+                received += 1
+                try:
+                    pending.append(validate_staff_row(fields, columns, branch_ids, branch_names))
+                except ValueError as e:
+                    error_count += 1
+                    if len(errors) < STAFF_IMPORT_MAX_ERRORS:
+                        errors.append({"line": line, "error": str(e)})
+            if len(pending) >= STAFF_IMPORT_CHUNK_ROWS:
+                await insert_pending()
+        if pending:
+            await insert_pending()
+        
+        if columns is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty file: expected a header row and staff rows"
+            )
+        
+        saved = not dry_run and not (all_or_nothing and error_count)
+        if saved:
+            await conn.commit()
+        else:
+            await conn.rollback()
+        
+        logger.info("staff import", extra={
+            "received": received, "created": created if saved else 0,
+            "failed": error_count, "dryRun": dry_run
+        })
+        return {
+            "success": error_count == 0,
+            "message": f"Đã thêm {created if saved else 0}/{received} nhân viên"
+                       + (" (chạy thử, chưa lưu)" if dry_run else ""),
+            "dryRun": dry_run,
+            "received": received,
+            "created": created if saved else 0,
+            "valid": created,
+            "failed": error_count,
+            "errors": errors,
+            "errorsTruncated": error_count > len(errors)
+        }
+        
+    except HTTPException as http_err:
+        if conn:
+            await conn.rollback()
+        logger.info("request rejected", extra={"status": http_err.status_code, "detail": http_err.detail})
         raise
         
-    except psycopg2.Error as db_err:
+    except psycopg.Error as db_err:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Database error: {type(db_err).__name__} - {str(db_err)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -902,9 +2303,9 @@ async def delete_staff(staff_id: int):
         
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Unexpected error: {type(e).__name__} - {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
@@ -912,10 +2313,46 @@ async def delete_staff(staff_id: int):
         
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
+
+@app.get("/api/staff/export")
+async def export_staff(
+    format: str = "csv",
+    role: Optional[str] = None,
+    status: Optional[str] = None,
+    branchId: Optional[int] = None
+):
+    """
+    Download the staff directory as CSV or XLSX, streamed from a server-side
+    cursor (columns: STAFF_EXPORT_HEADERS, re-importable via /api/staff/import)
+    
+    Query Parameters:
+    - format: "csv" or "xlsx"
+    - role / status / branchId: same filters as /api/staff
+    """
+    format = file_format(format)
+    query = """
+        SELECT nv.id, nv.ho_ten, nv.chuc_vu, nv.so_dien_thoai, nv.trang_thai, nv.avatar,
+               nv.chi_nhanh_id, COALESCE(cn.ten_chi_nhanh, '')
+        FROM nhan_vien nv
+        LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
+        WHERE 1=1
+    """
+    params = []
+    if role:
+        query += " AND nv.chuc_vu = %s"
+        params.append(role)
+    if status:
+        query += " AND nv.trang_thai = %s"
+        params.append(status)
+    if branchId:
+        query += " AND nv.chi_nhanh_id = %s"
+        params.append(branchId)
+    query += " ORDER BY nv.id"
+    
+    return await export_rows_response(query, tuple(params), STAFF_EXPORT_HEADERS, format, "nhan_vien")
 
 # ==========================================
 # 3. API LỊCH LÀM VIỆC (Roster) - MỚI
@@ -923,14 +2360,10 @@ async def delete_staff(staff_id: int):
 
 # 3.1 API Shift Templates (Cấu hình ca)
 @app.get("/api/shift-templates")
-def get_shift_templates():
+async def get_shift_templates():
     """
-    Get all shift templates from cau_hinh_ca
+    Get all shift templates from cau_hinh_ca (reference-data cache)
     """
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     query = """
         SELECT id, ten_ca as "name", 
                TO_CHAR(gio_bat_dau, 'HH24:MI') as "startTime",
@@ -939,17 +2372,15 @@ def get_shift_templates():
         FROM cau_hinh_ca
         ORDER BY gio_bat_dau ASC
     """
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    shifts = await get_reference_data("shift_templates", query)
+    return shifts if shifts is not None else []
 
 @app.post("/api/shift-templates", status_code=status.HTTP_201_CREATED)
 async def create_shift_template(shift: ShiftTemplateCreate):
     """
     Create new shift template with time overlap validation
     """
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -958,7 +2389,7 @@ async def create_shift_template(shift: ShiftTemplateCreate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # Validation
         if not shift.name or not shift.name.strip():
@@ -974,12 +2405,12 @@ async def create_shift_template(shift: ShiftTemplateCreate):
             )
         
         # Check time overlap
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id, ten_ca FROM cau_hinh_ca
             WHERE (gio_bat_dau, gio_ket_thuc) OVERLAPS (%s::time, %s::time)
         """, (shift.startTime, shift.endTime))
         
-        existing = cursor.fetchone()
+        existing = await cursor.fetchone()
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -994,10 +2425,12 @@ async def create_shift_template(shift: ShiftTemplateCreate):
                       TO_CHAR(gio_ket_thuc, 'HH24:MI') as "endTime", so_luong_max
         """
         
-        cursor.execute(insert_sql, (shift.name.strip(), shift.startTime, shift.endTime, shift.maxCapacity))
-        new_shift = cursor.fetchone()
+        await cursor.execute(insert_sql, (shift.name.strip(), shift.startTime, shift.endTime, shift.maxCapacity))
+        new_shift = await cursor.fetchone()
+        await notify_reference_change(cursor, "shift_templates")
         
-        conn.commit()
+        await conn.commit()
+        invalidate_reference_cache("shift_templates")
         
         return {
             "success": True,
@@ -1013,27 +2446,27 @@ async def create_shift_template(shift: ShiftTemplateCreate):
         
     except HTTPException:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error creating shift template: {str(e)}"
         )
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
+            await release_db_connection(conn)
 
 @app.delete("/api/shift-templates/{shift_id}", status_code=status.HTTP_200_OK)
 async def delete_shift_template(shift_id: int):
     """
     Delete shift template (only if no assignments exist)
     """
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1041,30 +2474,32 @@ async def delete_shift_template(shift_id: int):
         )
     
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # Check if shift exists
-        cursor.execute("SELECT id FROM cau_hinh_ca WHERE id = %s", (shift_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM cau_hinh_ca WHERE id = %s", (shift_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Shift template not found"
             )
         
         # Check if any assignments use this shift
-        cursor.execute(
+        await cursor.execute(
             "SELECT COUNT(*) as count FROM lich_lam_viec WHERE ca_lam_id = %s",
             (shift_id,)
         )
-        count_result = cursor.fetchone()
+        count_result = await cursor.fetchone()
         if count_result['count'] > 0:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Cannot delete shift template with {count_result['count']} existing assignments"
             )
         
-        cursor.execute("DELETE FROM cau_hinh_ca WHERE id = %s", (shift_id,))
-        conn.commit()
+        await cursor.execute("DELETE FROM cau_hinh_ca WHERE id = %s", (shift_id,))
+        await notify_reference_change(cursor, "shift_templates")
+        await conn.commit()
+        invalidate_reference_cache("shift_templates")
         
         return {
             "success": True,
@@ -1072,27 +2507,52 @@ async def delete_shift_template(shift_id: int):
         }
         
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting shift template: {str(e)}"
         )
     finally:
-        conn.close()
+        await release_db_connection(conn)
 
 # 3.2 API Roster Assignments (Phân công ca)
-@app.get("/api/roster")
-def get_roster(start_date: Optional[str] = None, end_date: Optional[str] = None):
+# Window used by /api/roster when the caller does not give one
+ROSTER_DEFAULT_DAYS_BACK = 7
+ROSTER_DEFAULT_DAYS_AHEAD = 28
+ROSTER_DEFAULT_SPAN_DAYS = ROSTER_DEFAULT_DAYS_BACK + ROSTER_DEFAULT_DAYS_AHEAD
+
+@app.get("/api/roster", response_model=List[RosterEntry])
+async def get_roster(
+    response: Response,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
     """
-    Get roster assignments with optional date range filter
+    Get roster assignments in a date range (both ends inclusive)
     Returns full data with staff names, shift names, branch names
+    
+    Without dates, the window is the last week plus the next four weeks;
+    with only one end, the window spans ROSTER_DEFAULT_SPAN_DAYS from it.
+    Keyset pagination on (date, shift start, id): limit + X-Next-Cursor.
+    Conditional GET: ETag / If-None-Match -> 304.
     """
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    limit = clamp_page_limit(limit)
+    start = parse_iso_date(start_date, "start_date") if start_date else None
+    end = parse_iso_date(end_date, "end_date") if end_date else None
+    if start is None and end is None:
+        today = date.today()
+        start = today - timedelta(days=ROSTER_DEFAULT_DAYS_BACK)
+        end = today + timedelta(days=ROSTER_DEFAULT_DAYS_AHEAD)
+    elif start is None:
+        start = end - timedelta(days=ROSTER_DEFAULT_SPAN_DAYS)
+    elif end is None:
+        end = start + timedelta(days=ROSTER_DEFAULT_SPAN_DAYS)
     
     query = """
         SELECT l.id, l.nhan_vien_id as "staffId", nv.ho_ten as "staffName",
@@ -1107,24 +2567,39 @@ def get_roster(start_date: Optional[str] = None, end_date: Optional[str] = None)
         JOIN nhan_vien nv ON l.nhan_vien_id = nv.id
         JOIN cau_hinh_ca ca ON l.ca_lam_id = ca.id
         LEFT JOIN chi_nhanh cn ON l.chi_nhanh_id = cn.id
-        WHERE 1=1
+        WHERE l.ngay_lam >= %s AND l.ngay_lam < %s
     """
-    params = []
-    
-    if start_date:
-        query += " AND l.ngay_lam >= %s"
-        params.append(start_date)
+    params = [start, end + timedelta(days=1)]
     
-    if end_date:
-        query += " AND l.ngay_lam <= %s"
-        params.append(end_date)
+    if cursor:
+        last_date, last_start_time, last_id = decode_cursor(cursor, 3)
+        query += " AND (l.ngay_lam, ca.gio_bat_dau, l.id) > (%s::date, %s::time, %s)"
+        params.extend([last_date, last_start_time, last_id])
     
-    query += " ORDER BY l.ngay_lam ASC, ca.gio_bat_dau ASC"
+    query += " ORDER BY l.ngay_lam ASC, ca.gio_bat_dau ASC, l.id ASC LIMIT %s"
+    params.append(limit + 1)
     
-    cursor.execute(query, tuple(params))
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    conn = await get_db_connection()
+    if not conn: return []
+    db_cursor = conn.cursor()
+    try:
+        etag = await build_data_etag(conn, "roster", ROSTER_DATA_TABLES, params)
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(etag)
+        await db_cursor.execute(query, tuple(params))
+        rows = rows_to_dicts(db_cursor, await db_cursor.fetchall())
+    finally:
+        await release_db_connection(conn)
+    set_etag(response, etag)
+    rows = paginate_rows(
+        rows, limit, response,
+        lambda row: [row['date'], row['shiftStartTime'], row['id']]
+    )
+    return fast_json_response(rows, response)
+
+def is_capacity_violation(error: psycopg.Error) -> bool:
+    """True when the lich_lam_viec_suc_chua trigger refused an assignment (slot full)"""
+    return getattr(error.diag, "constraint_name", None) == "check_suc_chua_ca"
 
 @app.post("/api/assign-shift", status_code=status.HTTP_201_CREATED)
 async def assign_shift(assignment: ShiftAssignment):
@@ -1133,9 +2608,12 @@ async def assign_shift(assignment: ShiftAssignment):
     - Staff exists
     - Shift template exists
     - Staff not already assigned to any shift on that date
-    - Shift capacity not exceeded
+    - Shift capacity not exceeded (enforced in O(1) by the trigger on
+      lich_lam_viec_suc_chua, see migrate_shift_capacity.sql): 409 when full
     """
-    conn = get_db_connection()
+    work_date = parse_iso_date(assignment.date, "date")
+    
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1144,14 +2622,14 @@ async def assign_shift(assignment: ShiftAssignment):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # Validate staff exists
-        cursor.execute(
+        await cursor.execute(
             "SELECT id, ho_ten, avatar FROM nhan_vien WHERE id = %s",
             (assignment.staffId,)
         )
-        staff = cursor.fetchone()
+        staff = await cursor.fetchone()
         if not staff:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1159,66 +2637,59 @@ async def assign_shift(assignment: ShiftAssignment):
             )
         
         # Validate shift template exists
-        cursor.execute(
+        await cursor.execute(
             "SELECT id, ten_ca, so_luong_max FROM cau_hinh_ca WHERE id = %s",
             (assignment.shiftTemplateId,)
         )
-        shift_template = cursor.fetchone()
+        shift_template = await cursor.fetchone()
         if not shift_template:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Shift template not found"
             )
         
+        # Serialize concurrent assignments of the same staff member on the same day
+        await cursor.execute(
+            "SELECT pg_advisory_xact_lock(%s, %s)",
+            (assignment.staffId, work_date.toordinal())
+        )
+        
         # Check if staff already assigned to ANY shift on this date
-        cursor.execute("""
+        await cursor.execute("""
             SELECT id FROM lich_lam_viec 
             WHERE nhan_vien_id = %s AND ngay_lam = %s
-        """, (assignment.staffId, assignment.date))
+        """, (assignment.staffId, work_date))
         
-        if cursor.fetchone():
+        if await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Staff is already assigned to a shift on this date"
             )
         
-        # Check capacity
-        cursor.execute("""
-            SELECT COUNT(*) as count FROM lich_lam_viec 
-            WHERE ca_lam_id = %s AND ngay_lam = %s
-        """, (assignment.shiftTemplateId, assignment.date))
-        
-        count_result = cursor.fetchone()
-        if count_result['count'] >= shift_template['so_luong_max']:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Shift has reached maximum capacity ({shift_template['so_luong_max']} slots)"
-            )
-        
         # Handle branchId
         branch_id = assignment.branchId if assignment.branchId and assignment.branchId > 0 else None
         branch_name = 'Chưa phân bổ'
         
         if branch_id:
-            cursor.execute(
+            await cursor.execute(
                 "SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = %s",
                 (branch_id,)
             )
-            branch = cursor.fetchone()
+            branch = await cursor.fetchone()
             if branch:
                 branch_name = branch['ten_chi_nhanh']
         
-        # Insert assignment
+        # Insert assignment (the capacity trigger rejects it if the slot is full)
         insert_sql = """
             INSERT INTO lich_lam_viec (nhan_vien_id, ca_lam_id, ngay_lam, chi_nhanh_id)
             VALUES (%s, %s, %s, %s)
             RETURNING id
         """
         
-        cursor.execute(insert_sql, (assignment.staffId, assignment.shiftTemplateId, assignment.date, branch_id))
-        new_assignment = cursor.fetchone()
+        await cursor.execute(insert_sql, (assignment.staffId, assignment.shiftTemplateId, work_date, branch_id))
+        new_assignment = await cursor.fetchone()
         
-        conn.commit()
+        await conn.commit()
         
         return {
             "success": True,
@@ -1238,27 +2709,388 @@ async def assign_shift(assignment: ShiftAssignment):
         
     except HTTPException:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise
+    except psycopg.errors.CheckViolation as e:
+        if conn:
+            await conn.rollback()
+        if not is_capacity_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error assigning shift: {str(e)}"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Shift has reached maximum capacity ({shift_template['so_luong_max']} slots)"
+        )
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error assigning shift: {str(e)}"
         )
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
+        if conn:
+            await release_db_connection(conn)
+
+BULK_ASSIGN_MAX_ITEMS = int(os.getenv("BULK_ASSIGN_MAX_ITEMS", "2000"))
+
+@app.post("/api/assign-shift/bulk", status_code=status.HTTP_200_OK)
+async def assign_shifts_bulk(bulk: BulkShiftAssignment):
+    """
+    Assign many staff/shift/date slots at once with the same rules as
+    /api/assign-shift, validated with a few set-based queries:
+    - Staff, shift template and branch exist (one ANY(...) query each)
+    - Staff not already assigned on that date (in DB or earlier in the batch)
+    - Shift capacity (so_luong_max per shift, date and branch) not exceeded,
+      read from the locked lich_lam_viec_suc_chua counters
+    Valid items are inserted with one INSERT ... SELECT FROM unnest(...) in a
+    single transaction. Items are processed in order; results are per item.
+    """
+    items = bulk.assignments
+    if not items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No assignments provided"
+        )
+    if len(items) > BULK_ASSIGN_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot assign more than {BULK_ASSIGN_MAX_ITEMS} slots per request"
+        )
+    
+    results = [None] * len(items)
+    work_dates = {}
+    for index, item in enumerate(items):
+        try:
+            work_dates[index] = date.fromisoformat(item.date.strip())
+        except (ValueError, AttributeError):
+            results[index] = {"index": index, "success": False, "error": "date must be in YYYY-MM-DD format"}
+    
+    valid_indexes = [i for i in range(len(items)) if results[i] is None]
+    staff_ids = list({items[i].staffId for i in valid_indexes})
+    shift_ids = list({items[i].shiftTemplateId for i in valid_indexes})
+    branch_ids = list({items[i].branchId for i in valid_indexes if items[i].branchId and items[i].branchId > 0})
+    slot_staff = [items[i].staffId for i in valid_indexes]
+    slot_shift = [items[i].shiftTemplateId for i in valid_indexes]
+    slot_date = [work_dates[i] for i in valid_indexes]
+    # Capacity counters use branch 0 for assignments without a branch
+    slot_branch = [items[i].branchId if items[i].branchId and items[i].branchId > 0 else 0 for i in valid_indexes]
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    
+    cursor = None
+    try:
+        cursor = conn.cursor(row_factory=dict_row)
+        
+        await cursor.execute(
+            "SELECT id, ho_ten, avatar FROM nhan_vien WHERE id = ANY(%s::int[])", (staff_ids,)
+        )
+        staff_by_id = {row['id']: row for row in await cursor.fetchall()}
+        
+        await cursor.execute(
+            "SELECT id, ten_ca, so_luong_max FROM cau_hinh_ca WHERE id = ANY(%s::int[])", (shift_ids,)
+        )
+        shift_by_id = {row['id']: row for row in await cursor.fetchall()}
+        
+        await cursor.execute(
+            "SELECT id, ten_chi_nhanh FROM chi_nhanh WHERE id = ANY(%s::int[])", (branch_ids,)
+        )
+        branch_by_id = {row['id']: row for row in await cursor.fetchall()}
+        
+        # Lock every requested (staff, day) in a fixed order, like assign_shift does
+        await cursor.execute("""
+            SELECT pg_advisory_xact_lock(req.nhan_vien_id, req.ngay)
+            FROM (
+                SELECT DISTINCT * FROM unnest(%s::int[], %s::int[]) AS r(nhan_vien_id, ngay)
+                ORDER BY 1, 2
+            ) req
+        """, (slot_staff, [d.toordinal() for d in slot_date]))
+        
+        # Staff already working on one of the requested dates
+        await cursor.execute("""
+            SELECT DISTINCT l.nhan_vien_id, l.ngay_lam
+            FROM lich_lam_viec l
+            JOIN unnest(%s::int[], %s::date[]) AS req(nhan_vien_id, ngay_lam)
+              ON l.nhan_vien_id = req.nhan_vien_id AND l.ngay_lam = req.ngay_lam
+        """, (slot_staff, slot_date))
+        busy_days = {(row['nhan_vien_id'], row['ngay_lam']) for row in await cursor.fetchall()}
+        
+        # Create the missing counter rows first, in key order: otherwise the capacity
+        # trigger creates them in request order and two batches that touch the same
+        # new slots in opposite order deadlock on the counter's unique index
+        await cursor.execute("""
+            INSERT INTO lich_lam_viec_suc_chua (ca_lam_id, ngay_lam, chi_nhanh_id, so_luong)
+            SELECT req.ca_lam_id, req.ngay_lam, req.chi_nhanh_id, 0
+            FROM (
+                SELECT DISTINCT * FROM unnest(%s::int[], %s::date[], %s::int[]) AS r(ca_lam_id, ngay_lam, chi_nhanh_id)
+            ) req
+            JOIN cau_hinh_ca ca ON ca.id = req.ca_lam_id
+            ORDER BY 1, 2, 3
+            ON CONFLICT (ca_lam_id, ngay_lam, chi_nhanh_id) DO NOTHING
+        """, (slot_shift, slot_date, slot_branch))
+        
+        # Current occupancy of every requested shift/date/branch, locked until commit
+        await cursor.execute("""
+            SELECT sc.ca_lam_id, sc.ngay_lam, sc.chi_nhanh_id, sc.so_luong
+            FROM lich_lam_viec_suc_chua sc
+            WHERE (sc.ca_lam_id, sc.ngay_lam, sc.chi_nhanh_id) IN (
+                SELECT DISTINCT * FROM unnest(%s::int[], %s::date[], %s::int[])
+            )
+            ORDER BY 1, 2, 3
+            FOR UPDATE
+        """, (slot_shift, slot_date, slot_branch))
+        occupancy = {
+            (row['ca_lam_id'], row['ngay_lam'], row['chi_nhanh_id']): row['so_luong']
+            for row in await cursor.fetchall()
+        }
+        
+        # Apply the rules item by item, counting earlier items of the same batch
+        accepted = []
+        for index in valid_indexes:
+            item = items[index]
+            work_date = work_dates[index]
+            staff = staff_by_id.get(item.staffId)
+            shift_template = shift_by_id.get(item.shiftTemplateId)
+            branch_id = item.branchId if item.branchId and item.branchId > 0 else None
+            
+            error = None
+            if not staff:
+                error = "Staff not found"
+            elif not shift_template:
+                error = "Shift template not found"
+            elif branch_id is not None and branch_id not in branch_by_id:
+                error = "Branch not found"
+            elif (item.staffId, work_date) in busy_days:
+                error = "Staff is already assigned to a shift on this date"
+            elif occupancy.get((item.shiftTemplateId, work_date, branch_id or 0), 0) >= shift_template['so_luong_max']:
+                error = f"Shift has reached maximum capacity ({shift_template['so_luong_max']} slots)"
+            
+            if error:
+                results[index] = {"index": index, "success": False, "error": error}
+                continue
+            
+            busy_days.add((item.staffId, work_date))
+            slot_key = (item.shiftTemplateId, work_date, branch_id or 0)
+            occupancy[slot_key] = occupancy.get(slot_key, 0) + 1
+            accepted.append((index, branch_id))
+        
+        failed = sum(1 for r in results if r is not None)
+        # Same key order as the counter locks above
+        accepted.sort(key=lambda entry: (items[entry[0]].shiftTemplateId, work_dates[entry[0]], entry[1] or 0))
+        if accepted and not (bulk.allOrNothing and failed):
+            await cursor.execute("""
+                INSERT INTO lich_lam_viec (nhan_vien_id, ca_lam_id, ngay_lam, chi_nhanh_id)
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::date[], %s::int[])
+                RETURNING id, nhan_vien_id, ngay_lam
+            """, (
+                [items[i].staffId for i, _ in accepted],
+                [items[i].shiftTemplateId for i, _ in accepted],
+                [work_dates[i] for i, _ in accepted],
+                [branch_id for _, branch_id in accepted],
+            ))
+            # One shift per staff per day, so (staff, date) identifies the new row
+            new_ids = {(row['nhan_vien_id'], row['ngay_lam']): row['id'] for row in await cursor.fetchall()}
+            await conn.commit()
+            
+            for index, branch_id in accepted:
+                item = items[index]
+                results[index] = {
+                    "index": index,
+                    "success": True,
+                    "data": {
+                        "id": new_ids.get((item.staffId, work_dates[index])),
+                        "staffId": item.staffId,
+                        "staffName": staff_by_id[item.staffId]['ho_ten'],
+                        "avatar": staff_by_id[item.staffId]['avatar'],
+                        "date": work_dates[index].isoformat(),
+                        "shiftTemplateId": item.shiftTemplateId,
+                        "shiftName": shift_by_id[item.shiftTemplateId]['ten_ca'],
+                        "branchId": branch_id,
+                        "branchName": branch_by_id[branch_id]['ten_chi_nhanh'] if branch_id else 'Chưa phân bổ'
+                    }
+                }
+        else:
+            await conn.rollback()
+            for index, _ in accepted:
+                results[index] = {"index": index, "success": False, "error": "Not saved: other items in the batch failed"}
+        
+        created = sum(1 for r in results if r['success'])
+        logger.info("bulk assign", extra={"created": created, "failed": len(items) - created})
+        return {
+            "success": created == len(items),
+            "message": f"Đã phân công {created}/{len(items)} ca",
+            "created": created,
+            "failed": len(items) - created,
+            "results": results
+        }
+        
+    except HTTPException:
+        if conn:
+            await conn.rollback()
+        raise
+    except psycopg.errors.CheckViolation as e:
+        if conn:
+            await conn.rollback()
+        if not is_capacity_violation(e):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error assigning shifts: {str(e)}"
+            )
+        # A slot that had no counter row yet was filled concurrently
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Shift capacity changed while saving, please retry"
+        )
+    except psycopg.errors.DeadlockDetected:
+        if conn:
+            await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another roster change touched the same shifts, please retry"
+        )
+    except Exception as e:
+        if conn:
+            await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error assigning shifts: {str(e)}"
+        )
+    finally:
+        if cursor:
+            await cursor.close()
         if conn:
-            conn.close()
+            await release_db_connection(conn)
+
+ROSTER_GENERATE_DAYS = 7
+
+@app.post("/api/roster/generate")
+async def generate_roster(request: RosterGenerateRequest):
+    """
+    Propose a week roster (draft only, nothing is saved).
+    
+    Logic Flow:
+    1. Load shift templates, active staff ('Đang làm') and the week's existing
+       assignments, plus the days around the week for the rest-time check
+       (set-based queries)
+    2. Fill every shift / day / branch with phu_ai.processor.generate_week_roster:
+       capacity, one shift per day, max shifts per week, minimum rest time
+    3. Return the draft; the assignments can be saved via /api/assign-shift/bulk
+    """
+    week_start = parse_iso_date(request.weekStart, "weekStart")
+    if request.maxShiftsPerStaff < 1 or request.maxShiftsPerStaff > ROSTER_GENERATE_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"maxShiftsPerStaff must be between 1 and {ROSTER_GENERATE_DAYS}"
+        )
+    if request.minRestHours < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="minRestHours cannot be negative"
+        )
+    week_end = week_start + timedelta(days=ROSTER_GENERATE_DAYS)
+    # Shifts this close to the week (e.g. last Sunday's Ca Tối before Monday's
+    # Ca Sáng) can still break the minimum rest time
+    rest_margin = timedelta(days=1 + int(request.minRestHours // 24))
+    
+    branch_query = "SELECT id, ten_chi_nhanh FROM chi_nhanh"
+    staff_query = """
+        SELECT id, ho_ten, chi_nhanh_id FROM nhan_vien
+        WHERE trang_thai = 'Đang làm' AND chi_nhanh_id IS NOT NULL
+    """
+    existing_query = """
+        SELECT nhan_vien_id, ca_lam_id, ngay_lam, COALESCE(chi_nhanh_id, 0)
+        FROM lich_lam_viec
+        WHERE ngay_lam >= %s AND ngay_lam < %s
+    """
+    branch_params = []
+    staff_params = []
+    existing_params = [week_start - rest_margin, week_end + rest_margin]
+    if request.branchIds:
+        branch_query += " WHERE id = ANY(%s::int[])"
+        branch_params.append(request.branchIds)
+        staff_query += " AND chi_nhanh_id = ANY(%s::int[])"
+        staff_params.append(request.branchIds)
+        # Staff of these branches may already work elsewhere this week
+        existing_query += " AND (chi_nhanh_id = ANY(%s::int[]) OR nhan_vien_id IN (SELECT id FROM nhan_vien WHERE chi_nhanh_id = ANY(%s::int[])))"
+        existing_params.extend([request.branchIds, request.branchIds])
+    branch_query += " ORDER BY id ASC"
+    staff_query += " ORDER BY id ASC"
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    cursor = conn.cursor()
+    try:
+        await cursor.execute("""
+            SELECT id, ten_ca, gio_bat_dau, gio_ket_thuc, so_luong_max
+            FROM cau_hinh_ca
+            ORDER BY gio_bat_dau ASC
+        """)
+        shift_rows = await cursor.fetchall()
+        await cursor.execute(branch_query, tuple(branch_params))
+        branch_rows = await cursor.fetchall()
+        await cursor.execute(staff_query, tuple(staff_params))
+        staff_rows = await cursor.fetchall()
+        await cursor.execute(existing_query, tuple(existing_params))
+        existing_rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    
+    if not shift_rows:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No shift templates configured"
+        )
+    
+    branch_names = {branch_id: name for branch_id, name in branch_rows}
+    shifts = [ShiftTemplate(*row) for row in shift_rows]
+    staff = [StaffMember(*row) for row in staff_rows]
+    week_rows = [row for row in existing_rows if week_start <= row[2] < week_end]
+    adjacent_rows = [row[:3] for row in existing_rows if not week_start <= row[2] < week_end]
+    
+    def run():
+        return generate_week_roster(
+            week_start, shifts, staff,
+            existing=week_rows,
+            branch_ids=list(branch_names),
+            days=ROSTER_GENERATE_DAYS,
+            max_shifts_per_staff=request.maxShiftsPerStaff,
+            min_rest_hours=request.minRestHours,
+            adjacent=adjacent_rows
+        )
+    
+    # Scheduling tens of thousands of staff is CPU work: keep it off the event loop
+    draft = await run_in_threadpool(run)
+    for item in draft.assignments + draft.unfilled:
+        item['branchName'] = branch_names.get(item['branchId'])
+    
+    return {
+        "weekStart": week_start.isoformat(),
+        "weekEnd": (week_end - timedelta(days=1)).isoformat(),
+        "saved": False,
+        "assignments": draft.assignments,
+        "unfilled": draft.unfilled,
+        "summary": draft.summary()
+    }
 
 @app.delete("/api/roster/{assignment_id}", status_code=status.HTTP_200_OK)
 async def delete_assignment(assignment_id: int):
     """
     Delete roster assignment
     """
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1269,15 +3101,15 @@ async def delete_assignment(assignment_id: int):
         cursor = conn.cursor()
         
         # Check if assignment exists
-        cursor.execute("SELECT id FROM lich_lam_viec WHERE id = %s", (assignment_id,))
-        if not cursor.fetchone():
+        await cursor.execute("SELECT id FROM lich_lam_viec WHERE id = %s", (assignment_id,))
+        if not await cursor.fetchone():
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Assignment not found"
             )
         
-        cursor.execute("DELETE FROM lich_lam_viec WHERE id = %s", (assignment_id,))
-        conn.commit()
+        await cursor.execute("DELETE FROM lich_lam_viec WHERE id = %s", (assignment_id,))
+        await conn.commit()
         
         return {
             "success": True,
@@ -1285,186 +3117,894 @@ async def delete_assignment(assignment_id: int):
         }
         
     except HTTPException:
-        conn.rollback()
+        await conn.rollback()
         raise
     except Exception as e:
-        conn.rollback()
+        await conn.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error deleting assignment: {str(e)}"
         )
     finally:
-        conn.close()
+        await release_db_connection(conn)
 
 # ==========================================
 # 4. API CHẤM CÔNG (Attendance & Timesheet)
 # ==========================================
-@app.get("/api/attendance")
-def get_attendance():
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    query = """
-        SELECT nv.ho_ten as "staffName", 
-               TO_CHAR(c.ngay, 'DD/MM/YYYY') as date, 
-               c.gio_vao as "checkIn", c.gio_ra as "checkOut",
-               c.trang_thai_checkin
-        FROM cham_cong c
-        JOIN nhan_vien nv ON c.nhan_vien_id = nv.id
-        ORDER BY c.ngay DESC, c.gio_vao ASC
-    """
-    cursor.execute(query)
-    data = cursor.fetchall()
-    
-    # Tính toán tổng giờ (Giả lập đơn giản)
-    for row in data:
-        row['totalHours'] = '8h' 
-        # Logic hiển thị trễ cho frontend
-        if row['trang_thai_checkin'] == 'Trễ':
-             row['isLate'] = True # Frontend có thể dùng cờ này để tô đỏ
-        
-    conn.close()
-    return data
+# Window used by /api/attendance when the caller does not give one
+ATTENDANCE_DEFAULT_DAYS = 30
 
-@app.get("/api/timesheet")
-def get_timesheet(
-    start_date: Optional[str] = None, 
+@app.get("/api/attendance")
+async def get_attendance(
+    response: Response,
+    start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     branch_id: Optional[int] = None,
-    search: Optional[str] = None
+    staff_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
     """
-    Get timesheet data for staff with attendance records
-    Returns matrix-friendly structure for Frontend rendering
-    """
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    Get attendance records (newest day first) with worked hours computed
+    server-side by WORK_HOURS_SQL (same rules as calculate_work_hours)
     
-    # Build base query with all JOINs first
-    query = """
-        SELECT 
-            nv.id as "staffId",
-            nv.ho_ten as "staffName",
-            nv.avatar,
-            nv.chuc_vu as "role",
-            COALESCE(cn.ten_chi_nhanh, 'Chưa phân bổ') as "branchName",
-            TO_CHAR(c.ngay, 'YYYY-MM-DD') as date,
-            c.gio_vao as "checkIn",
-            c.gio_ra as "checkOut",
-            c.trang_thai_checkin as "status"
-        FROM nhan_vien nv
-        LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
-        LEFT JOIN cham_cong c ON nv.id = c.nhan_vien_id
-        WHERE 1=1
+    Query Parameters:
+    - start_date / end_date: Date range "YYYY-MM-DD", both inclusive
+      (default: the last ATTENDANCE_DEFAULT_DAYS days)
+    - branch_id: Filter by the staff member's branch
+    - staff_id: Filter by staff member
+    - limit / cursor: Keyset pagination (next page token in X-Next-Cursor)
     """
+    limit = clamp_page_limit(limit)
+    start = parse_iso_date(start_date, "start_date") if start_date else None
+    end = parse_iso_date(end_date, "end_date") if end_date else None
+    if end is None:
+        end = date.today() if start is None else start + timedelta(days=ATTENDANCE_DEFAULT_DAYS - 1)
+    if start is None:
+        start = end - timedelta(days=ATTENDANCE_DEFAULT_DAYS - 1)
     
-    params = []
+    # Half-open range on ngay -> idx_cham_cong_ngay / (nhan_vien_id, ngay) index
+    query = f"""
+        SELECT c.id,
+               c.nhan_vien_id as "staffId",
+               nv.ho_ten as "staffName", 
+               TO_CHAR(c.ngay, 'DD/MM/YYYY') as date, 
+               c.ngay as "sortDate",
+               COALESCE(c.gio_vao::text, '') as "sortCheckIn",
+               c.gio_vao as "checkIn", c.gio_ra as "checkOut",
+               c.trang_thai_checkin,
+               CASE WHEN c.gio_vao IS NOT NULL AND c.gio_ra IS NOT NULL
+                    THEN {WORK_HOURS_SQL}
+                    ELSE 0
+               END as hours
+        FROM cham_cong c
+        JOIN nhan_vien nv ON c.nhan_vien_id = nv.id
+        WHERE c.ngay >= %s AND c.ngay < %s
+    """
+    params = [start, end + timedelta(days=1)]
     
-    # Add staff filters
-    if search:
-        query += " AND (nv.ho_ten ILIKE %s OR nv.so_dien_thoai ILIKE %s)"
-        search_pattern = f"%{search}%"
-        params.extend([search_pattern, search_pattern])
+    if staff_id:
+        query += " AND c.nhan_vien_id = %s"
+        params.append(staff_id)
     
     if branch_id:
         query += " AND nv.chi_nhanh_id = %s"
         params.append(branch_id)
     
-    # Add date range filters
-    if start_date and end_date:
-        query += " AND (c.ngay IS NULL OR (c.ngay >= %s AND c.ngay <= %s))"
-        params.extend([start_date, end_date])
-    elif start_date:
-        query += " AND (c.ngay IS NULL OR c.ngay >= %s)"
-        params.append(start_date)
-    elif end_date:
-        query += " AND (c.ngay IS NULL OR c.ngay <= %s)"
-        params.append(end_date)
+    # Keyset for ORDER BY ngay DESC, check-in ASC, id ASC
+    if cursor:
+        last_date, last_check_in, last_id = decode_cursor(cursor, 3)
+        query += """
+            AND (c.ngay < %s::date
+                 OR (c.ngay = %s::date AND (COALESCE(c.gio_vao::text, ''), c.id) > (%s, %s)))
+        """
+        params.extend([last_date, last_date, last_check_in, last_id])
     
-    query += " ORDER BY nv.id ASC, c.ngay ASC"
+    query += " ORDER BY c.ngay DESC, COALESCE(c.gio_vao::text, '') ASC, c.id ASC LIMIT %s"
+    params.append(limit + 1)
     
-    cursor.execute(query, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
+    conn = await get_db_connection()
+    if not conn: return []
+    db_cursor = conn.cursor(row_factory=dict_row)
+    try:
+        await db_cursor.execute(query, tuple(params))
+        rows = await db_cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
     
-    # Transform data into matrix-friendly structure
-    staff_dict = {}
+    data = paginate_rows(
+        rows, limit, response,
+        lambda row: [row['sortDate'].isoformat(), row['sortCheckIn'], row['id']]
+    )
+    for row in data:
+        del row['sortDate'], row['sortCheckIn']
+        row['hours'] = float(row['hours'])
+        row['totalHours'] = f"{row['hours']:g}h"
+        # Logic hiển thị trễ cho frontend
+        row['isLate'] = row['trang_thai_checkin'] == 'Trễ' # Frontend có thể dùng cờ này để tô đỏ
     
-    for row in rows:
-        staff_id = row['staffId']
-        
-        if staff_id not in staff_dict:
-            staff_dict[staff_id] = {
-                'staffId': staff_id,
-                'staffName': row['staffName'],
-                'avatar': row['avatar'],
-                'role': row['role'],
-                'branchName': row['branchName'],
-                'totalHours': 0,
-                'attendance': {}
-            }
-        
-        # Process attendance record if exists
-        if row['date'] and row['checkIn'] and row['checkOut']:
-            try:
-                date = row['date']
-                check_in = row['checkIn']
-                check_out = row['checkOut']
-                
-                # Calculate hours worked (safe parsing inside calculate_work_hours)
-                hours = calculate_work_hours(check_in, check_out)
-                
-                staff_dict[staff_id]['attendance'][date] = {
-                    'in': check_in,
-                    'out': check_out,
-                    'hours': hours,
-                    'status': row['status']
-                }
-                
-                staff_dict[staff_id]['totalHours'] += hours
-            except Exception as e:
-                # Log error but continue processing other rows
-                print(f"[ERROR] Failed to process attendance for staff {staff_id} on {row['date']}: {e}")
-                continue
+    return data
+
+# --- Attendance import (time-clock CSV / XLSX exports) ---
+# Rows are validated ATTENDANCE_IMPORT_CHUNK_ROWS at a time in the threadpool and
+# COPYed into a temp staging table, then merged into cham_cong in one statement
+# (needs uq_cham_cong_nhan_vien_ngay from migrate_attendance_import.sql).
+ATTENDANCE_IMPORT_CHUNK_ROWS = 5000
+ATTENDANCE_IMPORT_MAX_ERRORS = 1000
+# Check-in later than shift start + grace -> 'Trễ' (when the file has no status)
+ATTENDANCE_LATE_GRACE_MINUTES = int(os.getenv("ATTENDANCE_LATE_GRACE_MINUTES", "5"))
+ATTENDANCE_STATUSES = ("Đúng giờ", "Trễ")
+ATTENDANCE_IMPORT_HEADERS = {
+    "staffid": "staffId", "staff_id": "staffId", "nhan_vien_id": "staffId", "ma_nv": "staffId",
+    "date": "date", "ngay": "date",
+    "checkin": "checkIn", "check_in": "checkIn", "in": "checkIn", "gio_vao": "checkIn",
+    "checkout": "checkOut", "check_out": "checkOut", "out": "checkOut", "gio_ra": "checkOut",
+    "status": "status", "trang_thai": "status", "trang_thai_checkin": "status",
+}
+ATTENDANCE_IMPORT_REQUIRED = ("staffId", "date", "checkIn")
+CLOCK_TIME_PATTERN = re.compile(r'^([01]?[0-9]|2[0-3]):([0-5][0-9])$')
+
+# Minutes after the start of the staff member's rostered shift that day (alias
+# ca.gio_bat_dau, check-in src.gio_vao), wrapped so a 00:10 check-in for Ca Tối
+# 18:00-02:00 counts as late and 17:55 as early
+LATE_CHECKIN_SQL = """
+    CASE WHEN ca.gio_bat_dau IS NOT NULL
+          AND MOD((EXTRACT(EPOCH FROM (src.gio_vao::time - ca.gio_bat_dau)) / 60)::int + 1440, 1440)
+              BETWEEN %(grace)s + 1 AND 720
+         THEN 'Trễ' ELSE 'Đúng giờ'
+    END
+"""
+
+ATTENDANCE_IMPORT_MERGE = f"""
+    WITH source AS (
+        -- A day listed twice in the file: the last line wins
+        SELECT DISTINCT ON (nhan_vien_id, ngay) *
+        FROM cham_cong_import
+        ORDER BY nhan_vien_id, ngay, line DESC
+    ), resolved AS (
+        SELECT src.nhan_vien_id, src.ngay, src.gio_vao, src.gio_ra,
+               COALESCE(src.trang_thai_checkin, {LATE_CHECKIN_SQL}) AS trang_thai_checkin
+        FROM source src
+        LEFT JOIN LATERAL (
+            SELECT ca.gio_bat_dau
+            FROM lich_lam_viec l
+            JOIN cau_hinh_ca ca ON ca.id = l.ca_lam_id
+            WHERE l.nhan_vien_id = src.nhan_vien_id AND l.ngay_lam = src.ngay
+            ORDER BY ca.gio_bat_dau
+            LIMIT 1
+        ) ca ON true
+    ), merged AS (
+        INSERT INTO cham_cong (nhan_vien_id, ngay, gio_vao, gio_ra, trang_thai_checkin)
+        SELECT nhan_vien_id, ngay, gio_vao, gio_ra, trang_thai_checkin FROM resolved
+        ON CONFLICT (nhan_vien_id, ngay) DO UPDATE
+        SET gio_vao = EXCLUDED.gio_vao,
+            -- A check-in-only export must not wipe an existing check-out
+            gio_ra = COALESCE(EXCLUDED.gio_ra, cham_cong.gio_ra),
+            trang_thai_checkin = EXCLUDED.trang_thai_checkin
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+    FROM merged
+"""
+
+def parse_clock_time(value: str, field: str) -> str:
+    match = CLOCK_TIME_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"{field} must be HH:MM, got {value!r}")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+def parse_import_date(value: str) -> date:
+    value = value.strip()
+    try:
+        if "/" in value:
+            return datetime.strptime(value, "%d/%m/%Y").date()
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"date must be YYYY-MM-DD or DD/MM/YYYY, got {value!r}")
+
+def validate_attendance_chunk(rows, columns: Dict[str, int], staff_ids: set):
+    """
+    Validate one chunk of (line, fields) rows.
+    Returns (COPY text rows for cham_cong_import, error dicts).
+    """
+    copy_lines = []
+    errors = []
+    width = max(columns.values()) + 1
+    # Exports repeat the same few dates and clock times: parse each once
+    dates: Dict[str, str] = {}
+    times: Dict[str, str] = {}
     
-    # Convert dict to list and round total hours
-    result = []
-    for staff_data in staff_dict.values():
-        staff_data['totalHours'] = round(staff_data['totalHours'], 1)
-        result.append(staff_data)
+    def clock_time(value: str, field: str) -> str:
+        if value not in times:
+            times[value] = parse_clock_time(value, field)
+        return times[value]
     
-    return result
+    for line, fields in rows:
+        if not any(value.strip() for value in fields):
+            continue
+        try:
+            if len(fields) < width:
+                fields += [""] * (width - len(fields))
+            try:
+                staff_id = int(fields[columns["staffId"]])
+            except ValueError:
+                raise ValueError(f"staffId must be an integer, got {fields[columns['staffId']]!r}")
+            if staff_id not in staff_ids:
+                raise ValueError(f"staff {staff_id} not found")
+            day = fields[columns["date"]]
+            if day not in dates:
+                dates[day] = parse_import_date(day).isoformat()
+            check_in = clock_time(fields[columns["checkIn"]], "checkIn")
+            check_out = fields[columns["checkOut"]].strip() if "checkOut" in columns else ""
+            check_out = clock_time(check_out, "checkOut") if check_out else "\\N"
+            checkin_status = fields[columns["status"]].strip() if "status" in columns else ""
+            if checkin_status and checkin_status not in ATTENDANCE_STATUSES:
+                raise ValueError(f"status must be one of {', '.join(ATTENDANCE_STATUSES)}, got {checkin_status!r}")
+        except ValueError as e:
+            errors.append({"line": line, "error": str(e)})
+            continue
+        # Every value is validated above, so no COPY escaping is needed
+        copy_lines.append("\t".join((
+            str(line), str(staff_id), dates[day], check_in, check_out, checkin_status or "\\N"
+        )) + "\n")
+    return "".join(copy_lines), errors
 
-def calculate_work_hours(check_in: str, check_out: str) -> float:
+@app.post("/api/attendance/import")
+async def import_attendance(request: Request, format: Optional[str] = None, dry_run: bool = False):
     """
-    Calculate work hours from time strings using datetime module
-    Format: "HH:MM" (e.g., "08:00", "17:30")
-    Logic: Parse with strptime, calculate exact time difference (no auto lunch deduction)
+    Import a time-clock export (CSV or XLSX) into cham_cong (upsert per staff and day).
+    
+    Send the file as the raw request body, e.g.
+    curl -H 'Content-Type: text/csv' --data-binary @cham_cong.csv .../api/attendance/import
+    
+    Columns (header row, any order): staffId, date (YYYY-MM-DD or DD/MM/YYYY),
+    checkIn (HH:MM), optional checkOut (HH:MM), optional status ('Đúng giờ' / 'Trễ').
+    Without a status, check-ins more than ATTENDANCE_LATE_GRACE_MINUTES after
+    the start of that day's rostered shift are marked 'Trễ'.
+    
+    The body is streamed: rows are validated in chunks and COPYed into a
+    staging table, then merged in one INSERT ... ON CONFLICT. Invalid rows are
+    skipped and reported by line number; valid rows are imported.
+    
+    Query Parameters:
+    - format: "csv" or "xlsx" (default: from the Content-Type)
+    - dry_run: validate and count inserts/updates, then roll back
     """
+    format = file_format(format, request.headers.get("content-type"))
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    
+    cursor = None
+    received = valid = 0
+    errors = []
+    error_count = 0
     try:
-        # Parse time strings using datetime
-        time_format = '%H:%M'
-        t_in = datetime.strptime(check_in.strip(), time_format)
-        t_out = datetime.strptime(check_out.strip(), time_format)
+        cursor = conn.cursor()
+        await cursor.execute("SELECT id FROM nhan_vien")
+        staff_ids = {row[0] for row in await cursor.fetchall()}
+        await cursor.execute("""
+            CREATE TEMP TABLE cham_cong_import (
+                line INTEGER NOT NULL,
+                nhan_vien_id INTEGER NOT NULL,
+                ngay DATE NOT NULL,
+                gio_vao VARCHAR(5) NOT NULL,
+                gio_ra VARCHAR(5),
+                trang_thai_checkin TEXT
+            ) ON COMMIT DROP
+        """)
+        
+        columns = None
+        async with cursor.copy(
+            "COPY cham_cong_import (line, nhan_vien_id, ngay, gio_vao, gio_ra, trang_thai_checkin) FROM STDIN"
+        ) as copy:
+            chunk = []
+            
+            async def flush():
+                nonlocal valid, error_count
+                data, chunk_errors = await run_in_threadpool(validate_attendance_chunk, chunk, columns, staff_ids)
+                if data:
+                    await copy.write(data)
+                    valid += data.count("\n")
+                error_count += len(chunk_errors)
+                errors.extend(chunk_errors[:ATTENDANCE_IMPORT_MAX_ERRORS - len(errors)])
+                chunk.clear()
+            
+            async for rows in iter_import_rows(request, format):
+                if columns is None:
+                    _, header = rows.pop(0)
+                    columns = map_import_header(header, ATTENDANCE_IMPORT_HEADERS, ATTENDANCE_IMPORT_REQUIRED)
+                received += sum(1 for _, fields in rows if any(value.strip() for value in fields))
+                chunk.extend(rows)
+                if len(chunk) >= ATTENDANCE_IMPORT_CHUNK_ROWS:
+                    await flush()
+            if chunk:
+                await flush()
+        
+        if columns is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Empty file: expected a header row and attendance rows"
+            )
         
-        # Handle overnight shifts (check_out < check_in)
-        # Add 24 hours to checkout time if it's earlier than check-in
-        if t_out < t_in:
-            from datetime import timedelta
-            t_out += timedelta(days=1)
+        inserted = updated = 0
+        if valid:
+            await cursor.execute(ATTENDANCE_IMPORT_MERGE, {"grace": ATTENDANCE_LATE_GRACE_MINUTES})
+            inserted, updated = await cursor.fetchone()
+        if dry_run:
+            await conn.rollback()
+        else:
+            await conn.commit()
         
-        # Calculate difference in hours (exact time difference)
-        time_diff = t_out - t_in
-        work_hours = time_diff.total_seconds() / 3600
+        logger.info("attendance import", extra={
+            "received": received, "inserted": inserted, "updated": updated,
+            "failed": error_count, "dryRun": dry_run
+        })
+        return {
+            "success": error_count == 0,
+            "message": f"Đã nhập {inserted + updated}/{received} dòng chấm công"
+                       + (" (chạy thử, chưa lưu)" if dry_run else ""),
+            "dryRun": dry_run,
+            "received": received,
+            "inserted": inserted,
+            "updated": updated,
+            # Valid lines overridden by a later line for the same staff and day
+            "duplicates": valid - inserted - updated,
+            "failed": error_count,
+            "errors": errors,
+            "errorsTruncated": error_count > len(errors)
+        }
         
-        return max(0, round(work_hours, 1))  # Ensure non-negative and round to 1 decimal
+    except HTTPException:
+        if conn:
+            await conn.rollback()
+        raise
+    except Exception as e:
+        if conn:
+            await conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error importing attendance: {str(e)}"
+        )
+    finally:
+        if cursor:
+            await cursor.close()
+        if conn:
+            await release_db_connection(conn)
+
+# --- Check-in / check-out (máy chấm công) ---
+# At shift start hundreds of staff clock in within minutes. Requests only
+# queue their event; one writer task per worker takes everything queued
+# (up to ATTENDANCE_BATCH_MAX, waiting at most ATTENDANCE_BATCH_WAIT_MS for
+# more) and writes it in a single transaction with set-based statements, so
+# a rush costs one commit per batch instead of one per staff member.
+# 'Trễ' is decided in memory from today's roster (today_roster), reloaded
+# when today's lich_lam_viec rows or the cau_hinh_ca version change (see
+# build_data_etag) or, without migrate_data_versions.sql, every
+# ROSTER_INDEX_TTL_SECONDS.
+# Needs uq_cham_cong_nhan_vien_ngay from migrate_attendance_import.sql.
+ATTENDANCE_BATCH_MAX = int(os.getenv("ATTENDANCE_BATCH_MAX", "200"))
+ATTENDANCE_BATCH_WAIT_MS = float(os.getenv("ATTENDANCE_BATCH_WAIT_MS", "2"))
+ATTENDANCE_QUEUE_MAX = int(os.getenv("ATTENDANCE_QUEUE_MAX", "10000"))
+ROSTER_INDEX_TABLES = ("cau_hinh_ca", "lich_lam_viec")
+ROSTER_INDEX_TTL_SECONDS = float(os.getenv("ROSTER_INDEX_TTL_SECONDS", "60"))
+
+ATTENDANCE_BATCH_SIZE = Histogram(
+    "attendance_write_batch_size", "Check-in/check-out events written per transaction",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 200, 500)
+)
+METRICS.append(ATTENDANCE_BATCH_SIZE)
+
+class TodayRoster:
+    """Shift start (minutes after midnight) per staff member for one day"""
+    def __init__(self):
+        self.day: Optional[date] = None
+        self.version: Optional[str] = None
+        self.loaded_at = 0.0
+        self.starts: Dict[int, int] = {}
+
+today_roster = TodayRoster()
+attendance_write_queue: Optional[asyncio.Queue] = None
+attendance_writer_task: Optional[asyncio.Task] = None
+
+async def refresh_today_roster(conn, today: date):
+    """Reload today_roster if the day or the roster data changed (run before any write)"""
+    version = await build_data_etag(conn, "today_roster", ROSTER_INDEX_TABLES, (today.isoformat(),))
+    if today_roster.day == today:
+        if version is not None and version == today_roster.version:
+            return
+        if version is None and time.monotonic() - today_roster.loaded_at < ROSTER_INDEX_TTL_SECONDS:
+            return
+    cursor = conn.cursor()
+    try:
+        # One shift per staff per day (assign_shift rule); MIN() guards older data
+        await cursor.execute("""
+            SELECT l.nhan_vien_id,
+                   MIN(EXTRACT(HOUR FROM ca.gio_bat_dau) * 60 + EXTRACT(MINUTE FROM ca.gio_bat_dau))::int
+            FROM lich_lam_viec l
+            JOIN cau_hinh_ca ca ON ca.id = l.ca_lam_id
+            WHERE l.ngay_lam = %s
+            GROUP BY l.nhan_vien_id
+        """, (today,))
+        today_roster.starts = {row[0]: row[1] for row in await cursor.fetchall()}
+    finally:
+        await cursor.close()
+    today_roster.day = today
+    today_roster.version = version
+    today_roster.loaded_at = time.monotonic()
+    logger.debug("today roster loaded: %s staff on %s", len(today_roster.starts), today)
+
+def checkin_status(clock_time: str, shift_start: Optional[int]) -> str:
+    """Python twin of LATE_CHECKIN_SQL; no rostered shift counts as on time"""
+    if shift_start is None:
+        return 'Đúng giờ'
+    hours, minutes = clock_time.split(":")
+    late_by = (int(hours) * 60 + int(minutes) - shift_start) % 1440
+    return 'Trễ' if ATTENDANCE_LATE_GRACE_MINUTES < late_by <= 720 else 'Đúng giờ'
+
+def fail_clock_events(batch, error: HTTPException):
+    for *_, future in batch:
+        if not future.done():
+            future.set_exception(error)
+
+async def write_attendance_batch(batch):
+    """
+    Write one batch of (kind, staff_id, clock_time, future) events in one
+    transaction and resolve each future with its result or HTTPException.
+    A second event of the same kind for a staff member in one batch gets the
+    same 409 it would get in the next batch.
+    """
+    today = date.today()
+    check_ins: Dict[int, tuple] = {}
+    check_outs: Dict[int, tuple] = {}
+    results = {}
+    for kind, staff_id, clock_time, future in batch:
+        if future.done():
+            continue  # client gave up while queued
+        events = check_ins if kind == "in" else check_outs
+        if staff_id in events:
+            results[future] = HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Staff already checked in today" if kind == "in" else "No open check-in to close"
+            )
+            continue
+        events[staff_id] = (clock_time, future)
+    if not check_ins and not check_outs:
+        return
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    cursor = None
+    try:
+        await refresh_today_roster(conn, today)
+        cursor = conn.cursor()
+        
+        if check_ins:
+            await cursor.execute("SELECT id FROM nhan_vien WHERE id = ANY(%s::int[])", (list(check_ins),))
+            known = {row[0] for row in await cursor.fetchall()}
+            rows = []
+            for staff_id, (clock_time, future) in check_ins.items():
+                if staff_id not in known:
+                    results[future] = HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Staff not found")
+                    continue
+                shift_start = today_roster.starts.get(staff_id)
+                rows.append((staff_id, clock_time, checkin_status(clock_time, shift_start), shift_start))
+            
+            if rows:
+                await cursor.execute("""
+                    INSERT INTO cham_cong (nhan_vien_id, ngay, gio_vao, trang_thai_checkin)
+                    SELECT r.nhan_vien_id, %s, r.gio_vao, r.trang_thai_checkin
+                    FROM unnest(%s::int[], %s::text[], %s::text[]) AS r(nhan_vien_id, gio_vao, trang_thai_checkin)
+                    ON CONFLICT (nhan_vien_id, ngay) DO NOTHING
+                    RETURNING id, nhan_vien_id
+                """, (today, [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]))
+                new_ids = {row[1]: row[0] for row in await cursor.fetchall()}
+                for staff_id, clock_time, checkin_state, shift_start in rows:
+                    future = check_ins[staff_id][1]
+                    if staff_id not in new_ids:
+                        results[future] = HTTPException(
+                            status_code=status.HTTP_409_CONFLICT,
+                            detail="Staff already checked in today"
+                        )
+                        continue
+                    results[future] = {
+                        "id": new_ids[staff_id],
+                        "staffId": staff_id,
+                        "date": today.isoformat(),
+                        "checkIn": clock_time,
+                        "status": checkin_state,
+                        "isLate": checkin_state == 'Trễ',
+                        "shiftStart": f"{shift_start // 60:02d}:{shift_start % 60:02d}" if shift_start is not None else None
+                    }
+        
+        if check_outs:
+            # Today's open row, or yesterday's for an overnight shift (Ca Tối 18:00-02:00)
+            staff_ids = list(check_outs)
+            await cursor.execute("""
+                WITH req AS (
+                    SELECT * FROM unnest(%(staff)s::int[], %(times)s::text[]) AS r(nhan_vien_id, gio_ra)
+                ), target AS (
+                    SELECT DISTINCT ON (c.nhan_vien_id) c.id, req.gio_ra
+                    FROM cham_cong c
+                    JOIN req ON req.nhan_vien_id = c.nhan_vien_id
+                    WHERE c.ngay >= %(yesterday)s AND c.ngay <= %(today)s
+                      AND c.gio_ra IS NULL
+                      AND (c.ngay = %(today)s OR req.gio_ra < c.gio_vao)
+                    ORDER BY c.nhan_vien_id, c.ngay DESC
+                )
+                UPDATE cham_cong c SET gio_ra = target.gio_ra
+                FROM target
+                WHERE c.id = target.id
+                RETURNING c.id, c.nhan_vien_id, c.ngay, c.gio_vao, c.gio_ra, c.trang_thai_checkin
+            """, {
+                "staff": staff_ids,
+                "times": [check_outs[staff_id][0] for staff_id in staff_ids],
+                "today": today,
+                "yesterday": today - timedelta(days=1),
+            })
+            closed = {row[1]: row for row in await cursor.fetchall()}
+            for staff_id, (clock_time, future) in check_outs.items():
+                row = closed.get(staff_id)
+                if row is None:
+                    results[future] = HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="No open check-in to close"
+                    )
+                    continue
+                results[future] = {
+                    "id": row[0],
+                    "staffId": staff_id,
+                    "date": row[2].isoformat(),
+                    "checkIn": row[3],
+                    "checkOut": row[4],
+                    "hours": calculate_work_hours(row[3], row[4]),
+                    "status": row[5]
+                }
         
-    except (ValueError, AttributeError, TypeError) as e:
-        # Log error for debugging but don't crash the API
-        print(f"[ERROR] Failed to parse time: check_in={check_in}, check_out={check_out}, error={e}")
-        return 0
+        await conn.commit()
+    except Exception:
+        await conn.rollback()
+        raise
+    finally:
+        if cursor:
+            await cursor.close()
+        await release_db_connection(conn)
+    
+    ATTENDANCE_BATCH_SIZE.observe((), len(results))
+    for future, result in results.items():
+        if future.done():
+            continue
+        if isinstance(result, HTTPException):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+async def attendance_writer():
+    """Background task: group queued clock events into batches and write them"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await attendance_write_queue.get()]
+        deadline = loop.time() + ATTENDANCE_BATCH_WAIT_MS / 1000
+        while len(batch) < ATTENDANCE_BATCH_MAX:
+            if not attendance_write_queue.empty():
+                batch.append(attendance_write_queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(attendance_write_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await write_attendance_batch(batch)
+        except asyncio.CancelledError:
+            fail_clock_events(batch, HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is shutting down"
+            ))
+            raise
+        except HTTPException as e:
+            fail_clock_events(batch, e)
+        except Exception as e:
+            logger.exception("attendance batch failed", extra={"size": len(batch)})
+            fail_clock_events(batch, HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error recording attendance: {str(e)}"
+            ))
+
+@app.on_event("startup")
+async def start_attendance_writer():
+    global attendance_write_queue, attendance_writer_task
+    attendance_write_queue = asyncio.Queue(maxsize=ATTENDANCE_QUEUE_MAX)
+    attendance_writer_task = asyncio.create_task(attendance_writer())
+
+@app.on_event("shutdown")
+async def stop_attendance_writer():
+    global attendance_writer_task
+    if attendance_writer_task is not None:
+        attendance_writer_task.cancel()
+        try:
+            await attendance_writer_task
+        except asyncio.CancelledError:
+            pass
+        attendance_writer_task = None
+    pending = []
+    while attendance_write_queue is not None and not attendance_write_queue.empty():
+        pending.append(attendance_write_queue.get_nowait())
+    fail_clock_events(pending, HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is shutting down"
+    ))
+
+async def submit_clock_event(kind: str, event: ClockEvent) -> dict:
+    """Queue one check-in/check-out and wait for the batch that writes it"""
+    if event.time:
+        try:
+            clock_time = parse_clock_time(event.time, "time")
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    else:
+        clock_time = datetime.now().strftime("%H:%M")
+    
+    if attendance_write_queue is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Attendance writer is not running"
+        )
+    future = asyncio.get_running_loop().create_future()
+    try:
+        attendance_write_queue.put_nowait((kind, event.staffId, clock_time, future))
+    except asyncio.QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many pending check-ins, please retry"
+        )
+    return await future
+
+@app.post("/api/attendance/check-in", status_code=status.HTTP_201_CREATED)
+async def check_in(event: ClockEvent):
+    """
+    Record a check-in for today (time: "HH:MM" from the time clock, default now).
+    trang_thai_checkin is 'Trễ' when the check-in is more than
+    ATTENDANCE_LATE_GRACE_MINUTES after the start of the staff member's
+    rostered shift today. 409 if the staff member already checked in today.
+    """
+    data = await submit_clock_event("in", event)
+    return {
+        "success": True,
+        "message": "Check-in muộn" if data["isLate"] else "Check-in thành công",
+        "data": data
+    }
+
+@app.post("/api/attendance/check-out", status_code=status.HTTP_200_OK)
+async def check_out(event: ClockEvent):
+    """
+    Close the staff member's open attendance row: today's, or yesterday's when
+    an overnight shift ends after midnight. 409 if there is nothing to close.
+    """
+    data = await submit_clock_event("out", event)
+    return {
+        "success": True,
+        "message": "Check-out thành công",
+        "data": data
+    }
+
+def timesheet_date_filter(start_date: Optional[str], end_date: Optional[str]):
+    """Half-open ngay conditions (without alias) and their params"""
+    conditions, params = [], []
+    if start_date:
+        conditions.append("ngay >= %s")
+        params.append(parse_iso_date(start_date, "start_date"))
+    if end_date:
+        conditions.append("ngay < %s")
+        params.append(parse_iso_date(end_date, "end_date") + timedelta(days=1))
+    return conditions, params
+
+def build_timesheet_query(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    branch_id: Optional[int] = None,
+    search: Optional[str] = None
+):
+    """
+    Staff × attendance rows ordered by nhan_vien_id, so one staff member's
+    rows are always contiguous. Returns (query, params).
+    Column order is relied on by new_timesheet_entry / add_timesheet_attendance.
+    """
+    # Date range as a half-open interval on the join, so the (nhan_vien_id, ngay) index is used
+    attendance_filter, params = timesheet_date_filter(start_date, end_date)
+    attendance_filter = "".join(" AND c." + condition for condition in attendance_filter)
+    
+    # Build base query with all JOINs first
+    query = f"""
+        SELECT 
+            nv.id as "staffId",
+            nv.ho_ten as "staffName",
+            nv.avatar,
+            nv.chuc_vu as "role",
+            COALESCE(cn.ten_chi_nhanh, 'Chưa phân bổ') as "branchName",
+            TO_CHAR(c.ngay, 'YYYY-MM-DD') as date,
+            c.gio_vao as "checkIn",
+            c.gio_ra as "checkOut",
+            c.trang_thai_checkin as "status"
+        FROM nhan_vien nv
+        LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
+        LEFT JOIN cham_cong c ON nv.id = c.nhan_vien_id{attendance_filter}
+        WHERE 1=1
+    """
+    
+    # Add staff filters
+    if search:
+        condition, search_params = staff_search_condition(search, branch_id=branch_id)
+        query += " AND " + condition
+        params.extend(search_params)
+    elif branch_id:
+        query += " AND nv.chi_nhanh_id = %s"
+        params.append(branch_id)
+    
+    query += " ORDER BY nv.id ASC, c.ngay ASC"
+    return query, tuple(params)
+
+# Rows of build_timesheet_query are plain tuples:
+# (staffId, staffName, avatar, role, branchName, date, checkIn, checkOut, status)
+def new_timesheet_entry(row) -> dict:
+    return {
+        'staffId': row[0],
+        'staffName': row[1],
+        'avatar': row[2],
+        'role': row[3],
+        'branchName': row[4],
+        'totalHours': 0,
+        'attendance': {}
+    }
+
+def add_timesheet_attendance(entry: dict, row):
+    """Add one cham_cong row (if any) to a staff member's timesheet entry"""
+    day, check_in, check_out, checkin_status = row[5:9]
+    if not (day and check_in and check_out):
+        return
+    try:
+        # Calculate hours worked (safe parsing inside calculate_work_hours)
+        hours = calculate_work_hours(check_in, check_out)
+        
+        entry['attendance'][day] = {
+            'in': check_in,
+            'out': check_out,
+            'hours': hours,
+            'status': checkin_status
+        }
+        
+        entry['totalHours'] += hours
+    except Exception as e:
+        # Log error but continue processing other rows
+        logger.warning("failed to process attendance for staff %s on %s: %s", entry['staffId'], day, e)
+
+def finish_timesheet_entry(entry: dict) -> dict:
+    entry['totalHours'] = round(entry['totalHours'], 1)
+    return entry
+
+@app.get("/api/timesheet", response_model=List[TimesheetEntry])
+async def get_timesheet(
+    response: Response,
+    start_date: Optional[str] = None, 
+    end_date: Optional[str] = None,
+    branch_id: Optional[int] = None,
+    search: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Get timesheet data for staff with attendance records
+    Returns matrix-friendly structure for Frontend rendering
+    (use /api/timesheet/stream for long, all-branch date ranges)
+    Conditional GET: ETag / If-None-Match -> 304.
+    """
+    query, params = build_timesheet_query(start_date, end_date, branch_id, search)
+    
+    conn = await get_db_connection()
+    if not conn: return []
+    cursor = conn.cursor()
+    try:
+        etag = await build_data_etag(conn, "timesheet", TIMESHEET_DATA_TABLES, params)
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(etag)
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    set_etag(response, etag)
+    
+    # Transform data into matrix-friendly structure
+    staff_dict = {}
+    
+    for row in rows:
+        staff_id = row[0]
+        if staff_id not in staff_dict:
+            staff_dict[staff_id] = new_timesheet_entry(row)
+        add_timesheet_attendance(staff_dict[staff_id], row)
+    
+    # Convert dict to list and round total hours
+    return fast_json_response(
+        [finish_timesheet_entry(staff_data) for staff_data in staff_dict.values()],
+        response
+    )
+
+# Rows fetched per round trip by the server-side cursor of /api/timesheet/stream
+TIMESHEET_STREAM_CHUNK = int(os.getenv("TIMESHEET_STREAM_CHUNK", "2000"))
+TIMESHEET_CSV_COLUMNS = ['staffId', 'staffName', 'role', 'branchName', 'date', 'checkIn', 'checkOut', 'hours', 'status']
+
+def timesheet_csv_lines(entry: dict) -> str:
+    """One CSV line per attendance day (a single line with empty day columns if none)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    base = [entry['staffId'], csv_cell(entry['staffName']), csv_cell(entry['role']), csv_cell(entry['branchName'])]
+    if not entry['attendance']:
+        writer.writerow(base + ['', '', '', '', ''])
+    for day, record in entry['attendance'].items():
+        writer.writerow(base + [day, record['in'], record['out'], record['hours'], record['status']])
+    return buffer.getvalue()
+
+@app.get("/api/timesheet/stream")
+async def stream_timesheet(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    branch_id: Optional[int] = None,
+    search: Optional[str] = None,
+    format: str = "ndjson"
+):
+    """
+    Streaming variant of /api/timesheet for large date ranges.
+    Reads through a server-side cursor in chunks and emits one staff record
+    at a time, so memory stays bounded regardless of the range.
+    
+    Query Parameters:
+    - format: "ndjson" (one JSON timesheet entry per line) or "csv" (one line per staff/day)
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="format must be 'ndjson' or 'csv'"
+        )
+    query, params = build_timesheet_query(start_date, end_date, branch_id, search)
+    require_db_pool()
+    
+    def render(entry: dict) -> str:
+        entry = finish_timesheet_entry(entry)
+        if format == "csv":
+            return timesheet_csv_lines(entry)
+        return dump_json(entry).decode("utf-8") + "\n"
+    
+    async def generate():
+        if format == "csv":
+            yield ",".join(TIMESHEET_CSV_COLUMNS) + "\n"
+        # Named cursor = server-side cursor, rows arrive TIMESHEET_STREAM_CHUNK at a time
+        async with streaming_db_connection() as conn, conn.cursor(name="timesheet_stream") as cursor:
+            cursor.itersize = TIMESHEET_STREAM_CHUNK
+            await cursor.execute(query, params)
+            entry = None
+            async for row in cursor:
+                if entry is None or entry['staffId'] != row[0]:
+                    if entry is not None:
+                        yield render(entry)
+                    entry = new_timesheet_entry(row)
+                add_timesheet_attendance(entry, row)
+            if entry is not None:
+                yield render(entry)
+    
+    if format == "csv":
+        return StreamingResponse(
+            generate(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="timesheet.csv"'}
+        )
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
 # ==========================================
 # 5. API QUẢN LÝ LƯƠNG (Payroll Management)
@@ -1472,14 +4012,15 @@ def calculate_work_hours(check_in: str, check_out: str) -> float:
 
 # 5.1 API Payroll Configuration
 @app.get("/api/payroll-config")
-def get_payroll_config():
+async def get_payroll_config(response: Response, if_none_match: Optional[str] = Header(None)):
     """
     Get salary configurations for all staff
     Returns staff info with their salary type and amount
+    Conditional GET: ETag / If-None-Match -> 304.
     """
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor = conn.cursor(row_factory=dict_row)
     
     query = """
         SELECT nv.id as "staffId",
@@ -1493,10 +4034,16 @@ def get_payroll_config():
         LEFT JOIN cau_hinh_luong cl ON nv.id = cl.nhan_vien_id
         ORDER BY nv.id ASC
     """
-    cursor.execute(query)
-    data = cursor.fetchall()
-    conn.close()
-    return data
+    try:
+        etag = await build_data_etag(conn, "payroll-config", PAYROLL_CONFIG_DATA_TABLES, ())
+        if etag_matches(if_none_match, etag):
+            return not_modified_response(etag)
+        await cursor.execute(query)
+        rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    set_etag(response, etag)
+    return rows
 
 @app.post("/api/payroll-config", status_code=status.HTTP_201_CREATED)
 async def create_or_update_payroll_config(config: PayrollConfigCreate):
@@ -1504,14 +4051,9 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
     Create or update salary configuration for a staff member
     If config exists, UPDATE. If not, INSERT.
     """
-    print("=" * 70)
-    print("[PAYROLL CONFIG] Received payload:")
-    print(f"  staffId: {config.staffId}")
-    print(f"  type: {config.type}")
-    print(f"  amount: {config.amount}")
-    print("=" * 70)
+    logger.debug("payroll config payload", extra={"payload": config})
     
-    conn = get_db_connection()
+    conn = await get_db_connection()
     if not conn:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1520,11 +4062,11 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
     
     cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(row_factory=dict_row)
         
         # Validate staff exists
-        cursor.execute("SELECT id, ho_ten FROM nhan_vien WHERE id = %s", (config.staffId,))
-        staff = cursor.fetchone()
+        await cursor.execute("SELECT id, ho_ten FROM nhan_vien WHERE id = %s", (config.staffId,))
+        staff = await cursor.fetchone()
         if not staff:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -1545,11 +4087,11 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
             )
         
         # Check if config exists
-        cursor.execute(
+        await cursor.execute(
             "SELECT id FROM cau_hinh_luong WHERE nhan_vien_id = %s",
             (config.staffId,)
         )
-        existing = cursor.fetchone()
+        existing = await cursor.fetchone()
         
         if existing:
             # UPDATE existing config
@@ -1558,7 +4100,7 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
                 SET loai_luong = %s, muc_luong = %s
                 WHERE nhan_vien_id = %s
             """
-            cursor.execute(update_sql, (config.type, config.amount, config.staffId))
+            await cursor.execute(update_sql, (config.type, config.amount, config.staffId))
             message = "Cập nhật cấu hình lương thành công"
         else:
             # INSERT new config
@@ -1566,12 +4108,11 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
                 INSERT INTO cau_hinh_luong (nhan_vien_id, loai_luong, muc_luong)
                 VALUES (%s, %s, %s)
             """
-            cursor.execute(insert_sql, (config.staffId, config.type, config.amount))
+            await cursor.execute(insert_sql, (config.staffId, config.type, config.amount))
             message = "Thêm cấu hình lương thành công"
         
-        conn.commit()
-        print(f"[SUCCESS] {message}")
-        print("=" * 70)
+        await conn.commit()
+        logger.info("payroll config saved", extra={"staffId": config.staffId, "salaryType": config.type})
         
         return {
             "success": True,
@@ -1586,27 +4127,173 @@ async def create_or_update_payroll_config(config: PayrollConfigCreate):
         
     except HTTPException:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         raise
     except Exception as e:
         if conn:
-            conn.rollback()
+            await conn.rollback()
         error_msg = f"Error saving payroll config: {str(e)}"
-        print(f"[ERROR] {error_msg}")
+        logger.exception(error_msg)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=error_msg
         )
     finally:
         if cursor:
-            cursor.close()
+            await cursor.close()
         if conn:
-            conn.close()
-        print("[CLEANUP] Database connection closed\n")
+            await release_db_connection(conn)
 
 # 5.2 API Payroll Sheet (Salary Calculation)
+SALARY_TYPE_LABELS = {
+    'THEO_GIO': 'Theo giờ',
+    'THEO_THANG': 'Theo tháng',
+}
+
+def calculate_final_salary(salary_type: Optional[str], base_amount, total_hours: float) -> float:
+    """
+    Payroll business rules:
+    - THEO_GIO (Hourly): salary = total_hours * hourly_rate
+    - THEO_THANG (Monthly): salary = fixed_amount (independent of hours)
+    - No config: salary = 0
+    """
+    if salary_type == 'THEO_GIO':
+        return total_hours * float(base_amount or 0)
+    elif salary_type == 'THEO_THANG':
+        return float(base_amount or 0)
+    return 0
+
+def build_payroll_row(row) -> dict:
+    """
+    Turn one payroll query row into the payroll sheet response item
+    (snapshot rows carry their stored finalSalary, live rows are calculated)
+    """
+    salary_type = row['salaryType']
+    base_amount = row['baseAmount'] or 0
+    total_hours = float(row['totalHours'] or 0)
+    return {
+        'id': row['staffId'],
+        'name': row['staffName'],
+        'role': row['role'],
+        'branchName': row['branchName'],
+        'salaryType': SALARY_TYPE_LABELS.get(salary_type, 'Chưa cấu hình'),
+        'baseAmount': base_amount,
+        'totalHours': round(total_hours, 1),
+        'finalSalary': (
+            round(float(row['finalSalary']), 0) if row.get('finalSalary') is not None
+            else round(calculate_final_salary(salary_type, base_amount, total_hours), 0)
+        )
+    }
+
+def build_payroll_sheet_query(month: int, year: int, branch_id: Optional[int] = None, search: Optional[str] = None):
+    """
+    One set-based query for the whole sheet: attendance hours are summed per
+    nhan_vien_id in a single pass over cham_cong and joined to cau_hinh_luong.
+    Returns (query, params).
+    """
+    query = f"""
+        WITH gio_cong AS (
+            SELECT c.nhan_vien_id, SUM({WORK_HOURS_SQL}) as total_hours
+            FROM cham_cong c
+            WHERE c.ngay >= %s
+              AND c.ngay < %s
+              AND c.gio_vao IS NOT NULL
+              AND c.gio_ra IS NOT NULL
+            GROUP BY c.nhan_vien_id
+        )
+        SELECT nv.id as "staffId",
+               nv.ho_ten as "staffName",
+               nv.chuc_vu as "role",
+               COALESCE(cn.ten_chi_nhanh, 'Chưa phân bổ') as "branchName",
+               cl.loai_luong as "salaryType",
+               cl.muc_luong as "baseAmount",
+               COALESCE(gc.total_hours, 0) as "totalHours",
+               nv.chi_nhanh_id as "branchId"
+        FROM nhan_vien nv
+        LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
+        LEFT JOIN cau_hinh_luong cl ON nv.id = cl.nhan_vien_id
+        LEFT JOIN gio_cong gc ON nv.id = gc.nhan_vien_id
+        WHERE 1=1
+    """
+    params = list(month_date_range(month, year))
+    
+    if search:
+        condition, search_params = staff_search_condition(search, branch_id=branch_id)
+        query += " AND " + condition
+        params.extend(search_params)
+    elif branch_id:
+        query += " AND nv.chi_nhanh_id = %s"
+        params.append(branch_id)
+    
+    query += " ORDER BY nv.id ASC"
+    return query, tuple(params)
+
+def build_payroll_snapshot_query(month: int, year: int, branch_id: Optional[int] = None, search: Optional[str] = None):
+    """
+    Read a closed month from bang_luong_chot (primary key lookup on nam, thang).
+    Column aliases match build_payroll_sheet_query, plus the stored finalSalary.
+    Returns (query, params).
+    """
+    query = """
+        SELECT nhan_vien_id as "staffId",
+               ho_ten as "staffName",
+               chuc_vu as "role",
+               ten_chi_nhanh as "branchName",
+               loai_luong as "salaryType",
+               muc_luong as "baseAmount",
+               tong_gio as "totalHours",
+               luong_thuc_nhan as "finalSalary"
+        FROM bang_luong_chot
+        WHERE nam = %s AND thang = %s
+    """
+    params = [year, month]
+    
+    if search:
+        # Same matching and STAFF_SEARCH_LIMIT as the live sheet, but on the name stored
+        # at close time (renamed or deleted staff are still found by their paid name)
+        predicate, predicate_params, score_sql, score_params = staff_search_match(
+            search, "s.ho_ten", "nv.so_dien_thoai"
+        )
+        branch_filter = " AND s.chi_nhanh_id = %s" if branch_id else ""
+        query += f"""
+            AND nhan_vien_id IN (
+                SELECT s.nhan_vien_id FROM bang_luong_chot s
+                LEFT JOIN nhan_vien nv ON nv.id = s.nhan_vien_id
+                WHERE s.nam = %s AND s.thang = %s
+                  AND {predicate}{branch_filter}
+                ORDER BY {score_sql} DESC, s.nhan_vien_id ASC
+                LIMIT %s
+            )
+        """
+        params.extend([year, month] + predicate_params + ([branch_id] if branch_id else []) + score_params + [STAFF_SEARCH_LIMIT])
+    elif branch_id:
+        query += " AND chi_nhanh_id = %s"
+        params.append(branch_id)
+    
+    query += " ORDER BY nhan_vien_id ASC"
+    return query, tuple(params)
+
+async def is_payroll_period_closed(conn, month: int, year: int) -> bool:
+    """
+    True if the month was closed (read it from bang_luong_chot).
+    False when migrate_payroll_snapshot.sql is not installed: every month is live.
+    """
+    cursor = conn.cursor()
+    try:
+        await cursor.execute(
+            "SELECT 1 FROM ky_luong WHERE nam = %s AND thang = %s",
+            (year, month)
+        )
+        return await cursor.fetchone() is not None
+    except psycopg.errors.UndefinedTable:
+        await conn.rollback()
+        return False
+    finally:
+        await cursor.close()
+
 @app.get("/api/payroll-sheet")
-def get_payroll_sheet(
+async def get_payroll_sheet(
+    response: Response,
     month: Optional[int] = None,
     year: Optional[int] = None,
     branch_id: Optional[int] = None,
@@ -1614,115 +4301,357 @@ def get_payroll_sheet(
 ):
     """
     Calculate monthly payroll for staff based on attendance data
-    
-    Business Rules:
-    - THEO_GIO (Hourly): salary = total_hours * hourly_rate
-    - THEO_THANG (Monthly): salary = fixed_amount (independent of hours)
-    - No config: salary = 0
+    (rules in calculate_final_salary, hours aggregated in one query).
+    Closed months are read from the bang_luong_chot snapshot instead;
+    the X-Payroll-Period header says which one was used ("closed" / "open").
     
     Query Parameters:
     - month: Month (1-12), default current month
     - year: Year (YYYY), default current year
     - branch_id: Filter by branch
-    - search: Search by staff name
+    - search: Search by staff name or phone (accent-insensitive)
     """
-    conn = get_db_connection()
-    if not conn: return []
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
     # Default to current month/year if not provided
     if not month or not year:
-        from datetime import datetime
         today = datetime.now()
         month = month or today.month
         year = year or today.year
     
-    print(f"[PAYROLL SHEET] Calculating for month={month}, year={year}")
+    live_query, live_params = build_payroll_sheet_query(month, year, branch_id, search)
     
-    # Build base query
-    query = """
-        SELECT nv.id as "staffId",
-               nv.ho_ten as "staffName",
-               nv.chuc_vu as "role",
-               COALESCE(cn.ten_chi_nhanh, 'Chưa phân bổ') as "branchName",
-               cl.loai_luong as "salaryType",
-               cl.muc_luong as "baseAmount"
-        FROM nhan_vien nv
-        LEFT JOIN chi_nhanh cn ON nv.chi_nhanh_id = cn.id
-        LEFT JOIN cau_hinh_luong cl ON nv.id = cl.nhan_vien_id
-        WHERE 1=1
+    conn = await get_db_connection()
+    if not conn: return []
+    cursor = conn.cursor(row_factory=dict_row)
+    try:
+        is_closed = await is_payroll_period_closed(conn, month, year)
+        
+        if is_closed:
+            query, params = build_payroll_snapshot_query(month, year, branch_id, search)
+        else:
+            query, params = live_query, live_params
+        
+        logger.debug("payroll sheet %s for %02d/%s", "snapshot" if is_closed else "live", month, year)
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    
+    response.headers["X-Payroll-Period"] = "closed" if is_closed else "open"
+    result = [build_payroll_row(row) for row in rows]
+    logger.debug("payroll sheet returned %s staff members", len(result))
+    return result
+
+PAYROLL_EXPORT_COLUMNS = ['id', 'name', 'role', 'branchName', 'salaryType', 'baseAmount', 'totalHours', 'finalSalary']
+
+@app.get("/api/payroll-sheet/export")
+async def export_payroll_sheet(
+    month: Optional[int] = None,
+    year: Optional[int] = None,
+    branch_id: Optional[int] = None,
+    search: Optional[str] = None,
+    format: str = "csv"
+):
     """
+    Download the payroll sheet as CSV or XLSX (same rows and rules as
+    /api/payroll-sheet, all branches unless branch_id is given).
+    Rows are read through a server-side cursor and converted with
+    build_payroll_row as they arrive, so memory stays flat for any staff count.
     
-    params = []
+    Query Parameters:
+    - month / year: default current month
+    - branch_id / search: same filters as /api/payroll-sheet
+    - format: "csv" or "xlsx"
+    """
+    format = file_format(format)
+    if not month or not year:
+        today = datetime.now()
+        month = month or today.month
+        year = year or today.year
     
-    # Add filters
-    if search:
-        query += " AND nv.ho_ten ILIKE %s"
-        params.append(f"%{search}%")
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    try:
+        is_closed = await is_payroll_period_closed(conn, month, year)
+    finally:
+        await release_db_connection(conn)
     
-    if branch_id:
-        query += " AND nv.chi_nhanh_id = %s"
-        params.append(branch_id)
+    if is_closed:
+        query, params = build_payroll_snapshot_query(month, year, branch_id, search)
+    else:
+        query, params = build_payroll_sheet_query(month, year, branch_id, search)
     
-    query += " ORDER BY nv.id ASC"
+    def convert(row) -> list:
+        item = build_payroll_row(row)
+        return [item[column] for column in PAYROLL_EXPORT_COLUMNS]
     
-    cursor.execute(query, tuple(params))
-    staff_rows = cursor.fetchall()
-    
-    # Calculate total hours and final salary for each staff
-    result = []
-    
-    for staff in staff_rows:
-        staff_id = staff['staffId']
-        salary_type = staff['salaryType']
-        base_amount = staff['baseAmount'] or 0
-        
-        # Get attendance records for this month
-        attendance_query = """
-            SELECT gio_vao as "checkIn", gio_ra as "checkOut"
-            FROM cham_cong
-            WHERE nhan_vien_id = %s
-              AND EXTRACT(MONTH FROM ngay) = %s
-              AND EXTRACT(YEAR FROM ngay) = %s
-              AND gio_vao IS NOT NULL
-              AND gio_ra IS NOT NULL
-        """
+    return await export_rows_response(
+        query, params, PAYROLL_EXPORT_COLUMNS, format, f"bang_luong_{year}_{month:02d}",
+        row_factory=dict_row, convert=convert,
+        headers={"X-Payroll-Period": "closed" if is_closed else "open"}
+    )
+
+# 5.3 API Payroll Periods (Chốt kỳ lương)
+@app.get("/api/payroll-periods")
+async def get_payroll_periods():
+    """
+    List closed payroll months, newest first
+    """
+    conn = await get_db_connection()
+    if not conn: return []
+    cursor = conn.cursor(row_factory=dict_row)
+    
+    query = """
+        SELECT thang as "month", nam as "year",
+               so_nhan_vien as "staffCount",
+               tong_luong as "totalSalary",
+               TO_CHAR(chot_luc, 'YYYY-MM-DD HH24:MI') as "closedAt"
+        FROM ky_luong
+        ORDER BY nam DESC, thang DESC
+    """
+    try:
+        await cursor.execute(query)
+        return await cursor.fetchall()
+    except psycopg.errors.UndefinedTable:
+        # migrate_payroll_snapshot.sql not installed: nothing has been closed
+        return []
+    finally:
+        await release_db_connection(conn)
+
+@app.post("/api/payroll-periods/close", status_code=status.HTTP_201_CREATED)
+async def close_payroll_period(period: PayrollPeriodClose):
+    """
+    Close a payroll month: materialize every staff member's totals
+    (hours, salary type, rate, final salary) into bang_luong_chot.
+    
+    Logic Flow:
+    1. Validate month/year, refuse months that are not over yet
+    2. Compute the sheet for all staff with build_payroll_sheet_query
+    3. INSERT ky_luong (fails with 409 if the month is already closed)
+    4. INSERT snapshot rows, COMMIT (both steps must succeed)
+    """
+    _, end = month_date_range(period.month, period.year)
+    if end > date.today():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot close a payroll month before it has ended"
+        )
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    
+    cursor = None
+    try:
+        cursor = conn.cursor(row_factory=dict_row)
         
-        cursor.execute(attendance_query, (staff_id, month, year))
-        attendance_records = cursor.fetchall()
+        # Serialize concurrent close requests for the same month
+        await cursor.execute("SELECT pg_advisory_xact_lock(%s)", (period.year * 100 + period.month,))
         
-        # Calculate total hours
-        total_hours = 0
-        for record in attendance_records:
-            hours = calculate_work_hours(record['checkIn'], record['checkOut'])
-            total_hours += hours
+        await cursor.execute(
+            "SELECT 1 FROM ky_luong WHERE nam = %s AND thang = %s",
+            (period.year, period.month)
+        )
+        if await cursor.fetchone():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Payroll {period.month:02d}/{period.year} is already closed"
+            )
         
-        # Calculate final salary based on type
-        if salary_type == 'THEO_GIO':
-            final_salary = total_hours * base_amount
-        elif salary_type == 'THEO_THANG':
-            final_salary = base_amount
-        else:
-            # No salary config
-            final_salary = 0
-        
-        result.append({
-            'id': staff_id,
-            'name': staff['staffName'],
-            'role': staff['role'],
-            'branchName': staff['branchName'],
-            'salaryType': 'Theo giờ' if salary_type == 'THEO_GIO' else ('Theo tháng' if salary_type == 'THEO_THANG' else 'Chưa cấu hình'),
-            'baseAmount': base_amount,
-            'totalHours': round(total_hours, 1),
-            'finalSalary': round(final_salary, 0)
-        })
+        query, params = build_payroll_sheet_query(period.month, period.year)
+        await cursor.execute(query, params)
+        rows = await cursor.fetchall()
+        
+        snapshot_rows = []
+        total_salary = 0
+        for row in rows:
+            item = build_payroll_row(row)
+            total_salary += item['finalSalary']
+            snapshot_rows.append((
+                period.year, period.month, item['id'], item['name'], item['role'],
+                row['branchId'], item['branchName'], row['salaryType'],
+                item['baseAmount'], item['totalHours'], item['finalSalary']
+            ))
+        
+        await cursor.execute("""
+            INSERT INTO ky_luong (nam, thang, so_nhan_vien, tong_luong)
+            VALUES (%s, %s, %s, %s)
+        """, (period.year, period.month, len(snapshot_rows), total_salary))
+        
+        await cursor.executemany("""
+            INSERT INTO bang_luong_chot (nam, thang, nhan_vien_id, ho_ten, chuc_vu, chi_nhanh_id,
+                                         ten_chi_nhanh, loai_luong, muc_luong, tong_gio, luong_thuc_nhan)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, snapshot_rows)
+        
+        await conn.commit()
+        logger.info("payroll period closed", extra={"month": period.month, "year": period.year, "staffCount": len(snapshot_rows)})
+        
+        return {
+            "success": True,
+            "message": f"Đã chốt bảng lương tháng {period.month:02d}/{period.year}",
+            "data": {
+                "month": period.month,
+                "year": period.year,
+                "staffCount": len(snapshot_rows),
+                "totalSalary": total_salary
+            }
+        }
+        
+    except HTTPException:
+        if conn:
+            await conn.rollback()
+        raise
+    except Exception as e:
+        if conn:
+            await conn.rollback()
+        error_msg = f"Error closing payroll period: {str(e)}"
+        logger.exception(error_msg)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=error_msg
+        )
+    finally:
+        if cursor:
+            await cursor.close()
+        if conn:
+            await release_db_connection(conn)
+
+# 5.4 API Payroll Simulation (Mô phỏng quỹ lương)
+PAYROLL_SIMULATION_MAX_MONTHS = 36
+
+def parse_year_month(value: str, field: str):
+    try:
+        year, month = (int(part) for part in value.strip().split("-"))
+        month_date_range(month, year)
+        return year, month
+    except (ValueError, AttributeError, HTTPException):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{field} must be in YYYY-MM format"
+        )
+
+@app.post("/api/payroll-simulation")
+async def simulate_payroll(request: PayrollSimulationRequest):
+    """
+    What-if payroll cost over a period, e.g. "+5% for hourly Phục vụ at branch X
+    over the last 6 months".
     
-    conn.close()
-    print(f"[PAYROLL SHEET] Calculated for {len(result)} staff members")
-    return result
+    Logic Flow:
+    1. Load staff salary config and hours per staff per month (two set-based queries)
+    2. Build NumPy arrays once (phu_ai.payroll_simulation.PayrollDataset)
+    3. Evaluate baseline + all scenarios in batch with the THEO_GIO / THEO_THANG rules
+    """
+    start_year, start_month = parse_year_month(request.startMonth, "startMonth")
+    end_year, end_month = parse_year_month(request.endMonth, "endMonth")
+    months = []
+    year, month = start_year, start_month
+    while (year, month) <= (end_year, end_month):
+        months.append(date(year, month, 1))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    if not months:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="startMonth must not be after endMonth"
+        )
+    if len(months) > PAYROLL_SIMULATION_MAX_MONTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Simulation period cannot exceed {PAYROLL_SIMULATION_MAX_MONTHS} months"
+        )
+    if not request.scenarios:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="At least one scenario is required"
+        )
+    for scenario in request.scenarios:
+        for salary_type in (scenario.currentSalaryType, scenario.newSalaryType):
+            if salary_type is not None and salary_type not in SALARY_TYPE_LABELS:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Salary type must be 'THEO_GIO' or 'THEO_THANG'"
+                )
+        if scenario.newAmount is not None and scenario.newAmount < 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Amount cannot be negative"
+            )
+    
+    staff_query = """
+        SELECT nv.id, nv.chuc_vu, nv.chi_nhanh_id, cl.loai_luong, cl.muc_luong
+        FROM nhan_vien nv
+        LEFT JOIN cau_hinh_luong cl ON nv.id = cl.nhan_vien_id
+    """
+    hours_query = f"""
+        SELECT c.nhan_vien_id, date_trunc('month', c.ngay)::date, SUM({WORK_HOURS_SQL})
+        FROM cham_cong c
+        WHERE c.ngay >= %s
+          AND c.ngay < %s
+          AND c.gio_vao IS NOT NULL
+          AND c.gio_ra IS NOT NULL
+    """
+    staff_params = []
+    hours_params = [months[0], month_date_range(end_month, end_year)[1]]
+    if request.branchId:
+        staff_query += " WHERE nv.chi_nhanh_id = %s"
+        staff_params.append(request.branchId)
+        hours_query += " AND c.nhan_vien_id IN (SELECT id FROM nhan_vien WHERE chi_nhanh_id = %s)"
+        hours_params.append(request.branchId)
+    staff_query += " ORDER BY nv.id ASC"
+    hours_query += " GROUP BY 1, 2"
+    
+    conn = await get_db_connection()
+    if not conn:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cannot connect to database"
+        )
+    cursor = conn.cursor()
+    try:
+        await cursor.execute(staff_query, tuple(staff_params))
+        staff_rows = await cursor.fetchall()
+        await cursor.execute(hours_query, tuple(hours_params))
+        hour_rows = await cursor.fetchall()
+    finally:
+        await release_db_connection(conn)
+    
+    scenarios = [
+        Scenario(
+            name=sc.name,
+            role=sc.role,
+            branch_id=sc.branchId,
+            staff_ids=sc.staffIds,
+            current_salary_type=sc.currentSalaryType,
+            rate_percent=sc.ratePercent,
+            new_amount=sc.newAmount,
+            new_salary_type=sc.newSalaryType
+        )
+        for sc in request.scenarios
+    ]
+    
+    def run():
+        return PayrollDataset(staff_rows, hour_rows, months).simulate(scenarios)
+    
+    # Array building and evaluation are CPU work: keep them off the event loop
+    results = await run_in_threadpool(run)
+    
+    return {
+        "startMonth": months[0].strftime("%Y-%m"),
+        "endMonth": months[-1].strftime("%Y-%m"),
+        "staffCount": len(staff_rows),
+        "baseline": results[0],
+        "scenarios": results[1:]
+    }
 
 # --- Chạy Server ---
 if __name__ == "__main__":
     import uvicorn
-    print("🚀 Server đang chạy tại https://8199be435802.ngrok-free.app")
+    logger.info("🚀 Server đang chạy tại https://8199be435802.ngrok-free.app")
     uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
@@ -0,0 +1,75 @@
+-- ==========================================
+-- MIGRATION SCRIPT: ATTENDANCE UPSERT KEY (Nhập chấm công)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: One cham_cong row per staff member per day, enforced by a unique
+--          index so POST /api/attendance/import can merge time-clock exports
+--          with INSERT ... ON CONFLICT (nhan_vien_id, ngay) DO UPDATE
+-- Date: 2026-10-18
+-- ==========================================
+-- NOTE: CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+--       Run with plain psql (autocommit), NOT with psql --single-transaction:
+--       psql -h localhost -p 5433 -U postgres -d postgres -f backend/migrate_attendance_import.sql
+-- ==========================================
+
+\set ON_ERROR_STOP on
+
+-- 1. CHECK FOR DUPLICATE DAYS
+-- ==========================================
+-- The unique index cannot be built while a staff member has two rows for the
+-- same day. List them, merge or delete by hand, then re-run this script.
+SELECT nhan_vien_id, ngay, COUNT(*) AS so_dong, array_agg(id ORDER BY id) AS ids
+FROM cham_cong
+GROUP BY nhan_vien_id, ngay
+HAVING COUNT(*) > 1
+ORDER BY nhan_vien_id, ngay
+LIMIT 50;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM cham_cong GROUP BY nhan_vien_id, ngay HAVING COUNT(*) > 1) THEN
+        RAISE EXCEPTION 'cham_cong has duplicate (nhan_vien_id, ngay) rows, see the list above';
+    END IF;
+END $$;
+
+-- 2. UNIQUE INDEX (staff, date)
+-- ==========================================
+-- Drop a leftover invalid index from an interrupted earlier run
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE i.relname = 'uq_cham_cong_nhan_vien_ngay' AND NOT x.indisvalid
+    ) THEN
+        DROP INDEX uq_cham_cong_nhan_vien_ngay;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS uq_cham_cong_nhan_vien_ngay
+    ON cham_cong (nhan_vien_id, ngay);
+
+COMMENT ON INDEX uq_cham_cong_nhan_vien_ngay IS 'One attendance row per staff member per day (import upsert key); also serves per-staff date ranges';
+
+-- 3. DROP THE REDUNDANT NON-UNIQUE INDEX
+-- ==========================================
+-- idx_cham_cong_nhan_vien_ngay (migrate_cham_cong_indexes.sql) has the same
+-- columns; the unique index now serves its range lookups, so keeping both only
+-- doubles the index writes on every check-in and import.
+DROP INDEX CONCURRENTLY IF EXISTS idx_cham_cong_nhan_vien_ngay;
+
+-- 4. VERIFICATION QUERIES
+-- ==========================================
+SELECT 'Attendance Upsert Key:' as check_name, i.relname as index_name, x.indisunique as is_unique, x.indisvalid as is_valid
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+WHERE i.relname IN ('uq_cham_cong_nhan_vien_ngay', 'idx_cham_cong_nhan_vien_ngay');
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- Next steps:
+-- 1. Restart backend server: python backend/main.py
+-- 2. Import a time-clock export:
+--    curl -X POST 'http://127.0.0.1:8000/api/attendance/import?dry_run=true' \
+--         -H 'Content-Type: text/csv' --data-binary @cham_cong.csv
+-- ==========================================
@@ -0,0 +1,68 @@
+-- ==========================================
+-- MIGRATION SCRIPT: CHAM_CONG INDEXES (Chấm công)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: Index attendance by staff + date and by date so the half-open
+--          month/date range filters in main.py (ngay >= start AND ngay < end)
+--          use index scans instead of reading the whole cham_cong table
+-- Date: 2026-10-18
+-- ==========================================
+-- NOTE: CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+--       Run with plain psql (autocommit), NOT with psql --single-transaction:
+--       psql -h localhost -p 5433 -U postgres -d postgres -f backend/migrate_cham_cong_indexes.sql
+-- ==========================================
+
+-- 1. COMPOSITE INDEX (staff, date)
+-- ==========================================
+-- Used by: per-staff attendance lookups, timesheet LEFT JOIN
+--          (nv.id = c.nhan_vien_id AND c.ngay >= .. AND c.ngay < ..)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cham_cong_nhan_vien_ngay
+    ON cham_cong (nhan_vien_id, ngay);
+
+-- 2. DATE INDEX
+-- ==========================================
+-- Used by: payroll sheet aggregate (all staff, one month), attendance list by date
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cham_cong_ngay
+    ON cham_cong (ngay);
+
+COMMENT ON INDEX idx_cham_cong_nhan_vien_ngay IS 'Attendance of one staff member in a date range';
+COMMENT ON INDEX idx_cham_cong_ngay IS 'Attendance of all staff in a date range (payroll month)';
+
+-- Refresh planner statistics so the new indexes are picked up immediately
+ANALYZE cham_cong;
+
+-- 3. VERIFICATION QUERIES
+-- ==========================================
+-- Check indexes exist and are valid
+SELECT 'Cham Cong Indexes:' as check_name, i.relname as index_name, x.indisvalid as is_valid
+FROM pg_index x
+JOIN pg_class i ON i.oid = x.indexrelid
+WHERE x.indrelid = 'cham_cong'::regclass
+ORDER BY i.relname;
+
+-- Payroll month (same shape as build_payroll_sheet_query).
+-- Expected: Index Scan / Bitmap Index Scan using idx_cham_cong_ngay, NOT "Seq Scan on cham_cong".
+-- The old EXTRACT(MONTH FROM ngay) = .. AND EXTRACT(YEAR FROM ngay) = .. form always seq-scans.
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT c.nhan_vien_id, COUNT(*)
+FROM cham_cong c
+WHERE c.ngay >= date_trunc('month', CURRENT_DATE)::date
+  AND c.ngay < (date_trunc('month', CURRENT_DATE) + INTERVAL '1 month')::date
+GROUP BY c.nhan_vien_id;
+
+-- One staff member, one week (timesheet join).
+-- Expected: Index Scan using idx_cham_cong_nhan_vien_ngay.
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT c.*
+FROM cham_cong c
+WHERE c.nhan_vien_id = (SELECT MIN(id) FROM nhan_vien)
+  AND c.ngay >= CURRENT_DATE - 7
+  AND c.ngay < CURRENT_DATE + 1;
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- Next steps:
+-- 1. Check both EXPLAIN outputs above use the new indexes
+-- 2. Restart backend server: python backend/main.py
+-- ==========================================
@@ -0,0 +1,83 @@
+-- ==========================================
+-- MIGRATION SCRIPT: DATA VERSIONS (Phiên bản dữ liệu)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: Version counters for chi_nhanh, cau_hinh_ca, cau_hinh_luong,
+--          nhan_vien, lich_lam_viec and cham_cong, bumped by a statement-level
+--          trigger on every INSERT / UPDATE / DELETE / TRUNCATE. The backend
+--          builds ETags for /api/roster, /api/timesheet and /api/payroll-config
+--          from these counters (a primary key lookup), so an unchanged
+--          response is answered with 304 without reading the data tables.
+--          The bump is part of the writing transaction: readers never see a
+--          new counter before the data it describes.
+--          Each table has SO_PHAN_MANH counter rows and a session bumps the
+--          one picked by its backend PID: a counter row stays locked until
+--          commit, and with a single row every concurrent writer of a hot
+--          table would wait for the previous one. The version of a table is
+--          the SUM over its rows.
+-- Date: 2026-10-18
+-- ==========================================
+
+BEGIN;
+
+-- 1. CREATE VERSION TABLE
+-- ==========================================
+CREATE TABLE IF NOT EXISTS phien_ban_du_lieu (
+    ten_bang TEXT NOT NULL,
+    phan_manh SMALLINT NOT NULL,
+    phien_ban BIGINT NOT NULL DEFAULT 0,
+    cap_nhat_luc TIMESTAMPTZ NOT NULL DEFAULT now(),
+    CONSTRAINT pk_phien_ban_du_lieu PRIMARY KEY (ten_bang, phan_manh)
+);
+
+COMMENT ON TABLE phien_ban_du_lieu IS 'Change counters per table (maintained by trigger), used for HTTP ETags';
+COMMENT ON COLUMN phien_ban_du_lieu.phan_manh IS 'Counter shard (backend PID % 16); table version = SUM(phien_ban)';
+
+-- 2. TRIGGER: BUMP ONE COUNTER SHARD ONCE PER STATEMENT
+-- ==========================================
+CREATE OR REPLACE FUNCTION tang_phien_ban_du_lieu() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO phien_ban_du_lieu AS pb (ten_bang, phan_manh, phien_ban)
+    VALUES (TG_TABLE_NAME, pg_backend_pid() % 16, 1)
+    ON CONFLICT (ten_bang, phan_manh)
+    DO UPDATE SET phien_ban = pb.phien_ban + 1, cap_nhat_luc = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    v_bang TEXT;
+BEGIN
+    FOREACH v_bang IN ARRAY ARRAY['chi_nhanh', 'cau_hinh_ca', 'cau_hinh_luong', 'nhan_vien', 'lich_lam_viec', 'cham_cong']
+    LOOP
+        INSERT INTO phien_ban_du_lieu (ten_bang, phan_manh)
+        SELECT v_bang, g FROM generate_series(0, 15) g
+        ON CONFLICT DO NOTHING;
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_phien_ban_du_lieu ON %I', v_bang);
+        EXECUTE format(
+            'CREATE TRIGGER trg_phien_ban_du_lieu
+                AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                FOR EACH STATEMENT EXECUTE FUNCTION tang_phien_ban_du_lieu()',
+            v_bang
+        );
+    END LOOP;
+END;
+$$;
+
+COMMIT;
+
+-- 3. VERIFICATION QUERIES
+-- ==========================================
+SELECT 'Data Versions:' as check_name, ten_bang, SUM(phien_ban) AS phien_ban, MAX(cap_nhat_luc) AS cap_nhat_luc
+FROM phien_ban_du_lieu
+GROUP BY ten_bang
+ORDER BY ten_bang;
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- Next steps:
+-- 1. Restart backend server: python backend/main.py
+-- 2. GET /api/payroll-config twice with the returned ETag in If-None-Match: expect 304
+-- ==========================================
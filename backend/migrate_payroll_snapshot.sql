@@ -0,0 +1,91 @@
+-- ==========================================
+-- MIGRATION SCRIPT: PAYROLL PERIOD CLOSE (Chốt bảng lương)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: Store closed payroll months and an immutable per-staff snapshot
+--          so /api/payroll-sheet reads closed months with one indexed lookup
+-- Date: 2026-10-18
+-- ==========================================
+
+-- 1. CREATE PAYROLL PERIODS TABLE (Kỳ lương đã chốt)
+-- ==========================================
+CREATE TABLE IF NOT EXISTS ky_luong (
+    nam INTEGER NOT NULL,
+    thang INTEGER NOT NULL,
+    so_nhan_vien INTEGER NOT NULL DEFAULT 0,
+    tong_luong NUMERIC(14, 0) NOT NULL DEFAULT 0,
+    chot_luc TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT pk_ky_luong PRIMARY KEY (nam, thang),
+    CONSTRAINT check_ky_luong_thang CHECK (thang BETWEEN 1 AND 12)
+);
+
+COMMENT ON TABLE ky_luong IS 'Closed payroll months (one row per closed month)';
+COMMENT ON COLUMN ky_luong.so_nhan_vien IS 'Number of staff rows in the snapshot';
+COMMENT ON COLUMN ky_luong.tong_luong IS 'Sum of luong_thuc_nhan for the month';
+COMMENT ON COLUMN ky_luong.chot_luc IS 'When the month was closed';
+
+-- 2. CREATE PAYROLL SNAPSHOT TABLE (Bảng lương đã chốt)
+-- ==========================================
+-- Staff/branch names are copied so later renames do not change paid months
+CREATE TABLE IF NOT EXISTS bang_luong_chot (
+    nam INTEGER NOT NULL,
+    thang INTEGER NOT NULL,
+    nhan_vien_id INTEGER NOT NULL,
+    ho_ten VARCHAR(255) NOT NULL,
+    chuc_vu VARCHAR(255),
+    chi_nhanh_id INTEGER,
+    ten_chi_nhanh VARCHAR(255) NOT NULL,
+    loai_luong VARCHAR(20),
+    muc_luong NUMERIC(14, 2) NOT NULL DEFAULT 0,
+    tong_gio NUMERIC(8, 1) NOT NULL DEFAULT 0,
+    luong_thuc_nhan NUMERIC(14, 0) NOT NULL DEFAULT 0,
+    CONSTRAINT pk_bang_luong_chot PRIMARY KEY (nam, thang, nhan_vien_id),
+    CONSTRAINT fk_bang_luong_chot_ky FOREIGN KEY (nam, thang) REFERENCES ky_luong(nam, thang)
+);
+
+COMMENT ON TABLE bang_luong_chot IS 'Immutable payroll snapshot per staff member for a closed month';
+COMMENT ON COLUMN bang_luong_chot.loai_luong IS 'THEO_GIO / THEO_THANG / NULL (not configured) at close time';
+COMMENT ON COLUMN bang_luong_chot.muc_luong IS 'Hourly rate or monthly salary at close time';
+COMMENT ON COLUMN bang_luong_chot.tong_gio IS 'Total worked hours in the month';
+COMMENT ON COLUMN bang_luong_chot.luong_thuc_nhan IS 'Final salary (same rules as get_payroll_sheet)';
+
+-- 3. MAKE SNAPSHOTS IMMUTABLE
+-- ==========================================
+CREATE OR REPLACE FUNCTION chan_sua_bang_luong_chot() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'Payroll % is closed and cannot be modified', TG_TABLE_NAME;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ky_luong_immutable ON ky_luong;
+CREATE TRIGGER trg_ky_luong_immutable
+    BEFORE UPDATE OR DELETE ON ky_luong
+    FOR EACH ROW EXECUTE FUNCTION chan_sua_bang_luong_chot();
+
+DROP TRIGGER IF EXISTS trg_bang_luong_chot_immutable ON bang_luong_chot;
+CREATE TRIGGER trg_bang_luong_chot_immutable
+    BEFORE UPDATE OR DELETE ON bang_luong_chot
+    FOR EACH ROW EXECUTE FUNCTION chan_sua_bang_luong_chot();
+
+-- 4. CREATE INDEXES FOR PERFORMANCE
+-- ==========================================
+-- (nam, thang, nhan_vien_id) is covered by the primary key
+CREATE INDEX IF NOT EXISTS idx_bang_luong_chot_chi_nhanh ON bang_luong_chot(nam, thang, chi_nhanh_id);
+
+-- 5. VERIFICATION QUERIES
+-- ==========================================
+SELECT 'Closed Payroll Periods:' as check_name, COUNT(*) as result FROM ky_luong;
+
+SELECT 'Snapshot Triggers:' as check_name, tgname as trigger_name
+FROM pg_trigger
+WHERE tgrelid IN ('ky_luong'::regclass, 'bang_luong_chot'::regclass)
+AND NOT tgisinternal;
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- Next steps:
+-- 1. Restart backend server: python backend/main.py
+-- 2. Close a month: POST /api/payroll-periods/close { "month": 1, "year": 2026 }
+-- 3. /api/payroll-sheet for that month now reads bang_luong_chot
+-- ==========================================
@@ -0,0 +1,105 @@
+-- ==========================================
+-- MIGRATION SCRIPT: SHIFT CAPACITY COUNTER (Sức chứa ca làm)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: O(1), contention-safe enforcement of cau_hinh_ca.so_luong_max.
+--          One counter row per (shift, date, branch) is kept in sync by a
+--          trigger on lich_lam_viec; the increment only succeeds while the
+--          counter is below so_luong_max, and the row lock taken by the
+--          upsert serializes concurrent assignments to the same slot.
+-- Date: 2026-10-18
+-- ==========================================
+
+BEGIN;
+
+-- Block writes to lich_lam_viec until the trigger is in place, so the
+-- backfilled counts cannot go stale
+LOCK TABLE lich_lam_viec IN SHARE ROW EXCLUSIVE MODE;
+
+-- 1. CREATE OCCUPANCY COUNTER TABLE
+-- ==========================================
+CREATE TABLE IF NOT EXISTS lich_lam_viec_suc_chua (
+    ca_lam_id INTEGER NOT NULL,
+    ngay_lam DATE NOT NULL,
+    chi_nhanh_id INTEGER NOT NULL DEFAULT 0,
+    so_luong INTEGER NOT NULL DEFAULT 0,
+    CONSTRAINT pk_lich_lam_viec_suc_chua PRIMARY KEY (ca_lam_id, ngay_lam, chi_nhanh_id),
+    CONSTRAINT check_so_luong_khong_am CHECK (so_luong >= 0)
+);
+
+COMMENT ON TABLE lich_lam_viec_suc_chua IS 'Number of staff assigned per shift, date and branch (maintained by trigger)';
+COMMENT ON COLUMN lich_lam_viec_suc_chua.chi_nhanh_id IS 'Branch ID, 0 = assignments without branch';
+
+-- 2. BACKFILL FROM EXISTING ASSIGNMENTS
+-- ==========================================
+TRUNCATE lich_lam_viec_suc_chua;
+INSERT INTO lich_lam_viec_suc_chua (ca_lam_id, ngay_lam, chi_nhanh_id, so_luong)
+SELECT ca_lam_id, ngay_lam, COALESCE(chi_nhanh_id, 0), COUNT(*)
+FROM lich_lam_viec
+GROUP BY ca_lam_id, ngay_lam, COALESCE(chi_nhanh_id, 0);
+
+-- 3. TRIGGER: KEEP COUNTERS IN SYNC AND ENFORCE CAPACITY
+-- ==========================================
+CREATE OR REPLACE FUNCTION cap_nhat_suc_chua_ca() RETURNS trigger AS $$
+DECLARE
+    v_max INTEGER;
+    v_so_luong INTEGER;
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE lich_lam_viec_suc_chua
+        SET so_luong = so_luong - 1
+        WHERE ca_lam_id = OLD.ca_lam_id
+          AND ngay_lam = OLD.ngay_lam
+          AND chi_nhanh_id = COALESCE(OLD.chi_nhanh_id, 0);
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        SELECT so_luong_max INTO v_max FROM cau_hinh_ca WHERE id = NEW.ca_lam_id;
+
+        -- Upsert locks the counter row: concurrent inserts for the same slot wait here
+        INSERT INTO lich_lam_viec_suc_chua AS sc (ca_lam_id, ngay_lam, chi_nhanh_id, so_luong)
+        VALUES (NEW.ca_lam_id, NEW.ngay_lam, COALESCE(NEW.chi_nhanh_id, 0), 1)
+        ON CONFLICT (ca_lam_id, ngay_lam, chi_nhanh_id)
+        DO UPDATE SET so_luong = sc.so_luong + 1
+        WHERE sc.so_luong < v_max
+        RETURNING so_luong INTO v_so_luong;
+
+        IF v_so_luong IS NULL THEN
+            RAISE EXCEPTION 'Shift has reached maximum capacity (% slots)', v_max
+                USING ERRCODE = 'check_violation',
+                      CONSTRAINT = 'check_suc_chua_ca',
+                      TABLE = 'lich_lam_viec';
+        END IF;
+        RETURN NEW;
+    END IF;
+
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_lich_lam_viec_suc_chua ON lich_lam_viec;
+CREATE TRIGGER trg_lich_lam_viec_suc_chua
+    AFTER INSERT OR DELETE OR UPDATE OF ca_lam_id, ngay_lam, chi_nhanh_id ON lich_lam_viec
+    FOR EACH ROW EXECUTE FUNCTION cap_nhat_suc_chua_ca();
+
+COMMIT;
+
+-- 4. VERIFICATION QUERIES
+-- ==========================================
+-- Counters must match the real assignment counts (expect 0 rows)
+SELECT 'Counter Mismatch:' as check_name, sc.*, real.so_luong as real_count
+FROM lich_lam_viec_suc_chua sc
+FULL JOIN (
+    SELECT ca_lam_id, ngay_lam, COALESCE(chi_nhanh_id, 0) as chi_nhanh_id, COUNT(*) as so_luong
+    FROM lich_lam_viec
+    GROUP BY 1, 2, 3
+) real USING (ca_lam_id, ngay_lam, chi_nhanh_id)
+WHERE COALESCE(sc.so_luong, 0) <> COALESCE(real.so_luong, 0);
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- Next steps:
+-- 1. Restart backend server: python backend/main.py
+-- 2. Load test: python backend/benchmarks/load_assign_shift.py --requests 200 --capacity 3
+-- ==========================================
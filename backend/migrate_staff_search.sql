@@ -0,0 +1,63 @@
+-- ==========================================
+-- MIGRATION SCRIPT: STAFF SEARCH (Tìm kiếm nhân viên)
+-- ==========================================
+-- Database: postgres (PostgreSQL)
+-- Purpose: Accent-insensitive, index-backed search over staff name/phone
+--          ("nguyen van" finds "Nguyễn Văn ...") used by /api/staff,
+--          /api/timesheet and /api/payroll-sheet
+-- Date: 2026-10-18
+-- ==========================================
+
+-- 1. EXTENSIONS
+-- ==========================================
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- 2. SEARCH FUNCTIONS
+-- ==========================================
+-- unaccent() is only STABLE (depends on the dictionary), so it cannot be used
+-- in an index expression; pin the dictionary and mark the wrapper IMMUTABLE.
+CREATE OR REPLACE FUNCTION search_normalize(value TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+AS $$
+    SELECT lower(public.unaccent('public.unaccent'::regdictionary, value))
+$$;
+
+-- The searchable text of one staff member (name + phone)
+CREATE OR REPLACE FUNCTION nhan_vien_search_text(ho_ten TEXT, so_dien_thoai TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+    SELECT search_normalize(COALESCE(ho_ten, '') || ' ' || COALESCE(so_dien_thoai, ''))
+$$;
+
+COMMENT ON FUNCTION search_normalize(TEXT) IS 'lower + unaccent (Nguyễn -> nguyen, Đ -> d)';
+COMMENT ON FUNCTION nhan_vien_search_text(TEXT, TEXT) IS 'Normalized name + phone used by the staff trigram index';
+
+-- 3. TRIGRAM INDEX
+-- ==========================================
+-- Serves LIKE '%term%' and the word-similarity operator (<%) used by main.py
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_nhan_vien_search_trgm
+    ON nhan_vien USING gin (nhan_vien_search_text(ho_ten, so_dien_thoai) gin_trgm_ops);
+
+ANALYZE nhan_vien;
+
+-- 4. VERIFICATION QUERIES
+-- ==========================================
+SELECT 'Normalize:' as check_name, search_normalize('Nguyễn Văn Đức') as result;
+
+-- Expected: Bitmap Index Scan on idx_nhan_vien_search_trgm
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, ho_ten
+FROM nhan_vien
+WHERE nhan_vien_search_text(ho_ten, so_dien_thoai) LIKE '%' || search_normalize('nguyen van') || '%'
+ORDER BY word_similarity(search_normalize('nguyen van'), nhan_vien_search_text(ho_ten, so_dien_thoai)) DESC
+LIMIT 50;
+
+-- ==========================================
+-- MIGRATION COMPLETE
+-- ==========================================
+-- NOTE: CREATE INDEX CONCURRENTLY cannot run inside a transaction block,
+--       run this file with plain psql (autocommit).
+-- ==========================================
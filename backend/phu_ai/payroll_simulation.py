@@ -0,0 +1,120 @@
+"""
+Payroll what-if simulation (Mô phỏng quỹ lương)
+
+Attendance hours are loaded once into NumPy arrays (staff × month) and every
+scenario is evaluated in batch as vector operations, using the same rules as
+calculate_final_salary() in main.py:
+- THEO_GIO (Hourly): salary = total_hours * hourly_rate
+- THEO_THANG (Monthly): salary = fixed_amount (every month of the period)
+- No config: salary = 0
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+SALARY_TYPE_CODES = {None: 0, 'THEO_GIO': 1, 'THEO_THANG': 2}
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Which staff the change applies to (all filters must match; None = any)
+    role: Optional[str] = None
+    branch_id: Optional[int] = None
+    staff_ids: Optional[Sequence[int]] = None
+    current_salary_type: Optional[str] = None
+    # What changes for those staff
+    rate_percent: float = 0.0
+    new_amount: Optional[float] = None
+    new_salary_type: Optional[str] = None
+
+
+class PayrollDataset:
+    """
+    Staff attributes as 1-D arrays (length N) and worked hours as an N × M
+    matrix, M = number of months in the simulated period.
+    """
+
+    def __init__(self, staff_rows: Iterable[tuple], hour_rows: Iterable[tuple], months: List[date]):
+        """
+        staff_rows: (staff_id, role, branch_id, salary_type, amount)
+        hour_rows:  (staff_id, month_start_date, total_hours)
+        months:     first day of every month in the period, ascending
+        """
+        staff_rows = list(staff_rows)
+        self.months = months
+        self.staff_ids = np.array([r[0] for r in staff_rows], dtype=np.int64)
+        self.roles = np.array([r[1] or '' for r in staff_rows], dtype=object)
+        self.branch_ids = np.array([r[2] if r[2] is not None else -1 for r in staff_rows], dtype=np.int64)
+        self.salary_types = np.array([SALARY_TYPE_CODES.get(r[3], 0) for r in staff_rows], dtype=np.int8)
+        self.amounts = np.array([float(r[4] or 0) for r in staff_rows], dtype=np.float64)
+
+        staff_index = {staff_id: i for i, staff_id in enumerate(self.staff_ids.tolist())}
+        month_index = {m: j for j, m in enumerate(months)}
+        self.hours = np.zeros((len(staff_rows), len(months)), dtype=np.float64)
+        for staff_id, month, total_hours in hour_rows:
+            i = staff_index.get(staff_id)
+            j = month_index.get(month)
+            if i is not None and j is not None:
+                self.hours[i, j] = float(total_hours or 0)
+
+    def _mask(self, scenario: Scenario) -> np.ndarray:
+        mask = np.ones(len(self.staff_ids), dtype=bool)
+        if scenario.role:
+            mask &= self.roles == scenario.role
+        if scenario.branch_id:
+            mask &= self.branch_ids == scenario.branch_id
+        if scenario.staff_ids:
+            mask &= np.isin(self.staff_ids, np.asarray(scenario.staff_ids, dtype=np.int64))
+        if scenario.current_salary_type:
+            mask &= self.salary_types == SALARY_TYPE_CODES[scenario.current_salary_type]
+        return mask
+
+    def simulate(self, scenarios: Sequence[Scenario]) -> List[dict]:
+        """
+        Evaluate the baseline plus every scenario at once.
+        Returns one result per scenario (baseline first).
+        """
+        scenarios = [Scenario(name='Hiện tại')] + list(scenarios)
+        count = len(scenarios)
+
+        # S × N matrices of salary type / amount after applying each scenario
+        types = np.repeat(self.salary_types[None, :], count, axis=0)
+        amounts = np.repeat(self.amounts[None, :], count, axis=0)
+        masks = np.zeros((count, len(self.staff_ids)), dtype=bool)
+        for s, scenario in enumerate(scenarios):
+            mask = self._mask(scenario) if s > 0 else masks[s]
+            masks[s] = mask
+            if scenario.new_salary_type:
+                types[s, mask] = SALARY_TYPE_CODES[scenario.new_salary_type]
+            if scenario.new_amount is not None:
+                amounts[s, mask] = scenario.new_amount
+            if scenario.rate_percent:
+                amounts[s, mask] *= 1 + scenario.rate_percent / 100
+
+        hourly_rates = np.where(types == 1, amounts, 0.0)
+        monthly_fixed = np.where(types == 2, amounts, 0.0)
+
+        # (S × N) @ (N × M) -> cost per scenario per month
+        monthly_cost = hourly_rates @ self.hours + monthly_fixed.sum(axis=1, keepdims=True)
+        totals = monthly_cost.sum(axis=1)
+        baseline = totals[0]
+
+        results = []
+        for s, scenario in enumerate(scenarios):
+            delta = totals[s] - baseline
+            results.append({
+                'name': scenario.name,
+                'affectedStaff': int(masks[s].sum()),
+                'totalCost': round(float(totals[s]), 0),
+                'baselineCost': round(float(baseline), 0),
+                'delta': round(float(delta), 0),
+                'deltaPercent': round(float(delta / baseline * 100), 2) if baseline else 0.0,
+                'monthly': [
+                    {'month': m.strftime('%Y-%m'), 'cost': round(float(cost), 0)}
+                    for m, cost in zip(self.months, monthly_cost[s])
+                ],
+            })
+        return results
@@ -0,0 +1,159 @@
+"""
+Roster generator (Tự động xếp lịch)
+
+Builds a proposed week roster from cau_hinh_ca templates with the same rules
+the roster endpoints enforce:
+- so_luong_max staff per shift, per date, per branch (minus existing assignments)
+- staff only work at their own branch (nhan_vien.chi_nhanh_id)
+- at most one shift per staff member per day (assign_shift rule)
+plus scheduling preferences:
+- at most max_shifts_per_staff shifts per week
+- at least min_rest_hours between the end of one shift and the start of the
+  next (overnight shifts such as Ca Tối 18:00-02:00 end on the next day)
+- work is spread evenly: the staff member with the fewest shifts so far is
+  picked first, ties rotate by branch/day so the same people are not always first
+
+The generator is pure Python (no database access); main.py loads the data
+and returns the draft for review, it is not saved.
+"""
+import heapq
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass
+class ShiftTemplate:
+    id: int
+    name: str
+    start: time
+    end: time
+    max_capacity: int
+
+    def window(self, day: date) -> Tuple[datetime, datetime]:
+        start = datetime.combine(day, self.start)
+        end = datetime.combine(day, self.end)
+        if end <= start:
+            end += timedelta(days=1)
+        return start, end
+
+
+@dataclass
+class StaffMember:
+    id: int
+    name: str
+    branch_id: int
+
+
+@dataclass
+class RosterDraft:
+    assignments: List[dict] = field(default_factory=list)
+    unfilled: List[dict] = field(default_factory=list)
+
+    def summary(self) -> dict:
+        return {
+            'assigned': len(self.assignments),
+            'unfilledSlots': sum(item['missing'] for item in self.unfilled),
+        }
+
+
+def generate_week_roster(
+    week_start: date,
+    shifts: Iterable[ShiftTemplate],
+    staff: Iterable[StaffMember],
+    existing: Iterable[Tuple[int, int, date, int]] = (),
+    branch_ids: Optional[Iterable[int]] = None,
+    days: int = 7,
+    max_shifts_per_staff: int = 6,
+    min_rest_hours: float = 8,
+    adjacent: Iterable[Tuple[int, int, date]] = (),
+) -> RosterDraft:
+    """
+    existing: already saved assignments as (staff_id, shift_id, date, branch_id);
+              they count toward capacity, the one-shift-per-day rule and staff load.
+    adjacent: saved assignments just outside the window as (staff_id, shift_id, date),
+              e.g. last Sunday's night shift; only checked for minimum rest time.
+    branch_ids: branches to fill (default: every branch that has staff); a
+              branch without staff reports all its slots as unfilled.
+    """
+    shifts = sorted(shifts, key=lambda s: (s.start, s.id))
+    shift_by_id = {s.id: s for s in shifts}
+    dates = [week_start + timedelta(days=offset) for offset in range(days)]
+    min_rest = timedelta(hours=min_rest_hours)
+
+    staff_by_branch: Dict[int, List[StaffMember]] = {}
+    if branch_ids is not None:
+        staff_by_branch = {branch_id: [] for branch_id in branch_ids}
+    for member in staff:
+        if member.branch_id and (branch_ids is None or member.branch_id in staff_by_branch):
+            staff_by_branch.setdefault(member.branch_id, []).append(member)
+
+    busy_days: Set[Tuple[int, date]] = set()
+    load: Dict[int, int] = {}
+    occupancy: Dict[Tuple[int, date, int], int] = {}
+    # (start, end) of every shift a staff member works, to check rest time both ways
+    windows: Dict[int, List[Tuple[datetime, datetime]]] = {}
+    for staff_id, shift_id, day, branch_id in existing:
+        busy_days.add((staff_id, day))
+        load[staff_id] = load.get(staff_id, 0) + 1
+        key = (shift_id, day, branch_id or 0)
+        occupancy[key] = occupancy.get(key, 0) + 1
+        if shift_id in shift_by_id:
+            windows.setdefault(staff_id, []).append(shift_by_id[shift_id].window(day))
+    for staff_id, shift_id, day in adjacent:
+        if shift_id in shift_by_id:
+            windows.setdefault(staff_id, []).append(shift_by_id[shift_id].window(day))
+
+    def rested(staff_id: int, start: datetime, end: datetime) -> bool:
+        for other_start, other_end in windows.get(staff_id, ()):
+            if start < other_end + min_rest and other_start < end + min_rest:
+                return False
+        return True
+
+    draft = RosterDraft()
+    for branch_index, (branch_id, members) in enumerate(sorted(staff_by_branch.items())):
+        count = len(members)
+        for day_index, day in enumerate(dates):
+            # Rotate tie-breaks so equal-load staff take turns being picked first
+            rotation = (branch_index + day_index) % count if count else 0
+            heap = [
+                (load.get(m.id, 0), (i - rotation) % count, m.id, m)
+                for i, m in enumerate(members)
+                if (m.id, day) not in busy_days and load.get(m.id, 0) < max_shifts_per_staff
+            ]
+            heapq.heapify(heap)
+
+            for shift in shifts:
+                start, end = shift.window(day)
+                free = shift.max_capacity - occupancy.get((shift.id, day, branch_id), 0)
+                skipped = []
+                while free > 0 and heap:
+                    entry = heapq.heappop(heap)
+                    member = entry[3]
+                    if not rested(member.id, start, end):
+                        # Still usable for a later shift of the same day
+                        skipped.append(entry)
+                        continue
+                    busy_days.add((member.id, day))
+                    load[member.id] = load.get(member.id, 0) + 1
+                    windows.setdefault(member.id, []).append((start, end))
+                    free -= 1
+                    draft.assignments.append({
+                        'staffId': member.id,
+                        'staffName': member.name,
+                        'shiftTemplateId': shift.id,
+                        'shiftName': shift.name,
+                        'date': day.isoformat(),
+                        'branchId': branch_id,
+                    })
+                for entry in skipped:
+                    heapq.heappush(heap, entry)
+                if free > 0:
+                    draft.unfilled.append({
+                        'date': day.isoformat(),
+                        'shiftTemplateId': shift.id,
+                        'shiftName': shift.name,
+                        'branchId': branch_id,
+                        'missing': free,
+                    })
+    return draft
@@ -0,0 +1,75 @@
+"""
+Work hours from attendance check-in / check-out strings (Giờ công)
+
+calculate_work_hours() is the reference rule; WORK_HOURS_SQL evaluates the
+same rule server-side for set-based queries over cham_cong (alias c):
+- "H:MM" / "HH:MM" strings (surrounding whitespace ignored, no seconds)
+- overnight shifts wrap past midnight (check-out earlier than check-in)
+- rounded to 1 decimal exactly like Python's round(hours, 1)
+- unparseable times count as 0 hours
+"""
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger("restaurant_ai.work_hours")
+
+# Everything datetime.strptime(value.strip(), '%H:%M') accepts.
+WORK_TIME_PATTERN = r'^\s*(2[0-3]|[01]?[0-9]):([0-5]?[0-9])\s*$'
+
+# round(minutes / 60, 1) rounds the binary float, so a duration that sits exactly
+# on a .x5 boundary (minutes % 6 == 3) goes up or down depending on its float
+# representation. SQL rounds those halves up; these are the ones Python rounds down.
+HALF_ROUNDED_DOWN_MINUTES = tuple(
+    m for m in range(3, 24 * 60, 6) if round(m / 60, 1) * 10 < m // 6 + 0.5
+)
+
+
+def calculate_work_hours(check_in: str, check_out: str) -> float:
+    """
+    Calculate work hours from time strings using datetime module
+    Format: "HH:MM" (e.g., "08:00", "17:30")
+    Logic: Parse with strptime, calculate exact time difference (no auto lunch deduction)
+    """
+    try:
+        # Parse time strings using datetime
+        time_format = '%H:%M'
+        t_in = datetime.strptime(check_in.strip(), time_format)
+        t_out = datetime.strptime(check_out.strip(), time_format)
+
+        # Handle overnight shifts (check_out < check_in)
+        # Add 24 hours to checkout time if it's earlier than check-in
+        if t_out < t_in:
+            t_out += timedelta(days=1)
+
+        # Calculate difference in hours (exact time difference)
+        time_diff = t_out - t_in
+        work_hours = time_diff.total_seconds() / 3600
+
+        return max(0, round(work_hours, 1))  # Ensure non-negative and round to 1 decimal
+
+    except (ValueError, AttributeError, TypeError) as e:
+        # Log error for debugging but don't crash the API
+        logger.warning("failed to parse time: check_in=%r, check_out=%r, error=%s", check_in, check_out, e)
+        return 0
+
+
+def _minutes_sql(column: str) -> str:
+    return (
+        f"(substring({column}::text from '(\\d+):')::int * 60"
+        f" + substring({column}::text from ':(\\d+)')::int)"
+    )
+
+
+_WORKED_MINUTES_SQL = (
+    f"MOD({_minutes_sql('c.gio_ra')} - {_minutes_sql('c.gio_vao')} + 1440, 1440)"
+)
+
+WORK_HOURS_SQL = f"""
+    CASE
+        WHEN c.gio_vao::text ~ '{WORK_TIME_PATTERN}' AND c.gio_ra::text ~ '{WORK_TIME_PATTERN}' THEN
+            ROUND({_WORKED_MINUTES_SQL} / 60.0, 1)
+            - CASE WHEN {_WORKED_MINUTES_SQL} IN ({', '.join(map(str, HALF_ROUNDED_DOWN_MINUTES))})
+                   THEN 0.1 ELSE 0 END
+        ELSE 0
+    END
+"""
@@ -0,0 +1,44 @@
+import os
+import sys
+from datetime import date
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_conn():
+    """Connection to the database configured by DB_* env vars (skipped when unreachable)."""
+    psycopg = pytest.importorskip("psycopg")
+    from db_config import DB_CONFIG
+
+    try:
+        conn = psycopg.connect(**DB_CONFIG)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"database not available: {e}")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture(scope="session")
+def synthetic_dataset():
+    """Deterministic 'tiny' dataset of phu_ai.synthetic_data (rows generated in memory, not loaded)"""
+    from phu_ai.synthetic_data import SyntheticDataset, scale_config
+
+    return SyntheticDataset(scale_config("tiny", today=date(2026, 1, 15)))
+
+
+@pytest.fixture
+def client(db_conn):
+    """TestClient for the API with its startup hooks run (pool opened)"""
+    pytest.importorskip("fastapi")
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg")
+
+import main  # noqa: E402
+
+LIST_ENDPOINTS = [
+    "/api/branches",
+    "/api/staff",
+    "/api/staff?search=nguyen",
+    "/api/shift-templates",
+    "/api/roster",
+    "/api/attendance",
+    "/api/timesheet",
+    "/api/timesheet/stream",
+    "/api/payroll-config",
+    "/api/payroll-sheet",
+    "/api/payroll-periods",
+]
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    monkeypatch.setattr(main, "N_PLUS_ONE_STRICT", True)
+
+
+@pytest.mark.parametrize("path", LIST_ENDPOINTS)
+def test_list_endpoints_do_not_repeat_statements(client, strict, path):
+    # TestClient re-raises server exceptions, so a detected loop fails the request
+    response = client.get(path)
+    assert response.status_code == 200
+
+
+def test_looped_query_raises(client, strict):
+    @main.app.get("/__tests__/n-plus-one")
+    async def looped():
+        conn = await main.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            for staff_id in range(main.N_PLUS_ONE_THRESHOLD + 1):
+                await cursor.execute("SELECT %s::int", (staff_id,))
+        finally:
+            await main.release_db_connection(conn)
+        return []
+
+    try:
+        with pytest.raises(main.NPlusOneDetected):
+            client.get("/__tests__/n-plus-one")
+    finally:
+        main.app.router.routes.pop()
+
+
+def test_threshold_counts_per_request(strict):
+    token = main.request_db_stats_var.set(main.RequestDbStats())
+    try:
+        for _ in range(main.N_PLUS_ONE_THRESHOLD):
+            main.record_db_statement("SELECT 1", None, 0.0, 1)
+        with pytest.raises(main.NPlusOneDetected):
+            main.record_db_statement("SELECT 1", None, 0.0, 1)
+    finally:
+        main.request_db_stats_var.reset(token)
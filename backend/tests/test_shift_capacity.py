@@ -0,0 +1,87 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("psycopg")
+httpx = pytest.importorskip("httpx")
+
+import main  # noqa: E402
+
+CAPACITY = 3
+CONCURRENT_REQUESTS = 40
+WORK_DATE = date(2099, 1, 5)
+TEST_SHIFT_NAME = "__test_capacity_ca__"
+TEST_STAFF_ROLE = "__test_capacity__"
+
+
+@pytest.fixture
+def capacity_slot(db_conn):
+    """A shift with so_luong_max = CAPACITY and CONCURRENT_REQUESTS staff, removed afterwards"""
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('lich_lam_viec_suc_chua')")
+        if cur.fetchone()[0] is None:
+            pytest.skip("migrate_shift_capacity.sql not installed")
+        cur.execute("""
+            INSERT INTO cau_hinh_ca (ten_ca, gio_bat_dau, gio_ket_thuc, so_luong_max)
+            VALUES (%s, '00:00', '00:01', %s)
+            RETURNING id
+        """, (TEST_SHIFT_NAME, CAPACITY))
+        shift_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO nhan_vien (ho_ten, chuc_vu, so_dien_thoai, trang_thai, avatar)
+            SELECT 'Capacity Test ' || g, %s, '000' || g, 'Đang làm', 'CT'
+            FROM generate_series(1, %s) g
+            RETURNING id
+        """, (TEST_STAFF_ROLE, CONCURRENT_REQUESTS))
+        staff_ids = [row[0] for row in cur.fetchall()]
+    db_conn.commit()
+    try:
+        yield shift_id, staff_ids
+    finally:
+        db_conn.rollback()
+        with db_conn.cursor() as cur:
+            cur.execute("DELETE FROM lich_lam_viec WHERE ca_lam_id = %s", (shift_id,))
+            cur.execute("DELETE FROM nhan_vien WHERE chuc_vu = %s", (TEST_STAFF_ROLE,))
+            cur.execute("DELETE FROM lich_lam_viec_suc_chua WHERE ca_lam_id = %s", (shift_id,))
+            cur.execute("DELETE FROM cau_hinh_ca WHERE id = %s", (shift_id,))
+        db_conn.commit()
+
+
+async def assign_concurrently(payloads):
+    # Same process and event loop: requests interleave on the pool like real traffic
+    await main.init_db_pool()
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            return await asyncio.gather(*(client.post("/api/assign-shift", json=p) for p in payloads))
+    finally:
+        await main.close_db_pool()
+
+
+def test_concurrent_assignments_never_exceed_capacity(db_conn, capacity_slot):
+    shift_id, staff_ids = capacity_slot
+    payloads = [
+        {"staffId": staff_id, "shiftTemplateId": shift_id, "date": WORK_DATE.isoformat()}
+        for staff_id in staff_ids
+    ]
+    responses = asyncio.run(assign_concurrently(payloads))
+
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(201) == CAPACITY
+    rejected = [response for response in responses if response.status_code == 409]
+    assert len(rejected) == CONCURRENT_REQUESTS - CAPACITY
+    assert all("maximum capacity" in response.json()["detail"] for response in rejected)
+
+    with db_conn.cursor() as cur:
+        cur.execute(
+            "SELECT COUNT(*) FROM lich_lam_viec WHERE ca_lam_id = %s AND ngay_lam = %s",
+            (shift_id, WORK_DATE)
+        )
+        assert cur.fetchone()[0] == CAPACITY
+        cur.execute(
+            "SELECT so_luong FROM lich_lam_viec_suc_chua WHERE ca_lam_id = %s AND ngay_lam = %s AND chi_nhanh_id = 0",
+            (shift_id, WORK_DATE)
+        )
+        assert cur.fetchone()[0] == CAPACITY
@@ -0,0 +1,86 @@
+import re
+
+import pytest
+
+from phu_ai.work_hours import WORK_HOURS_SQL, WORK_TIME_PATTERN, calculate_work_hours
+
+# Exact halves, float-representation halves, overnight wrap, whitespace and bad input
+BOUNDARY_CASES = [
+    ("07:00", "15:15"),
+    ("07:00", "15:45"),
+    ("08:00", "08:03"),
+    ("08:00", "08:09"),
+    ("08:00", "08:15"),
+    ("08:00", "08:21"),
+    ("22:00", "06:15"),
+    ("23:59", "00:00"),
+    ("00:00", "23:57"),
+    ("08:00", "08:00"),
+    ("7:5", "9:45"),
+    (" 08:00 ", "17:30\t"),
+    ("08:00:00", "17:30:00"),
+    ("24:00", "08:00"),
+    ("08:60", "09:00"),
+    ("", "17:00"),
+    ("8h", "17:00"),
+]
+
+
+@pytest.mark.parametrize("check_in,check_out,expected", [
+    ("07:00", "15:15", 8.2),
+    ("07:00", "15:45", 8.8),
+    ("22:00", "06:15", 8.2),
+    ("08:00", "08:00", 0),
+    (" 08:00 ", "17:30", 9.5),
+    ("08:00:00", "17:30:00", 0),
+    ("24:00", "08:00", 0),
+    (None, "08:00", 0),
+])
+def test_calculate_work_hours(check_in, check_out, expected):
+    assert calculate_work_hours(check_in, check_out) == expected
+
+
+@pytest.mark.parametrize("value", ["0:0", "7:05", "07:5", "23:59", " 08:00 "])
+def test_pattern_accepts_what_strptime_accepts(value):
+    assert re.match(WORK_TIME_PATTERN, value)
+    assert calculate_work_hours(value, value) == 0
+
+
+@pytest.mark.parametrize("value", ["24:00", "08:60", "08:00:00", "8", "08:", "", "-1:00"])
+def test_pattern_rejects_what_strptime_rejects(value):
+    assert not re.match(WORK_TIME_PATTERN, value)
+
+
+def sql_work_hours(db_conn, cases):
+    with db_conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT {WORK_HOURS_SQL}
+            FROM unnest(%s::text[], %s::text[]) WITH ORDINALITY AS c(gio_vao, gio_ra, n)
+            ORDER BY c.n
+        """, ([c[0] for c in cases], [c[1] for c in cases]))
+        return [float(row[0]) for row in cur.fetchall()]
+
+
+def test_sql_matches_python_on_every_duration(db_conn):
+    # Every minute offset from 00:00 plus the hand-picked boundary cases
+    cases = [("00:00", f"{m // 60:02d}:{m % 60:02d}") for m in range(24 * 60)] + BOUNDARY_CASES
+    results = sql_work_hours(db_conn, cases)
+
+    mismatches = [
+        (check_in, check_out, sql_hours, calculate_work_hours(check_in, check_out))
+        for (check_in, check_out), sql_hours in zip(cases, results)
+        if sql_hours != calculate_work_hours(check_in, check_out)
+    ]
+    assert mismatches == []
+
+
+def test_synthetic_attendance_is_about_one_shift(synthetic_dataset):
+    # 8 hour shifts (Ca Tối overnight), check-in -15..+45 and check-out -10..+30 minutes
+    hours = [calculate_work_hours(row[2], row[3]) for row in synthetic_dataset.attendance()]
+    assert hours
+    assert all(7 <= h <= 9 for h in hours)
+
+
+def test_sql_matches_python_on_synthetic_attendance(db_conn, synthetic_dataset):
+    cases = [(row[2], row[3]) for row in synthetic_dataset.attendance()]
+    assert sql_work_hours(db_conn, cases) == [calculate_work_hours(*case) for case in cases]